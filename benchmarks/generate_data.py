@@ -0,0 +1,215 @@
+"""
+Synthetic data generator for the aged inventory pipeline.
+
+Writes an LX02-style SAP export (paint_inventory.xlsx) and a UTF-16 Tableau export
+(paint_processed.csv) with realistic storage types, bins, part cardinality and placement ages.
+
+Usage:
+    python benchmarks/generate_data.py --rows 100000 --output benchmarks/data/100k
+"""
+import os
+import argparse
+from datetime import datetime
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+UNLOAD_BINS = ['UNLOAD01', 'UNLOAD02', 'UNLOAD03', 'UNLOAD04', 'UNLOAD05', 'LGUNLOAD']
+
+# Share of rows per storage type. 'UNLOAD' rows are placed in the unload bins of storage type 916.
+DEFAULT_STORAGE_MIX: Dict[str, float] = {
+    '800': 0.08, '801': 0.06, '802': 0.04, '8QI': 0.02, 'UNLOAD': 0.05,
+    '100': 0.30, '200': 0.25, '300': 0.20,
+}
+
+AGE_DISTRIBUTIONS = ('exponential', 'uniform', 'lognormal')
+
+
+def parse_storage_mix(value: str) -> Dict[str, float]:
+    """
+    Parses a storage mix given as 'TYPE=SHARE,TYPE=SHARE'.
+    """
+    mix = {}
+    for entry in value.split(','):
+        storage_type, share = entry.split('=')
+        mix[storage_type.strip()] = float(share)
+    return mix
+
+
+def sample_ages(rng: np.random.Generator, rows: int, distribution: str, mean_age_hours: float,
+                max_age_days: float) -> np.ndarray:
+    """
+    Samples placement ages in seconds, capped at max_age_days.
+    """
+    mean_seconds = mean_age_hours * 3600
+    if distribution == 'exponential':
+        ages = rng.exponential(mean_seconds, rows)
+    elif distribution == 'uniform':
+        ages = rng.uniform(0, 2 * mean_seconds, rows)
+    elif distribution == 'lognormal':
+        sigma = 1.0
+        ages = rng.lognormal(np.log(mean_seconds) - sigma ** 2 / 2, sigma, rows)
+    else:
+        raise ValueError(f"Unknown age distribution '{distribution}'.")
+    return np.minimum(ages, max_age_days * 86400).astype(np.int64)
+
+
+def generate_inventory(
+    rows: int,
+    as_of: datetime,
+    parts: int = 2000,
+    storage_mix: Optional[Dict[str, float]] = None,
+    age_distribution: str = 'exponential',
+    mean_age_hours: float = 72.0,
+    max_age_days: float = 365.0,
+    seed: int = 0
+        ) -> pd.DataFrame:
+    """
+    Generates an LX02-style inventory export.
+
+    Args:
+        rows (int): The number of inventory rows.
+        as_of (datetime): The export time; all placements lie before it.
+        parts (int): The number of distinct materials.
+        storage_mix (Optional[Dict[str, float]]): Share of rows per storage type, see DEFAULT_STORAGE_MIX.
+        age_distribution (str): One of 'exponential', 'uniform' or 'lognormal'.
+        mean_age_hours (float): The mean age of a placement in wall-clock hours.
+        max_age_days (float): The maximum age of a placement in days.
+        seed (int): The random seed.
+
+    Returns:
+        pd.DataFrame: The inventory export.
+    """
+    rng = np.random.default_rng(seed)
+    mix = storage_mix or DEFAULT_STORAGE_MIX
+    shares = np.array(list(mix.values()), dtype=float)
+    kinds = rng.choice(np.array(list(mix)), rows, p=shares / shares.sum())
+
+    is_unload = kinds == 'UNLOAD'
+    storage_types = np.where(is_unload, '916', kinds)
+    bin_numbers = pd.Series(rng.integers(0, 400, rows)).astype(str).str.zfill(3).to_numpy()
+    storage_bins = np.where(is_unload, rng.choice(UNLOAD_BINS, rows),
+                            np.char.add(np.char.add(storage_types.astype(str), '-'), bin_numbers.astype(str)))
+
+    material_ids = rng.integers(0, parts, rows)
+    materials = pd.Series(material_ids + 1_000_000).astype(str)
+    placements = pd.Timestamp(as_of) - pd.to_timedelta(
+        sample_ages(rng, rows, age_distribution, mean_age_hours, max_age_days), unit='s')
+
+    return pd.DataFrame({
+        'Material': materials,
+        'Plant': '0008',
+        'Storage Location': '0800',
+        'Storage Type': storage_types,
+        'Storage Bin': storage_bins,
+        'Material Description': 'PAINTED PART ' + materials,
+        'Total Stock': rng.integers(1, 120, rows),
+        'Base Unit of Measure': 'EA',
+        'Storage Unit': pd.Series(np.arange(rows) + 100_000_000).astype(str),
+        'Last stock placement': placements.normalize(),
+        'Time': placements.strftime('%H:%M:%S'),
+        'Last addtn to stock': placements.normalize(),
+    })
+
+
+def generate_paint_processed(rows: int, parts: int = 2000, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates a Tableau Paint Processed export.
+
+    Args:
+        rows (int): The number of rows.
+        parts (int): The number of distinct part numbers.
+        seed (int): The random seed.
+
+    Returns:
+        pd.DataFrame: The Paint Processed export.
+    """
+    rng = np.random.default_rng(seed + 1)
+    loaded = rng.integers(0, 60, rows)
+    # Most rows are finished loads with a GOOD, NON-CONFIRMED or SCRAP quantity; the rest are still in station
+    in_station = rng.random(rows) < 0.3
+    return pd.DataFrame({
+        'PART_NO': pd.Series(rng.integers(0, parts, rows) + 1_000_000).astype(str),
+        'LINE': rng.choice(['PAINT1', 'PAINT2', 'ECOAT'], rows),
+        'SHIFT': rng.choice(['1', '2'], rows),
+        'LOADED': loaded,
+        'GOOD': np.where(in_station, 0, loaded),
+        'NON-CONFIRMED': np.where(in_station, 0, rng.integers(0, 2, rows)),
+        'SCRAP': np.where(in_station, 0, rng.integers(0, 2, rows)),
+    })
+
+
+def write_inventory(df: pd.DataFrame, path: str) -> None:
+    """
+    Writes the inventory export to Excel. With xlsxwriter installed, rows are streamed in constant memory
+    since openpyxl is slow at scale.
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        df.to_excel(path, index=False)
+        return
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_urls': False,
+                                          'strings_to_numbers': False})
+    try:
+        sheet = workbook.add_worksheet('Sheet1')
+        date_format = workbook.add_format({'num_format': 'YYYY-MM-DD'})
+        columns = []
+        for column_number, column in enumerate(df.columns):
+            values = df[column]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                # Excel stores dates as days since 1899-12-30
+                values = (values - pd.Timestamp('1899-12-30')) / pd.Timedelta(days=1)
+                sheet.set_column(column_number, column_number, 12, date_format)
+            columns.append(values.tolist())
+        sheet.write_row(0, 0, list(df.columns))
+        for row_number, row in enumerate(zip(*columns), start=1):
+            sheet.write_row(row_number, 0, row)
+    finally:
+        workbook.close()
+
+
+def write_paint_processed(df: pd.DataFrame, path: str) -> None:
+    """
+    Writes the Paint Processed export as UTF-16 tab-separated text, as Tableau does.
+    """
+    df.to_csv(path, sep='\t', encoding='utf-16', index=False)
+
+
+def generate(output_dir: str, rows: int, paint_rows: Optional[int] = None, as_of: Optional[datetime] = None,
+             **options) -> None:
+    """
+    Generates both exports into output_dir as paint_inventory.xlsx and paint_processed.csv.
+    Additional keyword arguments are passed to generate_inventory.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    as_of = as_of or datetime.now().replace(microsecond=0)
+    parts = options.get('parts', 2000)
+    write_inventory(generate_inventory(rows, as_of, **options), os.path.join(output_dir, 'paint_inventory.xlsx'))
+    write_paint_processed(generate_paint_processed(paint_rows or rows, parts, options.get('seed', 0)),
+                          os.path.join(output_dir, 'paint_processed.csv'))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000, help='number of inventory rows')
+    parser.add_argument('--paint-rows', type=int, help='number of Paint Processed rows (default: --rows)')
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'data'), help='output directory')
+    parser.add_argument('--parts', type=int, default=2000, help='number of distinct materials')
+    parser.add_argument('--storage-mix', type=parse_storage_mix, help="e.g. '800=0.1,801=0.1,8QI=0.02,UNLOAD=0.05,100=0.73'")
+    parser.add_argument('--age-distribution', choices=AGE_DISTRIBUTIONS, default='exponential')
+    parser.add_argument('--mean-age-hours', type=float, default=72.0)
+    parser.add_argument('--max-age-days', type=float, default=365.0)
+    parser.add_argument('--as-of', type=datetime.fromisoformat, help='export time (default: now)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generate(args.output, args.rows, args.paint_rows, args.as_of, parts=args.parts, storage_mix=args.storage_mix,
+             age_distribution=args.age_distribution, mean_age_hours=args.mean_age_hours,
+             max_age_days=args.max_age_days, seed=args.seed)
+    print(f"Wrote {args.rows} inventory rows to '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Benchmark suite for the aged inventory pipeline.
+
+Generates synthetic exports at each requested size (cached under benchmarks/data), times every
+pipeline stage, records its peak traced memory, and compares the timings against a stored baseline.
+The 'pipeline' stage runs report selection, aging and report building from a loaded inventory; its
+peak memory per 100,000 rows is checked against --memory-budget.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 10000 100000 [--save-baseline] [--tolerance 0.25]
+                                        [--memory-budget 40]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.generate_data import generate  # noqa: E402
+from modules.file_utils import load_shift_calendar, write_excel_sheets  # noqa: E402
+from modules.ingest import _aggregate_paint_processed, load_paint_loaded, load_sap_inventory  # noqa: E402
+from modules.log_config import THROTTLED, configure_logging, stop_logging  # noqa: E402
+from modules.inventory_processing import (  # noqa: E402
+    REPORT_SPECS, age_inventory, build_reports, calculate_elapsed_hours, prepare_inventory, project_aging
+)
+
+DATA_DIRECTORY = os.path.join(REPO_ROOT, 'benchmarks', 'data')
+BASELINE_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'baseline.json')
+
+# Fixed evaluation time so that runs are comparable
+AS_OF = datetime(2024, 3, 13, 14, 7, 33)
+
+# Rows aged with the scalar reference implementation; its cost is reported per 1,000 rows
+SCALAR_SAMPLE = 1000
+
+
+def measure(function: Callable[[], object], memory: bool) -> Tuple[object, float, float]:
+    """
+    Runs a stage and returns its result, wall time in seconds and peak traced memory in MiB.
+    Memory is traced in a separate run so that tracing overhead does not distort the timing.
+    """
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+
+    peak_mb = float('nan')
+    if memory:
+        tracemalloc.start()
+        function()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result, seconds, peak_mb
+
+
+def run_size(rows: int, memory: bool) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmarks every stage for one dataset size.
+    """
+    data_dir = os.path.join(DATA_DIRECTORY, str(rows))
+    inventory_path = os.path.join(data_dir, 'paint_inventory.xlsx')
+    paint_path = os.path.join(data_dir, 'paint_processed.csv')
+    if not (os.path.exists(inventory_path) and os.path.exists(paint_path)):
+        print(f"  generating {rows} rows in '{data_dir}'")
+        generate(data_dir, rows, as_of=AS_OF)
+
+    calendar = load_shift_calendar(os.path.join(REPO_ROOT, 'shift_schedules.txt'))
+    cache_dir = tempfile.mkdtemp(prefix='aged-inventory-bench-')
+    results: Dict[str, Dict[str, float]] = {}
+
+    def record(stage: str, function: Callable[[], object], stage_rows: int) -> object:
+        result, seconds, peak_mb = measure(function, memory)
+        results[stage] = {'seconds': seconds, 'peak_mb': peak_mb, 'rows': stage_rows,
+                          'rows_per_second': stage_rows / seconds if seconds else float('inf')}
+        print(f"  {stage:<20} {seconds:9.3f}s  {peak_mb:9.1f} MiB  {results[stage]['rows_per_second']:14,.0f} rows/s")
+        return result
+
+    quarantine_dir = os.path.join(cache_dir, 'quarantine')
+    inventory = record('ingest_excel', lambda: load_sap_inventory(inventory_path, cache_dir=None,
+                                                                  quarantine_dir=quarantine_dir), rows)
+    load_sap_inventory(inventory_path, cache_dir=cache_dir, quarantine_dir=quarantine_dir)
+    record('ingest_cached', lambda: load_sap_inventory(inventory_path, cache_dir=cache_dir,
+                                                       quarantine_dir=quarantine_dir), rows)
+    paint_loaded, _ = record('paint_aggregate', lambda: _aggregate_paint_processed(paint_path), rows)
+    load_paint_loaded(paint_path, cache_dir=cache_dir, quarantine_dir=quarantine_dir)
+    record('paint_cached', lambda: load_paint_loaded(paint_path, cache_dir=cache_dir,
+                                                     quarantine_dir=quarantine_dir), rows)
+
+    df, report_rows = record('select_reports', lambda: prepare_inventory(inventory), rows)
+    aged = record('aging', lambda: age_inventory(df, report_rows, calendar, AS_OF), rows)
+
+    # Incremental aging five minutes after a run that stored its state, including the state file I/O
+    state_path = os.path.join(cache_dir, 'aging_state.parquet')
+    age_inventory(df, report_rows, calendar, AS_OF, state_path)
+    record('aging_incremental', lambda: age_inventory(df, report_rows, calendar, AS_OF + timedelta(minutes=5),
+                                                      state_path), rows)
+
+    record('projection', lambda: project_aging(aged, report_rows, calendar), rows)
+
+    sample = df['last_stock_placement'].head(SCALAR_SAMPLE).dt.to_pydatetime()
+    record('aging_scalar_1k', lambda: [calculate_elapsed_hours(start, AS_OF, calendar.work_shifts, calendar.work_days,
+                                                               calendar.closed_dates) for start in sample],
+           len(sample))
+
+    reports = record('build_reports', lambda: build_reports(aged, report_rows, paint_loaded), rows)
+
+    def pipeline() -> object:
+        prepared, positions = prepare_inventory(inventory)
+        return build_reports(age_inventory(prepared, positions, calendar, AS_OF), positions, paint_loaded)
+
+    record('pipeline', pipeline, rows)
+    results['pipeline']['frame_mb'] = inventory.memory_usage(deep=True).sum() / 2 ** 20
+    print(f"  {'inventory frame':<20} {results['pipeline']['frame_mb']:21.1f} MiB")
+    output = os.path.join(cache_dir, 'report.xlsx')
+    load_report = reports[REPORT_SPECS[0].name]
+    record('render_excel', lambda: write_excel_sheets({'Sheet1': load_report}, output), len(load_report))
+
+    # Caller-side cost of one error per row through the queued, rate limited logging setup
+    configure_logging(os.path.join(cache_dir, 'logs'), console=False)
+    row_logger = logging.getLogger('benchmarks.row_errors')
+    record('logging_row_errors', lambda: [row_logger.error("Error computing elapsed hours for material %s: %s",
+                                                           row, 'invalid placement', extra=THROTTLED)
+                                          for row in range(rows)], rows)
+    stop_logging()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict[str, Dict[str, Dict[str, float]]],
+            tolerance: float, min_seconds: float = 0.05) -> List[str]:
+    """
+    Returns a description of every stage that is slower than its baseline by more than the tolerance.
+    Stages faster than min_seconds are ignored since their timings are dominated by noise.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if reference is None:
+                continue
+            limit = reference['seconds'] * (1 + tolerance)
+            if result['seconds'] > limit and result['seconds'] - reference['seconds'] > min_seconds:
+                regressions.append(f"{size} rows {stage}: {result['seconds']:.3f}s vs baseline "
+                                   f"{reference['seconds']:.3f}s")
+    return regressions
+
+
+def check_memory(results: Dict[str, Dict[str, Dict[str, float]]], budget_mb: float) -> List[str]:
+    """
+    Returns a description of every size whose pipeline peak memory exceeds budget_mb per 100,000 rows.
+    """
+    failures = []
+    for size, stages in results.items():
+        peak_mb = stages['pipeline']['peak_mb']
+        limit = budget_mb * int(size) / 100_000
+        if peak_mb > limit:
+            failures.append(f"{size} rows pipeline: peak {peak_mb:.1f} MiB exceeds budget {limit:.1f} MiB")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000],
+                        help='dataset sizes in rows, e.g. 10000 100000 1000000')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced peak memory runs')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline results file')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown relative to the baseline')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--memory-budget', type=float, default=40.0,
+                        help='allowed pipeline peak traced memory in MiB per 100,000 inventory rows')
+    args = parser.parse_args()
+
+    results = {}
+    for rows in args.sizes:
+        print(f"{rows} rows:")
+        results[str(rows)] = run_size(rows, memory=not args.no_memory)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    memory_failures = [] if args.no_memory else check_memory(results, args.memory_budget)
+    for failure in memory_failures:
+        print(f"MEMORY: {failure}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to '{args.baseline}'.")
+        return 1 if memory_failures else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at '{args.baseline}', run with --save-baseline to create one.")
+        return 1 if memory_failures else 0
+    with open(args.baseline, 'r') as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions or memory_failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Startup-time benchmark for the processing entry point.
+
+Imports main.py in fresh interpreters, reports the median cold-start time and the slowest imports,
+and fails if the median exceeds the budget or if any GUI automation library was imported.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--budget 3.0]
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+from typing import List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported when acquisition runs
+GUI_MODULES = ('pyautogui', 'win32com', 'modules.tableau_automation', 'modules.sap_automation')
+
+_IMPORT_SCRIPT = (
+    "import sys, time; start = time.perf_counter(); import main; "
+    "print(time.perf_counter() - start); print(','.join(sorted(sys.modules)))"
+)
+
+
+def measure_import() -> Tuple[float, List[str]]:
+    """
+    Imports main.py in a fresh interpreter and returns the import time and the modules loaded.
+    """
+    output = subprocess.run([sys.executable, '-c', _IMPORT_SCRIPT], cwd=REPO_ROOT, check=True,
+                            capture_output=True, text=True).stdout.splitlines()
+    return float(output[0]), output[1].split(',')
+
+
+def slowest_imports(count: int = 10) -> List[Tuple[int, str]]:
+    """
+    Returns the imports with the highest cumulative time (in microseconds) from python -X importtime.
+    """
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=REPO_ROOT, check=True,
+                            capture_output=True, text=True).stderr
+    timings = []
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                timings.append((int(cumulative), name.strip()))
+    return sorted(timings, reverse=True)[:count]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='number of cold starts to measure')
+    parser.add_argument('--budget', type=float, default=3.0, help='maximum median import time in seconds')
+    args = parser.parse_args()
+
+    timings = []
+    loaded: List[str] = []
+    for _ in range(args.runs):
+        seconds, loaded = measure_import()
+        timings.append(seconds)
+    median = statistics.median(timings)
+
+    print(f"import main: median {median:.3f}s over {args.runs} runs (budget {args.budget:.3f}s)")
+    print("slowest imports (cumulative):")
+    for microseconds, name in slowest_imports():
+        print(f"  {microseconds / 1e6:8.3f}s  {name}")
+
+    gui_imports = [name for name in loaded if name.split('.')[0] in GUI_MODULES or name in GUI_MODULES]
+    failed = False
+    if gui_imports:
+        print(f"FAIL: GUI modules imported at startup: {', '.join(gui_imports)}")
+        failed = True
+    if median > args.budget:
+        print(f"FAIL: median import time {median:.3f}s exceeds the {args.budget:.3f}s budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
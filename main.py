@@ -1,41 +1,314 @@
+import argparse
 import logging
 import os
-from modules.tableau_automation import get_tableau
-from modules.sap_automation import get_sap_stock
-from modules.file_utils import copy_and_rename_files, save_to_excel, move_to_sharepoint
-from modules.inventory_processing import process_inventory_data
+import time
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+from pandas import DataFrame
+from modules.acquisition import load_backend
+from modules.aging_state import AGING_STATE_PATH
+from modules.api import API_HOST, API_PORT, ReportServer, ReportStore
+from modules.file_utils import copy_and_rename_files, load_shift_calendar, move_to_sharepoint
+from modules.ingest import PAINT_PROCESSED_PATH, SAP_INVENTORY_PATH, load_paint_loaded, load_sap_inventory
+from modules.inventory_processing import (REPORT_SPECS, age_inventory, build_reports, build_upcoming_reports,
+                                          current_shift_end, prepare_inventory, project_aging)
+from modules.pipeline import PROCESS_POOL, Pipeline, Stage
+from modules.reporting import render_workbooks, report_workbooks
+from modules.daemon import InventoryDaemon
+from modules.delta import DELTA_WORKBOOK, compute_deltas, delta_sheets, load_previous_reports, save_previous_reports
+from modules.history import record_snapshot
+from modules.log_config import configure_logging, flush_repeats
+from modules.metrics import start_run, track_stage
+from modules.sites import load_sites, run_sites, site_context
 
-# Setup logging
+def acquire():
+    """
+    Downloads the Tableau and SAP exports through the GUI automation backends and copies them into the
+    data directory. The backends are only imported here.
+    """
+    started = time.time()
+    with track_stage('acquire'):
+        # Download Tableau report via GUI automation if enabled
+        if os.getenv("DOWNLOAD_TABLEAU")  == "False":
+            pass
+        else:
+            load_backend('tableau')()
 
-if not os.path.exists('logs'):
-    os.mkdir('logs')            # Create logs directory if it does not already exist
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[
-    logging.FileHandler("logs/app.log"),
-    logging.StreamHandler()
-])
+        # Download SAP stock data. Assumes the user is already logged into the SAP application
+        load_backend('sap')()
+    # Retrieve tableau and SAP stock data
+    with track_stage('copy'):
+        copy_and_rename_files(newer_than=started)
+
+def _acquire(backend: str, started: List[float]) -> None:
+    started.append(time.time())
+    load_backend(backend)()
+
+def _render_stage(filename: str, sheets_from: Callable[[Dict[str, object]], Dict[str, DataFrame]],
+                  inputs: Tuple[str, ...], profile_dir: Optional[str]) -> Stage:
+    """
+    Renders one workbook in the run's process pool. The stage is skipped when its sheets are the same as
+    when it last rendered and the file is unchanged since, e.g. when no row aged outside working hours.
+    """
+    def render(values: Dict[str, object]) -> Dict[str, object]:
+        result = render_workbooks({filename: sheets_from(values)}, profile_dir=profile_dir,
+                                  executor=values[PROCESS_POOL])[0]
+        if not result.ok:
+            raise RuntimeError(f"Could not render '{filename}': {result.error}")
+        return {filename: filename}
+
+    return Stage(f'render:{os.path.basename(filename)}', render, inputs=inputs, outputs=(filename,),
+                 config={'filename': filename}, reusable=True, processes=True,
+                 rows=lambda values: sum(len(sheet) for sheet in sheets_from(values).values()))
+
+def _publish_stage(filename: str, dest_dir: Optional[str]) -> Stage:
+    """
+    Publishes one rendered workbook as soon as it is rendered. Publishing keeps a manifest of what it
+    published, so only one workbook is published at a time.
+    """
+    def publish(values: Dict[str, object]) -> None:
+        move_to_sharepoint(source_dir=os.path.dirname(filename), dest_dir=dest_dir,
+                           files_to_move=[os.path.basename(filename)])
+
+    return Stage(f'publish:{os.path.basename(filename)}', publish, inputs=(filename,), files=(filename,),
+                 config={'dest_dir': dest_dir}, always_run=True, lock='publish', rows=lambda values: 1)
+
+def build_pipeline(process_only: bool = False, profile_dir: Optional[str] = None, delta_only: bool = False) -> Pipeline:
+    """
+    Lays the run out as stages with their inputs and outputs:
+    acquisition -> copy -> (SAP ingest | Paint Processed aggregation) -> aging -> projection -> merge ->
+    (history | delta | one render per workbook -> its publish) -> the delta baseline for the next run.
+    The SAP workbook and the Tableau CSV are read concurrently, and each workbook is published while the
+    others still render. Alongside the reports, aged_delta.xlsx lists what became aged and what cleared
+    since the previous run; with delta_only, only that workbook is written and published.
+    """
+    stages: List[Stage] = []
+    if not process_only:
+        # Only exports written after the acquisition started are copied. When resuming a run whose
+        # acquisitions succeeded, they are skipped and the exports they left are accepted.
+        started: List[float] = []
+        # The GUI automations share one desktop, so they never run at the same time
+        if os.getenv("DOWNLOAD_TABLEAU") != "False":
+            stages.append(Stage('acquire_tableau', lambda values: _acquire('tableau', started), always_run=True,
+                                lock='desktop'))
+        # Assumes the user is already logged into the SAP application
+        stages.append(Stage('acquire_sap', lambda values: _acquire('sap', started), always_run=True,
+                            lock='desktop', config={'variant': os.getenv("STOCK_VARIANT")}))
+        stages.append(Stage('copy', lambda values: copy_and_rename_files(min(started, default=None)),
+                            always_run=True, after=tuple(stage.name for stage in stages)))
+    after_copy = ('copy',) if not process_only else ()
+
+    # Load the paint inventory export (from the columnar cache when unchanged) and locate each report's rows
+    def ingest(values: Dict[str, object]) -> Dict[str, object]:
+        inventory = load_sap_inventory(SAP_INVENTORY_PATH)
+        with track_stage('filter', rows=len(inventory)):
+            inventory, report_rows = prepare_inventory(inventory)
+        return {'inventory': inventory, 'report_rows': report_rows}
+
+    # Only rows some report uses are aged, and those below their threshold are projected to when they cross it
+    def aging(values: Dict[str, object]) -> Dict[str, object]:
+        calendar = load_shift_calendar()
+        as_of = datetime.now()
+        aged = age_inventory(values['inventory'], values['report_rows'], calendar, as_of, AGING_STATE_PATH)
+        return {'aged': aged, 'calendar': calendar, 'as_of': as_of}
+
+    def projection(values: Dict[str, object]) -> Dict[str, object]:
+        projected = project_aging(values['aged'], values['report_rows'], values['calendar'])
+        return {'projected': projected, 'shift_end': current_shift_end(values['as_of'], values['calendar'])}
+
+    merge_paint = any(spec.merge_paint for spec in REPORT_SPECS)
+
+    # Rows that will age this shift are listed next to each report rather than in it
+    report_names = tuple(spec.name for spec in REPORT_SPECS)
+    upcoming_names = {spec.name: f'{spec.name}_upcoming' for spec in REPORT_SPECS if spec.upcoming}
+
+    def merge(values: Dict[str, object]) -> Dict[str, object]:
+        reports = build_reports(values['projected'], values['report_rows'], values.get('paint_loaded'))
+        upcoming = build_upcoming_reports(values['projected'], values['report_rows'], values.get('paint_loaded'),
+                                          values['shift_end'])
+        return dict(reports, **{upcoming_names[name]: report for name, report in upcoming.items()})
+
+    stages += [
+        Stage('ingest', ingest, outputs=('inventory', 'report_rows'), after=after_copy,
+              files=(SAP_INVENTORY_PATH,), rows=lambda values: len(values['inventory'])),
+        Stage('aging', aging, inputs=('inventory', 'report_rows'), outputs=('aged', 'calendar', 'as_of'),
+              profile=True, rows=lambda values: int(values['aged']['hours_elapsed'].notna().sum())),
+        Stage('projection', projection, inputs=('aged', 'report_rows', 'calendar', 'as_of'),
+              outputs=('projected', 'shift_end'),
+              rows=lambda values: int(values['projected']['ages_at'].notna().sum())),
+        Stage('merge', merge, outputs=report_names + tuple(upcoming_names.values()),
+              inputs=('projected', 'report_rows', 'shift_end') + (('paint_loaded',) if merge_paint else ()),
+              rows=lambda values: sum(len(values[name]) for name in report_names)),
+    ]
+    if merge_paint:
+        # Aggregating the Tableau CSV runs while the SAP workbook is parsed and aged
+        stages.append(Stage('ingest_paint', lambda values: {'paint_loaded': load_paint_loaded(PAINT_PROCESSED_PATH)},
+                            outputs=('paint_loaded',), after=after_copy, files=(PAINT_PROCESSED_PATH,),
+                            rows=lambda values: len(values['paint_loaded'])))
+
+    def reports_of(values: Dict[str, object]) -> Dict[str, DataFrame]:
+        return {name: values[name] for name in report_names}
+
+    def history(values: Dict[str, object]) -> None:
+        try:
+            record_snapshot(reports_of(values), values['as_of'])
+        except Exception as e:
+            logging.warning("Could not record the run in the snapshot history: %s", e)
+
+    # Compare with the reports of the last run that published
+    def delta(values: Dict[str, object]) -> Dict[str, object]:
+        deltas = compute_deltas(reports_of(values), load_previous_reports())
+        return {'delta_sheets': delta_sheets(deltas)}
+
+    # This run becomes the next run's baseline only once everything is published, so that a failed or
+    # resumed run is compared against what readers last saw
+    def baseline(values: Dict[str, object]) -> None:
+        save_previous_reports(reports_of(values), values['as_of'])
+
+    # Append this run to the snapshot history in data/history unless disabled
+    if os.getenv("RECORD_HISTORY") != "False":
+        stages.append(Stage('history', history, inputs=report_names + ('as_of',), always_run=True,
+                            rows=lambda values: sum(len(values[name]) for name in report_names)))
+    stages.append(Stage('delta', delta, inputs=report_names + ('as_of',), outputs=('delta_sheets',),
+                        rows=lambda values: sum(len(values[name]) for name in report_names)))
+
+    # Save each filtered DataFrame to an Excel file, or all of them as sheets of REPORT_WORKBOOK if set. The
+    # workbooks are laid out with report names in place of the reports, which are only known once merged.
+    report_workbook = os.getenv("REPORT_WORKBOOK")
+    layout = {} if delta_only else report_workbooks({
+        os.path.join('data', spec.filename): spec.name for spec in REPORT_SPECS
+    }, workbook=os.path.join('data', report_workbook) if report_workbook else None, upcoming={
+        os.path.join('data', spec.filename): upcoming_names[spec.name] for spec in REPORT_SPECS if spec.upcoming
+    })
+    for filename, sheets in layout.items():
+        stages.append(_render_stage(filename, lambda values, sheets=sheets: {
+            sheet: values[name] for sheet, name in sheets.items()
+        }, tuple(sheets.values()), profile_dir))
+    delta_filename = os.path.join('data', DELTA_WORKBOOK)
+    stages.append(_render_stage(delta_filename, lambda values: values['delta_sheets'], ('delta_sheets',),
+                                profile_dir))
+
+    # Only the workbooks that rendered successfully are published
+    dest_dir = os.getenv("SHAREPOINT_DIRECTORY")
+    publish_stages = [_publish_stage(filename, dest_dir) for filename in list(layout) + [delta_filename]]
+    stages += publish_stages
+    stages.append(Stage('baseline', baseline, inputs=report_names + ('as_of',),
+                        after=tuple(stage.name for stage in publish_stages),
+                        rows=lambda values: sum(len(values[name]) for name in report_names)))
+    return Pipeline(stages)
+
+def main(process_only: bool = False, profile_dir: Optional[str] = None, delta_only: bool = False,
+         resume: bool = False, dry_run: bool = False):
+    pipeline = build_pipeline(process_only, profile_dir, delta_only)
+    if dry_run:
+        print(pipeline.describe(resume))
+        return
 
-def main():
     logging.info("Starting inventory processing")
 
-    # Download Tableau report via GUI automation if enabled
-    if os.getenv("DOWNLOAD_TABLEAU")  == "False":
-        pass
-    else:
-        get_tableau()
+    # Per-stage timings are written to logs/metrics.jsonl and logs/aged_inventory.prom after every run
+    run = start_run(profile_dir)
+    success = False
+    try:
+        pipeline.run(resume=resume)
+        success = True
+    finally:
+        run.write(success)
+        # Summarize the repeated messages of this run
+        flush_repeats()
 
-    # Download SAP stock data. Assumes the user is already logged into the SAP application
-    get_sap_stock()
-    # Retrieve tableau and SAP stock data
-    copy_and_rename_files()
+def main_sites(config_path: str, process_only: bool = False, profile_dir: Optional[str] = None,
+               delta_only: bool = False, max_workers: Optional[int] = None, resume: bool = False,
+               dry_run: bool = False) -> bool:
+    """
+    Runs the pipeline for every plant in the site configuration. GUI acquisition drives a single desktop,
+    so it runs one plant at a time; processing, rendering and publishing then run for all plants in
+    parallel, one worker process per plant. A plant that fails does not stop the others. resume and
+    dry_run apply to each plant's processing pipeline.
+
+    Returns:
+        bool: True if every plant succeeded.
+    """
+    sites = load_sites(config_path)
+    if dry_run:
+        for site in sites:
+            with site_context(site):
+                print(f"Site '{site.name}':")
+                main(process_only=True, delta_only=delta_only, resume=resume, dry_run=True)
+        return True
 
-    # Initialize the paint load and unload DataFrames
-    aged_load_inv, aged_unload_inv, aged_8qi_inv = process_inventory_data()
-    # Save each filtered DataFrame to an Excel file
-    save_to_excel(aged_load_inv, r'data\aged_load_inv.xlsx')
-    save_to_excel(aged_unload_inv, r'data\aged_unload_inv.xlsx')
-    save_to_excel(aged_8qi_inv, r'data\aged_8qi_inv.xlsx')
+    failed = []
+    if not process_only:
+        for site in sites:
+            logging.info("Acquiring exports for site '%s'", site.name)
+            try:
+                with site_context(site):
+                    acquire()
+            except Exception as e:
+                logging.error("Acquisition failed for site '%s', skipping it: %s", site.name, e, exc_info=True)
+                failed.append(site.name)
 
-    move_to_sharepoint(dest_dir=os.getenv("SHAREPOINT_DIRECTORY"))
+    # Each plant writes its own data/, logs/metrics.jsonl and history from its own directory
+    task = partial(main, process_only=True, profile_dir=profile_dir, delta_only=delta_only, resume=resume)
+    results = run_sites([site for site in sites if site.name not in failed], task, max_workers)
+    failed.extend(result.name for result in results if not result.ok)
+    if failed:
+        logging.error("Sites failed: %s", ', '.join(failed))
+    return not failed
+
+def watch(refresh_minutes: float, serve_port: Optional[int] = None) -> None:
+    """
+    Keeps the pipeline resident, re-processing and publishing the reports whenever a new export lands in
+    the data directory and refreshing the aging every refresh_minutes. If serve_port is given, the
+    latest reports are also served from memory by the HTTP API on that port.
+    """
+    report_workbook = os.getenv("REPORT_WORKBOOK")
+    report_store = None
+    if serve_port is not None:
+        report_store = ReportStore()
+        ReportServer(report_store, os.getenv("API_HOST", API_HOST), serve_port).start()
+    daemon = InventoryDaemon(refresh_interval=refresh_minutes * 60, dest_dir=os.getenv("SHAREPOINT_DIRECTORY"),
+                             workbook=report_workbook or None, record_history=os.getenv("RECORD_HISTORY") != "False",
+                             report_store=report_store)
+    daemon.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Setup logging: records are written as JSON lines to logs/app.jsonl by a background thread. Only the
+    # entry point configures it, so worker processes that import this module do not open the log again.
+    configure_logging()
+
+    parser = argparse.ArgumentParser(description="Aged inventory reporting")
+    parser.add_argument("--watch", action="store_true",
+                        help="stay resident and re-run processing when new exports arrive in the data directory")
+    parser.add_argument("--refresh-minutes", type=float, default=5,
+                        help="in watch mode, minutes between aging refreshes when no export has changed")
+    parser.add_argument("--process-only", action="store_true",
+                        help="skip GUI acquisition and process the exports already in the data directory")
+    parser.add_argument("--profile", nargs="?", const=os.path.join("logs", "profiles"), default=os.getenv("PROFILE_DIR"),
+                        help="dump cProfile and tracemalloc output for the aging and Excel rendering stages "
+                             "to this directory (default logs/profiles)")
+    parser.add_argument("--delta-only", action="store_true", default=os.getenv("DELTA_ONLY") == "True",
+                        help="only write and publish aged_delta.xlsx with the rows newly aged and cleared since "
+                             "the last run")
+    parser.add_argument("--sites", nargs="?", const=os.getenv("SITES_CONFIG", "sites.json"), default=None,
+                        help="run every plant in this site configuration (default sites.json) in parallel")
+    parser.add_argument("--site-workers", type=int, default=None,
+                        help="with --sites, maximum number of plants processed at once (default all)")
+    parser.add_argument("--serve", nargs="?", type=int, const=int(os.getenv("API_PORT", API_PORT)), default=None,
+                        help="in watch mode, serve the latest reports over HTTP on this port (default 8080)")
+    parser.add_argument("--resume", action="store_true",
+                        help="if the last run failed, skip the stages that succeeded in it, e.g. the downloads")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the stages that would run or be skipped, and their order, without running them")
+    args = parser.parse_args()
+    if args.watch or args.serve is not None:
+        watch(args.refresh_minutes, args.serve)
+    elif args.sites:
+        if not main_sites(args.sites, process_only=args.process_only, profile_dir=args.profile,
+                          delta_only=args.delta_only, max_workers=args.site_workers, resume=args.resume,
+                          dry_run=args.dry_run):
+            raise SystemExit(1)
+    else:
+        main(process_only=args.process_only, profile_dir=args.profile, delta_only=args.delta_only,
+             resume=args.resume, dry_run=args.dry_run)
\ No newline at end of file
@@ -0,0 +1,42 @@
+import logging
+import importlib
+from typing import Callable, Dict
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+# Acquisition backends as 'module:function' targets. Modules are only imported when a backend is loaded,
+# so GUI automation libraries (pyautogui, win32com) are never imported by processing-only runs.
+ACQUISITION_BACKENDS: Dict[str, str] = {
+    'tableau': 'modules.tableau_automation:get_tableau',
+    'sap': 'modules.sap_automation:get_sap_stock',
+}
+
+
+def register_backend(name: str, target: str) -> None:
+    """
+    Registers an acquisition backend, replacing any existing backend with the same name.
+
+    Parameters:
+        name (str): The name the backend is loaded by.
+        target (str): The backend function as 'module:function'.
+    """
+    ACQUISITION_BACKENDS[name] = target
+
+
+def load_backend(name: str) -> Callable[..., None]:
+    """
+    Imports and returns an acquisition backend.
+
+    Parameters:
+        name (str): The name of a registered backend, e.g. 'tableau' or 'sap'.
+
+    Returns:
+        Callable[..., None]: The backend function.
+
+    Raises:
+        KeyError: If no backend is registered under the name.
+    """
+    module_name, function_name = ACQUISITION_BACKENDS[name].split(':')
+    logger.debug("Loading acquisition backend '%s' from '%s'.", name, module_name)
+    return getattr(importlib.import_module(module_name), function_name)
@@ -0,0 +1,109 @@
+import os
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from .file_utils import ShiftCalendar, write_atomic
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+AGING_STATE_PATH = os.path.join('data', 'cache', 'aging_state.parquet')
+
+# Rows with the same key are the same unmoved pallet, so their accrued working time carries over between runs
+AGING_KEY = ['Material', 'Storage Bin', 'last_stock_placement']
+
+_AS_OF_KEY = b'aging_as_of'
+_CALENDAR_KEY = b'aging_calendar'
+
+
+@dataclass
+class AgingState:
+    """
+    Working time accrued by each inventory key as of a previous run.
+
+    Attributes:
+        as_of (pd.Timestamp): The time the working time was accrued up to.
+        calendar_key (str): calendar_key() of the shift calendar the working time was computed with.
+        accrued (DataFrame): 'key_hash' (key_hashes() of the AGING_KEY columns), 'last_stock_placement' as
+                             int64 nanoseconds and the accrued working time in nanoseconds as 'working_ns',
+                             with unique 'key_hash' values.
+    """
+    as_of: pd.Timestamp
+    calendar_key: str
+    accrued: DataFrame
+
+
+def key_hashes(keys: DataFrame) -> np.ndarray:
+    """
+    Hashes the AGING_KEY columns of each row to a uint64. Categorical and string columns with the
+    same values hash identically, as do placement times stored at different resolutions.
+    """
+    keys = keys[AGING_KEY].astype({'last_stock_placement': 'datetime64[ns]'})
+    return pd.util.hash_pandas_object(keys, index=False, categorize=True).to_numpy()
+
+
+def calendar_key(calendar: ShiftCalendar) -> str:
+    """
+    Identifies a shift calendar by its source file hash and its compiled shifts, workdays and closed dates,
+    so that any change to shift_schedules.txt invalidates the stored state.
+    """
+    content = repr((calendar.digest, tuple(calendar.work_shifts), tuple(calendar.work_days),
+                    sorted(calendar.closed_dates)))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def load_aging_state(calendar: ShiftCalendar, path: str = AGING_STATE_PATH) -> Optional[AgingState]:
+    """
+    Loads the aging state of the previous run if it was computed with the same shift calendar.
+
+    Args:
+        calendar (ShiftCalendar): The shift calendar of this run.
+        path (str): The path of the state file. Default is 'data/cache/aging_state.parquet'.
+
+    Returns:
+        Optional[AgingState]: The stored state, or None if there is none or it cannot be reused.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        metadata = table.schema.metadata or {}
+        if metadata.get(_CALENDAR_KEY, b'').decode() != calendar_key(calendar):
+            logger.info("Shift calendar changed since the last run, recomputing all elapsed hours.")
+            return None
+        as_of = pd.Timestamp(int(metadata[_AS_OF_KEY].decode()))
+        return AgingState(as_of, calendar_key(calendar), table.to_pandas())
+    except ImportError as e:
+        logger.warning("Parquet support is not installed, skipping incremental aging: %s", e)
+    except Exception as e:
+        logger.warning("Could not read aging state '%s', recomputing all elapsed hours: %s", path, e)
+    return None
+
+
+def save_aging_state(state: AgingState, path: str = AGING_STATE_PATH) -> None:
+    """
+    Writes the aging state atomically so that an interrupted run leaves the previous state intact.
+
+    Args:
+        state (AgingState): The state to store.
+        path (str): The path of the state file. Default is 'data/cache/aging_state.parquet'.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(state.accrued, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               _AS_OF_KEY: str(state.as_of.value).encode(),
+                                               _CALENDAR_KEY: state.calendar_key.encode()})
+        write_atomic(path, lambda temp_path: pq.write_table(table, temp_path))
+    except ImportError as e:
+        logger.warning("Parquet support is not installed, skipping incremental aging: %s", e)
+    except Exception as e:
+        logger.warning("Could not write aging state '%s': %s", path, e)
@@ -0,0 +1,338 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+API_HOST = '127.0.0.1'
+API_PORT = 8080
+
+# Query parameters and the report column each one filters
+FILTER_COLUMNS = {'storage_type': 'Storage Type', 'bin': 'Storage Bin', 'min_hours': 'hours_elapsed'}
+CONTENT_TYPES = {'json': 'application/json', 'csv': 'text/csv; charset=utf-8'}
+
+_MAX_CACHED_BODIES = 256
+_MAX_HEADER_BYTES = 16384
+_IDLE_TIMEOUT = 30.0
+_REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            431: 'Request Header Fields Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+Query = Tuple[str, Tuple[str, ...], Tuple[str, ...], Optional[float]]
+
+
+class RequestError(Exception):
+    """
+    A request that is answered with an error status and message.
+    """
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _content_digest(report: DataFrame) -> str:
+    """
+    Hashes a report's columns and values, so that a report rebuilt with the same content keeps its ETag.
+    """
+    digest = hashlib.sha256(repr(list(report.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(report, index=False, categorize=True).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def serialize(report: DataFrame, name: str, as_of: datetime, fmt: str) -> bytes:
+    """
+    Serializes a report as a CSV table, or as a JSON object with the report name, as-of time, row count
+    and one record per row.
+    """
+    if fmt == 'csv':
+        return report.to_csv(index=False).encode('utf-8')
+    records = report.to_json(orient='records', date_format='iso')
+    return (f'{{"report": {json.dumps(name)}, "as_of": {json.dumps(pd.Timestamp(as_of).isoformat())}, '
+            f'"count": {len(report)}, "rows": {records}}}').encode('utf-8')
+
+
+@dataclass
+class ReportSnapshot:
+    """
+    The reports of one pipeline run. Snapshots are never modified after they are published, apart from
+    their cache of serialized bodies.
+
+    Attributes:
+        as_of (datetime): The time the reports were aged at.
+        reports (Dict[str, DataFrame]): The report DataFrames keyed by report name.
+        digests (Dict[str, str]): The content digest of each report, the base of its ETags.
+        bodies (OrderedDict): Serialized responses keyed by query, least recently used first.
+    """
+    as_of: datetime
+    reports: Dict[str, DataFrame]
+    digests: Dict[str, str]
+    bodies: 'OrderedDict[Query, bytes]' = field(default_factory=OrderedDict)
+
+    def etag(self, query: Query, fmt: str) -> str:
+        key = repr((self.digests[query[0]],) + query[1:] + (fmt,))
+        return '"' + hashlib.sha256(key.encode()).hexdigest()[:24] + '"'
+
+    def body(self, query: Query, fmt: str) -> bytes:
+        """
+        Returns the serialized, filtered report for a query, serializing it on first use.
+        """
+        key = query + (fmt,)
+        body = self.bodies.get(key)
+        if body is not None:
+            self.bodies.move_to_end(key)
+            return body
+        name, storage_types, bins, min_hours = query
+        report = self.reports[name]
+        mask = np.ones(len(report), dtype=bool)
+        for column, values in (('Storage Type', storage_types), ('Storage Bin', bins)):
+            if values:
+                mask &= report[column].isin(values).to_numpy()
+        if min_hours is not None:
+            mask &= (report['hours_elapsed'] >= min_hours).to_numpy()
+        body = serialize(report if mask.all() else report[mask], name, self.as_of, fmt)
+        self.bodies[key] = body
+        while len(self.bodies) > _MAX_CACHED_BODIES:
+            self.bodies.popitem(last=False)
+        return body
+
+
+class ReportStore:
+    """
+    Holds the reports being served. publish() prepares a complete snapshot and then swaps it in with a
+    single assignment, so a request sees either the previous run's reports or the new ones, never a mix.
+    """
+
+    def __init__(self) -> None:
+        self._snapshot: Optional[ReportSnapshot] = None
+
+    @property
+    def snapshot(self) -> Optional[ReportSnapshot]:
+        return self._snapshot
+
+    def publish(self, reports: Dict[str, DataFrame], as_of: datetime) -> None:
+        """
+        Swaps in the reports of a run. The unfiltered JSON and CSV bodies are serialized here, in the
+        pipeline's thread, so that the server never serializes the common unfiltered poll.
+
+        Args:
+            reports (Dict[str, DataFrame]): The report DataFrames keyed by report name.
+            as_of (datetime): The time the reports were aged at.
+        """
+        start = time.perf_counter()
+        snapshot = ReportSnapshot(as_of, dict(reports), {name: _content_digest(report)
+                                                         for name, report in reports.items()})
+        for name in reports:
+            for fmt in CONTENT_TYPES:
+                snapshot.body((name, (), (), None), fmt)
+        self._snapshot = snapshot
+        logger.info("Serving reports as of %s (%.2fs to prepare).", as_of, time.perf_counter() - start)
+
+
+def parse_query(name: str, query_string: str, report: DataFrame) -> Query:
+    """
+    Parses the filters of a report request into a normalized, hashable query.
+
+    Raises:
+        RequestError: If a parameter is unknown or invalid, or filters a column the report does not have.
+    """
+    params = parse_qs(query_string, keep_blank_values=True)
+    unknown = set(params) - set(FILTER_COLUMNS) - {'format'}
+    if unknown:
+        raise RequestError(400, f"Unknown query parameters: {', '.join(sorted(unknown))}")
+    for param in params:
+        if param in FILTER_COLUMNS and FILTER_COLUMNS[param] not in report.columns:
+            raise RequestError(400, f"Report '{name}' has no '{FILTER_COLUMNS[param]}' column to filter")
+
+    def values(param: str) -> Tuple[str, ...]:
+        return tuple(sorted({value for item in params.get(param, []) for value in item.split(',') if value}))
+
+    min_hours = None
+    if params.get('min_hours'):
+        try:
+            min_hours = float(params['min_hours'][-1])
+        except ValueError:
+            raise RequestError(400, f"min_hours must be a number, got '{params['min_hours'][-1]}'")
+    return name, values('storage_type'), values('bin'), min_hours
+
+
+def handle_request(store: ReportStore, method: str, target: str,
+                   headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Answers one request from the store: GET /health, GET /reports, which lists the reports, or
+    GET /reports/<name>[.json|.csv] with the FILTER_COLUMNS filters. Report responses carry an ETag derived
+    from the report content and the query, so a poll with a matching If-None-Match gets an empty 304.
+
+    Args:
+        store (ReportStore): The reports being served.
+        method (str): The request method.
+        target (str): The request target, e.g. '/reports/aged_load_inv.csv?min_hours=8'.
+        headers (Dict[str, str]): The request headers with lower-case names.
+
+    Returns:
+        Tuple[int, Dict[str, str], bytes]: The status, response headers and body.
+    """
+    if method not in ('GET', 'HEAD'):
+        raise RequestError(405, f"Method {method} is not allowed, the API is read-only")
+    url = urlsplit(target)
+    path = unquote(url.path).rstrip('/') or '/'
+    snapshot = store.snapshot
+
+    if path == '/health':
+        return 200, {'Content-Type': CONTENT_TYPES['json'], 'Cache-Control': 'no-cache'}, json.dumps({
+            'status': 'ok' if snapshot else 'waiting for the first run',
+            'as_of': pd.Timestamp(snapshot.as_of).isoformat() if snapshot else None}).encode()
+    if snapshot is None:
+        raise RequestError(503, "No reports have been processed yet")
+
+    if path == '/reports':
+        listing = [{'name': name, 'rows': len(report), 'etag': snapshot.etag((name, (), (), None), 'json'),
+                    'url': f'/reports/{name}'} for name, report in snapshot.reports.items()]
+        body = json.dumps({'as_of': pd.Timestamp(snapshot.as_of).isoformat(), 'reports': listing}).encode()
+        return 200, {'Content-Type': CONTENT_TYPES['json'], 'Cache-Control': 'no-cache'}, body
+
+    if not path.startswith('/reports/'):
+        raise RequestError(404, f"Unknown path '{path}'")
+    name = path[len('/reports/'):]
+    fmt = None
+    for extension in CONTENT_TYPES:
+        if name.endswith('.' + extension):
+            name, fmt = name[:-len(extension) - 1], extension
+    if name not in snapshot.reports:
+        raise RequestError(404, f"Unknown report '{name}'")
+    query = parse_query(name, url.query, snapshot.reports[name])
+    fmt = fmt or parse_qs(url.query).get('format', ['json'])[-1]
+    if fmt not in CONTENT_TYPES:
+        raise RequestError(400, f"format must be one of {', '.join(CONTENT_TYPES)}")
+
+    etag = snapshot.etag(query, fmt)
+    response_headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Content-Type': CONTENT_TYPES[fmt],
+                        'X-Report-As-Of': pd.Timestamp(snapshot.as_of).isoformat()}
+    if_none_match = headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in
+                          (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))):
+        return 304, response_headers, b''
+    return 200, response_headers, snapshot.body(query, fmt)
+
+
+class ReportServer:
+    """
+    Serves a ReportStore over HTTP/1.1 with keep-alive, using asyncio streams from the standard library.
+    The server can run in the foreground with serve_forever() or next to the pipeline in a background
+    thread with start().
+    """
+
+    def __init__(self, store: ReportStore, host: str = API_HOST, port: int = API_PORT) -> None:
+        self.store = store
+        self.host = host
+        self.port = port
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, headers: Dict[str, str],
+                       body: bytes, head_only: bool, keep_alive: bool) -> None:
+        lines = [f'HTTP/1.1 {status} {_REASONS.get(status, "")}', f'Content-Length: {len(body)}',
+                 f'Connection: {"keep-alive" if keep_alive else "close"}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        writer.write(head if head_only else head + body)
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), _IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                headers: Dict[str, str] = {}
+                size = len(request_line)
+                while True:
+                    line = await reader.readline()
+                    size += len(line)
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    header_name, _, value = line.decode('latin-1').partition(':')
+                    headers[header_name.strip().lower()] = value.strip()
+                if size > _MAX_HEADER_BYTES:
+                    await self._respond(writer, 431, {}, b'', False, False)
+                    break
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {}, b'Malformed request line', False, False)
+                    break
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+
+                try:
+                    status, response_headers, body = handle_request(self.store, method, target, headers)
+                except RequestError as e:
+                    status, response_headers = e.status, {'Content-Type': CONTENT_TYPES['json']}
+                    body = json.dumps({'error': str(e)}).encode()
+                except Exception as e:
+                    logger.error("Failed to answer '%s': %s", target, e, exc_info=True)
+                    status, response_headers = 500, {'Content-Type': CONTENT_TYPES['json']}
+                    body = json.dumps({'error': 'internal error'}).encode()
+                await self._respond(writer, status, response_headers, body, method == 'HEAD', keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self) -> None:
+        """
+        Serves requests until cancelled.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=_MAX_HEADER_BYTES, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Serving the aged inventory reports on http://%s:%s/reports", self.host, self.port)
+        self._started.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> None:
+        """
+        Starts serving in a background daemon thread and waits until the server is listening.
+        """
+        def run() -> None:
+            try:
+                asyncio.run(self.serve_forever())
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error("Report API stopped: %s", e, exc_info=True)
+            finally:
+                self._started.set()
+
+        self._thread = threading.Thread(target=run, name='report-api', daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self) -> None:
+        """
+        Stops a server started with start().
+        """
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
@@ -0,0 +1,222 @@
+import os
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Optional
+from .file_utils import ShiftCalendar, load_shift_calendar, write_excel_sheets
+from .history import compact_partitions, record_snapshot
+from .log_config import configure_logging, worker_logging
+from .inventory_processing import REPORT_SPECS, process_inventory_data
+from .reporting import report_workbooks
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+BACKFILL_DIRECTORY = os.path.join('data', 'backfill')
+SAP_EXPORT_NAME = 'paint_inventory.xlsx'
+PAINT_EXPORT_NAME = 'paint_processed.csv'
+
+# Accepted snapshot directory names. Colons are not allowed in Windows paths, so times have none.
+SNAPSHOT_FORMATS = ('%Y-%m-%dT%H%M%S', '%Y-%m-%dT%H%M', '%Y-%m-%d_%H%M%S', '%Y-%m-%d_%H%M',
+                    '%Y-%m-%d %H%M%S', '%Y-%m-%d %H%M', '%Y%m%d_%H%M%S', '%Y%m%d_%H%M')
+
+
+@dataclass
+class Snapshot:
+    """
+    The exports taken at one point in time.
+
+    Attributes:
+        name (str): The snapshot directory's name.
+        as_of (datetime): The time the exports were taken, parsed from the directory name.
+        sap_path (str): The SAP export.
+        paint_path (str): The Paint Processed export.
+    """
+    name: str
+    as_of: datetime
+    sap_path: str
+    paint_path: str
+
+
+@dataclass
+class BackfillResult:
+    """
+    Outcome of backfilling one snapshot.
+
+    Attributes:
+        name (str): The snapshot directory's name.
+        rows (int): The number of report rows computed.
+        seconds (float): Wall time spent on the snapshot.
+        error (Optional[str]): The error message if the snapshot failed, otherwise None.
+    """
+    name: str
+    rows: int
+    seconds: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def parse_snapshot_time(name: str) -> Optional[datetime]:
+    """
+    Parses a snapshot directory name in one of SNAPSHOT_FORMATS, or returns None.
+    """
+    for snapshot_format in SNAPSHOT_FORMATS:
+        try:
+            as_of = datetime.strptime(name, snapshot_format)
+        except ValueError:
+            continue
+        # strptime accepts single digit fields, which would read '1430' as 14:03:00 with seconds
+        if as_of.strftime(snapshot_format) == name:
+            return as_of
+    return None
+
+
+def find_snapshots(directory: str, since: Optional[date] = None, until: Optional[date] = None) -> List[Snapshot]:
+    """
+    Lists the snapshots in a directory of historical exports, oldest first.
+
+    Args:
+        directory (str): The directory holding one subdirectory per snapshot.
+        since (Optional[date]): Skip snapshots taken before this date.
+        until (Optional[date]): Skip snapshots taken after this date.
+
+    Returns:
+        List[Snapshot]: The snapshots with an SAP export, sorted by time.
+    """
+    snapshots: List[Snapshot] = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not os.path.isdir(path):
+            continue
+        as_of = parse_snapshot_time(name)
+        if as_of is None:
+            logger.warning("Skipping '%s': the name is not a snapshot time such as 2024-03-01T0600.", path)
+            continue
+        if (since and as_of.date() < since) or (until and as_of.date() > until):
+            continue
+        sap_path = os.path.join(path, SAP_EXPORT_NAME)
+        if not os.path.exists(sap_path):
+            logger.warning("Skipping '%s': it has no %s.", path, SAP_EXPORT_NAME)
+            continue
+        snapshots.append(Snapshot(name, as_of, sap_path, os.path.join(path, PAINT_EXPORT_NAME)))
+    return sorted(snapshots, key=lambda snapshot: snapshot.as_of)
+
+
+def _backfill_snapshot(snapshot: Snapshot, calendar: ShiftCalendar, output_dir: str, history_root: Optional[str],
+                       excel: bool, workbook: Optional[str], cache_keep: int) -> BackfillResult:
+    """
+    Ages one snapshot and writes its outputs. Runs inside a worker process, so any error is returned
+    rather than raised and never affects the other snapshots.
+    """
+    start = time.perf_counter()
+    try:
+        # Snapshots are aged out of order, so the incremental aging state is never used
+        reports = dict(zip((spec.name for spec in REPORT_SPECS), process_inventory_data(
+            calendar, snapshot.as_of, state_path=None, sap_path=snapshot.sap_path,
+            paint_path=snapshot.paint_path, cache_dir=os.path.join(output_dir, 'cache'), cache_keep=cache_keep,
+            quarantine_dir=os.path.join(output_dir, 'quarantine'))))
+        if history_root is not None:
+            record_snapshot(reports, snapshot.as_of, history_root, compact=False)
+        if excel:
+            snapshot_dir = os.path.join(output_dir, snapshot.name)
+            os.makedirs(snapshot_dir, exist_ok=True)
+            workbooks = report_workbooks({
+                os.path.join(snapshot_dir, spec.filename): reports[spec.name] for spec in REPORT_SPECS
+            }, workbook=os.path.join(snapshot_dir, workbook) if workbook else None)
+            for filename, sheets in workbooks.items():
+                write_excel_sheets(sheets, filename)
+        rows = sum(len(report) for report in reports.values())
+        return BackfillResult(snapshot.name, rows, time.perf_counter() - start)
+    except Exception as e:
+        logger.error("Backfill of '%s' failed: %s", snapshot.name, e, exc_info=True)
+        return BackfillResult(snapshot.name, 0, time.perf_counter() - start, str(e) or type(e).__name__)
+
+
+def backfill(
+    snapshots: List[Snapshot],
+    calendar: ShiftCalendar,
+    output_dir: str = BACKFILL_DIRECTORY,
+    history: bool = True,
+    excel: bool = False,
+    workbook: Optional[str] = None,
+    max_workers: Optional[int] = None
+        ) -> List[BackfillResult]:
+    """
+    Recomputes the reports of every snapshot in a process pool.
+
+    Args:
+        snapshots (List[Snapshot]): The snapshots to recompute, e.g. from find_snapshots.
+        calendar (ShiftCalendar): The shift calendar every snapshot is aged with.
+        output_dir (str): Where the history, the per-snapshot reports, the quarantined rows and the ingest
+                          cache are written.
+                          The cache keeps every parsed export, so re-running a backfill after changing the
+                          report rules or shift calendar skips the Excel parse.
+        history (bool): Append each snapshot's aged rows to the snapshot history in output_dir/history.
+        excel (bool): Write each snapshot's reports to output_dir/<snapshot name>/.
+        workbook (Optional[str]): With excel, write all reports as sheets of one workbook of this name.
+        max_workers (Optional[int]): Maximum number of worker processes. Defaults to one per CPU.
+
+    Returns:
+        List[BackfillResult]: The outcome of each snapshot, in the order given.
+    """
+    history_root = os.path.join(output_dir, 'history') if history else None
+    results = {}
+    start = time.perf_counter()
+    initializer, initargs = worker_logging()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs) as executor:
+        futures = {executor.submit(_backfill_snapshot, snapshot, calendar, output_dir, history_root, excel,
+                                   workbook, max(len(snapshots), 5)): snapshot.name for snapshot in snapshots}
+        for done, future in enumerate(as_completed(futures), 1):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # The worker process itself died, e.g. it ran out of memory
+                results[name] = BackfillResult(name, 0, time.perf_counter() - start, str(e))
+            logger.info("Backfilled %s of %s snapshots ('%s': %s).", done, len(futures), name,
+                        'ok' if results[name].ok else results[name].error)
+
+    # Partitions are compacted once at the end, as concurrent workers append to the same days
+    if history_root is not None and os.path.isdir(history_root):
+        compact_partitions(history_root, before=date.max)
+
+    failed = sum(not result.ok for result in results.values())
+    logger.info("Backfilled %s of %s snapshots in %.2fs.", len(results) - failed, len(results),
+                time.perf_counter() - start)
+    return [results[snapshot.name] for snapshot in snapshots]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recompute the aged inventory reports over historical exports")
+    parser.add_argument('exports', help='directory with one subdirectory of exports per snapshot time')
+    parser.add_argument('--output', default=BACKFILL_DIRECTORY, help='where the results are written')
+    parser.add_argument('--since', type=date.fromisoformat, help='first snapshot date to include, YYYY-MM-DD')
+    parser.add_argument('--until', type=date.fromisoformat, help='last snapshot date to include, YYYY-MM-DD')
+    parser.add_argument('--shift-schedule', default='shift_schedules.txt', help='the shift parameters file')
+    parser.add_argument('--excel', action='store_true', help='also write Excel reports per snapshot')
+    parser.add_argument('--workbook', default=os.getenv("REPORT_WORKBOOK") or None,
+                        help='with --excel, write all reports as sheets of one workbook of this name')
+    parser.add_argument('--no-history', action='store_true', help='do not write the snapshot history')
+    parser.add_argument('--workers', type=int, help='maximum number of worker processes (default one per CPU)')
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    snapshots = find_snapshots(args.exports, args.since, args.until)
+    if not snapshots:
+        raise SystemExit(f"No snapshots found in '{args.exports}'.")
+    calendar = load_shift_calendar(args.shift_schedule)
+    results = backfill(snapshots, calendar, args.output, history=not args.no_history, excel=args.excel,
+                       workbook=args.workbook, max_workers=args.workers)
+    failed = [result.name for result in results if not result.ok]
+    if failed:
+        raise SystemExit(f"Backfill failed for {len(failed)} snapshots: {', '.join(failed)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+import os
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+import pandas as pd
+from .aging_state import AGING_STATE_PATH
+from .api import ReportStore
+from .delta import DELTA_WORKBOOK, compute_deltas, delta_sheets, load_previous_reports, save_previous_reports
+from .file_utils import ShiftCalendar, get_file_wait_timeout, load_shift_calendar, move_to_sharepoint, wait_for_file
+from .history import record_snapshot
+from .ingest import PAINT_PROCESSED_PATH, SAP_INVENTORY_PATH, load_paint_loaded, load_sap_inventory
+from .inventory_processing import (REPORT_SPECS, age_inventory, build_reports, build_upcoming_reports,
+                                   current_shift_end, next_crossing, prepare_inventory, project_aging)
+from .log_config import flush_repeats
+from .metrics import start_run, track_stage
+from .reporting import render_workbooks, report_workbooks
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+
+class InventoryDaemon:
+    """
+    Keeps the processing pipeline resident and re-runs only the stages affected by a change:
+
+    - a new SAP export re-ingests the inventory and re-ages it
+    - a new Paint Processed export only reloads the LOADED quantities
+    - a changed shift calendar, or the refresh timer, re-ages the inventory already in memory
+    - so does the projected time at which the next row crosses its report's threshold, or the
+      current shift ends, so reports update when they change rather than on the next poll of the timer
+
+    Reports are then rebuilt, and only those whose content changed are rendered and published, together
+    with the delta workbook of the rows aged and cleared since the last cycle that published.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = 'data',
+        refresh_interval: float = 300.0,
+        poll_interval: float = 5.0,
+        dest_dir: Optional[str] = None,
+        workbook: Optional[str] = None,
+        record_history: bool = True,
+        report_store: Optional[ReportStore] = None
+            ) -> None:
+        """
+        Args:
+            output_dir (str): The directory the reports are written to.
+            refresh_interval (float): Seconds between re-aging the inventory when no input has changed.
+            poll_interval (float): Seconds between checks of the input files.
+            dest_dir (Optional[str]): The SharePoint directory to publish to. Reports are not published if None.
+            workbook (Optional[str]): If provided, the reports are written as sheets of this workbook name.
+            record_history (bool): Whether cycles with changed reports are appended to the snapshot history.
+            report_store (Optional[ReportStore]): If provided, changed reports are published to it for the
+                                                  HTTP API.
+        """
+        self.output_dir = output_dir
+        self.refresh_interval = refresh_interval
+        self.poll_interval = poll_interval
+        self.dest_dir = dest_dir
+        self.workbook = workbook
+        self.record_history = record_history
+        self.report_store = report_store
+
+        self._signatures: Dict[str, Tuple[int, int]] = {}
+        self._calendar: Optional[ShiftCalendar] = None
+        self._inventory: Optional[pd.DataFrame] = None
+        self._report_rows: Optional[Dict[str, np.ndarray]] = None
+        self._aged: Optional[pd.DataFrame] = None
+        self._aged_at = float('-inf')
+        self._refresh_at: Optional[pd.Timestamp] = None
+        self._shift_end: Optional[pd.Timestamp] = None
+        self._paint_loaded: Optional[pd.DataFrame] = None
+        self._reports: Dict[str, pd.DataFrame] = {}
+        self._upcoming: Dict[str, pd.DataFrame] = {}
+        # Rendered files not yet published, retried every cycle until publishing succeeds
+        self._unpublished: Set[str] = set()
+        # The reports that become the delta baseline once everything rendered with them is published
+        self._baseline: Optional[Tuple[Dict[str, pd.DataFrame], datetime]] = None
+
+    def _input_changed(self, path: str) -> bool:
+        """
+        Checks whether an input file is new or was modified since it was last loaded, waiting for
+        a changed file to finish being written.
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if self._signatures.get(path) == (stat.st_mtime_ns, stat.st_size):
+            return False
+        if not wait_for_file(path, timeout=get_file_wait_timeout()):
+            logger.warning("'%s' is still being written, deferring to the next poll.", path)
+            return False
+        stat = os.stat(path)
+        self._signatures[path] = (stat.st_mtime_ns, stat.st_size)
+        logger.info("Detected new input '%s'.", path)
+        return True
+
+    def run_once(self, as_of: Optional[datetime] = None) -> List[str]:
+        """
+        Runs a single watch cycle, then publishes the rendered files that have not been published yet.
+
+        Args:
+            as_of (Optional[datetime]): The time the elapsed hours are evaluated at. Defaults to now.
+
+        Returns:
+            List[str]: The names of the reports that changed and were re-rendered.
+        """
+        changed = self._refresh(as_of or datetime.now())
+        self._publish_pending()
+        return changed
+
+    def _publish_pending(self) -> None:
+        """
+        Publishes every rendered file not published yet. Files stay pending until a publish succeeds, so a
+        failed publish is retried on the next cycle even if no report changes in between.
+        """
+        if not self.dest_dir or not self._unpublished:
+            return
+        files = sorted(self._unpublished)
+        try:
+            with track_stage('publish', rows=len(files)):
+                move_to_sharepoint(source_dir=self.output_dir, dest_dir=self.dest_dir, files_to_move=files)
+            self._unpublished.difference_update(files)
+        except Exception as e:
+            logger.error("Publishing failed, will retry on the next cycle: %s", e)
+            return
+        self._save_baseline()
+
+    def _save_baseline(self) -> None:
+        """
+        Makes the last rendered reports the baseline of the next delta workbook, so that each delta lists
+        the changes since what readers last saw.
+        """
+        if self._baseline is not None:
+            save_previous_reports(*self._baseline)
+            self._baseline = None
+
+    def _refresh(self, as_of: datetime) -> List[str]:
+        """
+        Re-runs the stages affected by changed inputs and renders the reports whose content changed.
+        """
+        inventory_changed = self._input_changed(SAP_INVENTORY_PATH)
+        paint_changed = self._input_changed(PAINT_PROCESSED_PATH)
+        calendar = load_shift_calendar()
+        calendar_changed = calendar is not self._calendar
+        self._calendar = calendar
+
+        if inventory_changed:
+            with track_stage('ingest') as stage:
+                inventory = load_sap_inventory()
+                stage.rows = len(inventory)
+            with track_stage('filter', rows=len(inventory)):
+                self._inventory, self._report_rows = prepare_inventory(inventory)
+        if self._inventory is None:
+            return []
+
+        refresh_due = (time.monotonic() - self._aged_at >= self.refresh_interval or
+                       (self._refresh_at is not None and pd.Timestamp(as_of) >= self._refresh_at))
+        if inventory_changed or calendar_changed or refresh_due:
+            with track_stage('aging', profile=True) as stage:
+                aged = age_inventory(self._inventory, self._report_rows, calendar, as_of, AGING_STATE_PATH)
+                stage.rows = int(aged['hours_elapsed'].notna().sum())
+            with track_stage('projection') as stage:
+                self._aged = project_aging(aged, self._report_rows, calendar)
+                stage.rows = int(self._aged['ages_at'].notna().sum())
+            self._aged_at = time.monotonic()
+
+            # Refresh again as soon as a row ages or the shift ends, whichever comes first
+            self._shift_end = current_shift_end(as_of, calendar)
+            refresh_times = [time for time in (next_crossing(self._aged, as_of), self._shift_end) if time is not None]
+            self._refresh_at = min(refresh_times) if refresh_times else None
+            if self._refresh_at is not None:
+                logger.info("Next aging refresh due at %s.", self._refresh_at)
+        elif not paint_changed:
+            return []
+
+        with track_stage('merge') as stage:
+            if paint_changed or self._paint_loaded is None:
+                self._paint_loaded = load_paint_loaded() if any(spec.merge_paint for spec in REPORT_SPECS) else None
+            reports = build_reports(self._aged, self._report_rows, self._paint_loaded)
+            upcoming = build_upcoming_reports(self._aged, self._report_rows, self._paint_loaded, self._shift_end)
+            stage.rows = sum(len(report) for report in reports.values())
+
+        # Only render and publish the reports whose content, or rows aging this shift, changed
+        def unchanged(name: str) -> bool:
+            return (name in self._reports and reports[name].equals(self._reports[name]) and
+                    (name not in upcoming or upcoming[name].equals(self._upcoming.get(name))))
+
+        changed = [name for name in reports if not unchanged(name)]
+        if not changed:
+            logger.info("Reports are unchanged.")
+            return []
+
+        # The API serves the reports as soon as they are built, whether or not they render
+        if self.report_store is not None:
+            self.report_store.publish(reports, as_of)
+
+        if self.record_history:
+            try:
+                with track_stage('history', rows=sum(len(report) for report in reports.values())):
+                    record_snapshot(reports, as_of)
+            except Exception as e:
+                logger.warning("Could not record the cycle in the snapshot history: %s", e)
+
+        specs = {spec.name: spec for spec in REPORT_SPECS}
+        rendering = list(reports) if self.workbook is not None else changed
+        outputs = {os.path.join(self.output_dir, specs[name].filename): reports[name] for name in rendering}
+        workbooks = report_workbooks(outputs, workbook=os.path.join(self.output_dir, self.workbook)
+                                     if self.workbook is not None else None,
+                                     upcoming={os.path.join(self.output_dir, specs[name].filename): upcoming[name]
+                                               for name in rendering if name in upcoming})
+        delta_filename = os.path.join(self.output_dir, DELTA_WORKBOOK)
+        workbooks[delta_filename] = delta_sheets(compute_deltas(reports, load_previous_reports()))
+        with track_stage('render', rows=sum(len(report) for report in outputs.values())):
+            results = render_workbooks(workbooks)
+
+        # Keep failed reports marked as changed so that they are retried on the next cycle
+        rendered = {os.path.basename(result.filename) for result in results if result.ok}
+        for name in changed:
+            if self.workbook is not None or specs[name].filename in rendered:
+                self._reports[name] = reports[name]
+                if name in upcoming:
+                    self._upcoming[name] = upcoming[name]
+
+        self._unpublished.update(rendered)
+        # A cycle whose workbooks all rendered becomes the baseline once they are published
+        if all(result.ok for result in results):
+            self._baseline = (reports, as_of)
+            if not self.dest_dir:
+                self._save_baseline()
+        return changed
+
+    def run(self, max_cycles: Optional[int] = None) -> None:
+        """
+        Watches the inputs until interrupted, running a cycle every poll_interval seconds.
+
+        Args:
+            max_cycles (Optional[int]): Stop after this many cycles. Runs indefinitely if None.
+        """
+        logger.info("Watching '%s' and '%s' for new exports.", SAP_INVENTORY_PATH, PAINT_PROCESSED_PATH)
+        cycles = 0
+        try:
+            while max_cycles is None or cycles < max_cycles:
+                # Cycles that did any work are recorded in the run metrics like a one-shot run
+                run = start_run()
+                success = False
+                try:
+                    self.run_once()
+                    success = True
+                except Exception as e:
+                    logger.error("Watch cycle failed: %s", e, exc_info=True)
+                if run.stages:
+                    run.write(success)
+                flush_repeats()
+                cycles += 1
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Stopped watching for new exports.")
@@ -0,0 +1,109 @@
+import os
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from .aging_state import key_hashes
+from .file_utils import write_atomic
+from .history import HISTORY_COLUMNS, snapshot_frame
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+PREVIOUS_REPORTS_PATH = os.path.join('data', 'cache', 'previous_reports.parquet')
+DELTA_WORKBOOK = 'aged_delta.xlsx'
+
+
+@dataclass
+class ReportDelta:
+    """
+    Changes to one report since the previous run, keyed by Material, Storage Bin and placement time.
+
+    Attributes:
+        newly_aged (DataFrame): Rows of the current report that were not in the previous run's report.
+        still_aged (DataFrame): Rows of the current report that were already in the previous run's report.
+        cleared (DataFrame): Rows of the previous run's report that are no longer reported, in the
+                             snapshot layout of modules.history with 'run_time' as the time last seen.
+    """
+    newly_aged: DataFrame
+    still_aged: DataFrame
+    cleared: DataFrame
+
+
+def load_previous_reports(path: str = PREVIOUS_REPORTS_PATH) -> Optional[DataFrame]:
+    """
+    Loads the report rows stored by the previous run, or None if there is no previous run.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        logger.warning("Could not read previous reports '%s', treating every row as newly aged: %s", path, e)
+        return None
+
+
+def save_previous_reports(reports: Dict[str, DataFrame], run_time: datetime,
+                          path: str = PREVIOUS_REPORTS_PATH) -> None:
+    """
+    Stores this run's report rows for the next run's comparison. The file is replaced atomically.
+    """
+    try:
+        snapshot = snapshot_frame(reports, run_time)
+        write_atomic(path, lambda temp_path: snapshot.to_parquet(temp_path, index=False))
+    except ImportError as e:
+        logger.warning("Parquet support is not installed, delta reports will treat every row as new: %s", e)
+    except Exception as e:
+        logger.warning("Could not store reports for the next delta '%s': %s", path, e)
+
+
+def compute_deltas(reports: Dict[str, DataFrame], previous: Optional[DataFrame]) -> Dict[str, ReportDelta]:
+    """
+    Compares each report with the previous run's rows of the same report using hash joins on
+    Material, Storage Bin and last_stock_placement.
+
+    Args:
+        reports (Dict[str, DataFrame]): The current report DataFrames keyed by report name.
+        previous (Optional[DataFrame]): The previous run's rows from load_previous_reports. None treats
+                                        every current row as newly aged.
+
+    Returns:
+        Dict[str, ReportDelta]: The changes to each report, keyed by report name.
+    """
+    if previous is None:
+        previous = DataFrame({column: pd.Series(dtype=object) for column in HISTORY_COLUMNS})
+    by_report = dict(tuple(previous.groupby('report', sort=False, observed=True)))
+
+    deltas: Dict[str, ReportDelta] = {}
+    for name, report in reports.items():
+        before = by_report.get(name, previous.iloc[:0])
+        current_hashes = key_hashes(report)
+        previous_hashes = key_hashes(before) if len(before) else np.empty(0, dtype=np.uint64)
+
+        was_aged = np.isin(current_hashes, previous_hashes)
+        still_reported = np.isin(previous_hashes, current_hashes)
+        deltas[name] = ReportDelta(newly_aged=report[~was_aged], still_aged=report[was_aged],
+                                   cleared=before[~still_reported].drop(columns='report'))
+        logger.info("%s: %s newly aged, %s still aged, %s cleared since the last run.", name,
+                    (~was_aged).sum(), was_aged.sum(), (~still_reported).sum())
+    return deltas
+
+
+def delta_sheets(deltas: Dict[str, ReportDelta]) -> Dict[str, DataFrame]:
+    """
+    Lays the newly aged and cleared rows of each report out as worksheets of the delta workbook.
+
+    Args:
+        deltas (Dict[str, ReportDelta]): The changes to each report from compute_deltas.
+
+    Returns:
+        Dict[str, DataFrame]: The worksheets keyed by sheet name, e.g. 'aged_load_inv newly aged'.
+    """
+    sheets: Dict[str, DataFrame] = {}
+    for name, delta in deltas.items():
+        sheets[f'{name} newly aged'] = delta.newly_aged
+        sheets[f'{name} cleared'] = delta.cleared.rename(columns={'run_time': 'last_seen'})
+    return sheets
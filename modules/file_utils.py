@@ -1,18 +1,95 @@
 import os
+import time
 import shutil
+import hashlib
 import logging
-from typing import Dict, List, Tuple, Optional
-from openpyxl.styles import PatternFill, Font, Border, Side, NamedStyle
+import tempfile
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Tuple, Optional, FrozenSet
 import pandas as pd
 from pandas import DataFrame
+from .log_config import THROTTLED
+
+try:
+    import xlsxwriter
+except ImportError:  # Streaming Excel output is optional, openpyxl is used without it
+    xlsxwriter = None
 
 # Get a logger for this module
 logger = logging.getLogger(__name__)
 
-def copy_and_rename_files() -> None:
+# Column formatted as a date in the Excel reports
+EXCEL_DATE_COLUMN = 'Last addtn to stock'
+
+def get_file_wait_timeout() -> float:
+    """
+    Returns the number of seconds to wait for downloaded or exported files, from the FILE_WAIT_TIMEOUT
+    environment variable. Defaults to 120 seconds.
+    """
+    try:
+        return float(os.getenv("FILE_WAIT_TIMEOUT", 120))
+    except ValueError:
+        logger.warning("Invalid FILE_WAIT_TIMEOUT '%s', using 120 seconds.", os.getenv('FILE_WAIT_TIMEOUT'))
+        return 120.0
+
+
+def wait_for_file(
+    path: str,
+    timeout: float = 120.0,
+    settle_time: float = 1.0,
+    poll_interval: float = 0.25,
+    newer_than: Optional[float] = None
+        ) -> bool:
+    """
+    Waits until a file exists and has finished being written, i.e. its size and modification time have not
+    changed for settle_time seconds. Returns as soon as that is the case rather than after a fixed delay.
+
+    Parameters:
+        path (str): The path of the file to wait for.
+        timeout (float): The maximum number of seconds to wait.
+        settle_time (float): The number of seconds the file must remain unchanged to be considered complete.
+        poll_interval (float): The number of seconds between checks of the file.
+        newer_than (Optional[float]): If provided, only a file modified at or after this epoch time counts,
+                                      so that a stale copy from an earlier run is not picked up.
+
+    Returns:
+        bool: True if the file arrived and settled within the timeout, otherwise False.
+    """
+    deadline = time.monotonic() + timeout
+    last_seen: Optional[Tuple[int, int]] = None
+    unchanged_since = 0.0
+    while True:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+
+        now = time.monotonic()
+        if stat is not None and (newer_than is None or stat.st_mtime >= newer_than):
+            # A file that was last modified more than settle_time ago is already complete
+            if time.time() - stat.st_mtime >= settle_time:
+                return True
+            if (stat.st_size, stat.st_mtime_ns) != last_seen:
+                last_seen = (stat.st_size, stat.st_mtime_ns)
+                unchanged_since = now
+            elif now - unchanged_since >= settle_time:
+                return True
+
+        if now >= deadline:
+            return False
+        time.sleep(min(poll_interval, max(deadline - now, 0)))
+
+
+def copy_and_rename_files(newer_than: Optional[float] = None) -> None:
     """
     Copies specified files from their source locations, renames them, and places them in the current directory.
+    Waits up to FILE_WAIT_TIMEOUT seconds for each file to arrive before copying it.
     Includes error handling for missing files and logs each step of the process.
+
+    Parameters:
+        newer_than (Optional[float]): The epoch time the acquisition started. If provided, exports modified
+                                      before it are left behind by an earlier run and are waited past.
     """
     if not os.path.exists('data'):
         os.mkdir('data')            # Create data directory if it does not already exist
@@ -24,34 +101,139 @@ def copy_and_rename_files() -> None:
     # Define the files to be copied and their new names
     paint_processed_file = 'Paint Processed.csv'
     export_file = 'paint_inventory.XLSX'
+    timeout = get_file_wait_timeout()
     
     try:
         # Copy and rename "Paint Processed.csv"
         src = os.path.join(downloads_path, paint_processed_file)
-        dest = os.path.join(base_directory, r'data\paint_processed.csv')
+        dest = os.path.join(base_directory, 'data', 'paint_processed.csv')
+        if not wait_for_file(src, timeout=timeout, newer_than=newer_than):
+            raise FileNotFoundError(f"'{src}' did not arrive within {timeout:.0f} seconds")
         shutil.copy(src, dest)
-        logger.info(f"Successfully copied '{paint_processed_file}' to '{dest}'.")
+        logger.info("Successfully copied '%s' to '%s'.", paint_processed_file, dest)
 
         # Remove the original file from Downloads
         os.remove(src)
-        logger.info(f"Successfully removed '{paint_processed_file}' from {downloads_path}.")
+        logger.info("Successfully removed '%s' from %s.", paint_processed_file, downloads_path)
         
     except FileNotFoundError as e:
-        logger.error(f"File not found: {paint_processed_file} not found in {downloads_path}. Details: {e}")
+        logger.error("File not found: %s not found in %s. Details: %s", paint_processed_file, downloads_path, e)
     except Exception as e:
-        logger.error(f"An error occurred while copying/renaming {paint_processed_file}: {e}", exc_info=True)
+        logger.error("An error occurred while copying/renaming %s: %s", paint_processed_file, e, exc_info=True)
 
     try:
         # Copy and rename "paint_inventory.XLSX"
         src = os.path.join(sap_gui_path, export_file)
-        dest = os.path.join(base_directory, 'data/paint_inventory.xlsx')
+        dest = os.path.join(base_directory, 'data', 'paint_inventory.xlsx')
+        if not wait_for_file(src, timeout=timeout, newer_than=newer_than):
+            raise FileNotFoundError(f"'{src}' did not arrive within {timeout:.0f} seconds")
         shutil.copy(src, dest)
-        logger.info(f"Successfully copied '{export_file}' to '{dest}'.")
+        logger.info("Successfully copied '%s' to '%s'.", export_file, dest)
         
     except FileNotFoundError as e:
-        logger.error(f"File not found: {export_file} not found in {sap_gui_path}. Details: {e}")
+        logger.error("File not found: %s not found in %s. Details: %s", export_file, sap_gui_path, e)
     except Exception as e:
-        logger.error(f"An error occurred while copying/renaming {export_file}: {e}", exc_info=True)
+        logger.error("An error occurred while copying/renaming %s: %s", export_file, e, exc_info=True)
+
+
+def file_digest(filename: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA-256 hash of a file's content, reading it in chunks.
+
+    Parameters:
+        filename (str): The path of the file to hash.
+        chunk_size (int): The number of bytes read at a time.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_atomic(path: str, write: Callable[[str], None], suffix: str = '.tmp') -> None:
+    """
+    Writes a file through a uniquely named temporary file in the same directory, which is then renamed
+    over the target, so that readers and concurrent writers never see a partial file.
+
+    Parameters:
+        path (str): The file to write.
+        write (Callable[[str], None]): Writes the content to the path it is given.
+        suffix (str): The suffix of the temporary file, for writers that check the file extension.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix=suffix)
+    os.close(handle)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _parse_date_list(value: str) -> List[date]:
+    """
+    Parses a comma-separated list of ISO dates. Entries of the form 'YYYY-MM-DD..YYYY-MM-DD'
+    are expanded to every date in the (inclusive) range.
+    """
+    dates: List[date] = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if '..' in entry:
+            first, last = (date.fromisoformat(part.strip()) for part in entry.split('..'))
+            dates.extend(first + timedelta(days=offset) for offset in range((last - first).days + 1))
+        else:
+            dates.append(date.fromisoformat(entry))
+    return dates
+
+
+def _parse_shift_windows(value: str) -> List[Tuple[int, int, int, int]]:
+    """
+    Parses a comma-separated list of 'HH:MM-HH:MM' shift windows. A window ending before it
+    starts is an overnight shift.
+    """
+    windows: List[Tuple[int, int, int, int]] = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        start, end = entry.split('-')
+        start_hour, start_minute = (int(part) for part in start.strip().split(':'))
+        end_hour, end_minute = (int(part) for part in end.strip().split(':'))
+        windows.append((start_hour, start_minute, end_hour % 24, end_minute))
+    return windows
+
+
+def _parse_shift_parameters(lines: List[str], filename: str) -> Dict[str, object]:
+    """
+    Parses the lines of a shift parameters file. Invalid lines are logged and skipped.
+    """
+    parameters: Dict[str, object] = {}
+    for line in lines:
+        if line.strip() and not line.strip().startswith('#'):
+            try:
+                key, value = line.strip().split('=')
+                key = key.strip()
+                value = value.strip()
+                if key in ['first_shift', 'second_shift', 'include_saturday']:
+                    parameters[key] = value.lower() in ('true', '1')
+                elif key in ['first_hours', 'second_hours']:
+                    parameters[key] = int(value)
+                elif key == 'shift_windows':
+                    parameters[key] = _parse_shift_windows(value)
+                elif key in ['holidays', 'shutdown_days']:
+                    parameters[key] = _parse_date_list(value)
+            except ValueError:
+                logger.warning("Skipping invalid line in '%s': %s", filename, line.strip(), extra=THROTTLED)
+    return parameters
 
 
 def read_shift_parameters(filename: str = 'shift_schedules.txt') -> Dict[str, object]:
@@ -71,23 +253,12 @@ def read_shift_parameters(filename: str = 'shift_schedules.txt') -> Dict[str, ob
             lines = file.readlines()
         #logger.info(f"Successfully read shift parameters from '{filename}'.")
 
-        for line in lines:
-            if line.strip() and not line.strip().startswith('#'):
-                try:
-                    key, value = line.strip().split('=')
-                    key = key.strip()
-                    value = value.strip()
-                    if key in ['first_shift', 'second_shift', 'include_saturday']:
-                        parameters[key] = value.lower() in ('true', '1')
-                    elif key in ['first_hours', 'second_hours']:
-                        parameters[key] = int(value)
-                except ValueError:
-                    logger.warning(f"Skipping invalid line in '{filename}': {line.strip()}")
+        parameters = _parse_shift_parameters(lines, filename)
                 
     except FileNotFoundError as e:
-        logger.error(f"File not found: {filename}. Details: {e}")
+        logger.error("File not found: %s. Details: %s", filename, e)
     except Exception as e:
-        logger.error(f"An error occurred while reading '{filename}': {e}", exc_info=True)
+        logger.error("An error occurred while reading '%s': %s", filename, e, exc_info=True)
 
     return parameters
 
@@ -106,6 +277,10 @@ def get_work_shifts(parameters: Dict[str, object]) -> List[Tuple[int, int, int,
     shifts: List[Tuple[int, int, int, int]] = []
     
     try:
+        # Explicit shift windows take precedence over the fixed 8/10 hour shift patterns
+        if parameters.get('shift_windows'):
+            return list(parameters['shift_windows'])
+
         if parameters.get('first_shift', True):
             first_hours = int(parameters.get('first_hours', 8))
             if first_hours == 8:
@@ -128,7 +303,7 @@ def get_work_shifts(parameters: Dict[str, object]) -> List[Tuple[int, int, int,
                 shifts.append((1, 0, 5, 0))  # Second shift night
                 #logger.info("Configured second shift for 10 hours.")
     except Exception as e:
-        logger.error(f"An error occurred while determining work shifts: {e}", exc_info=True)
+        logger.error("An error occurred while determining work shifts: %s", e, exc_info=True)
     
     return shifts
 
@@ -153,77 +328,267 @@ def get_work_days(parameters: Dict[str, object]) -> List[int]:
             #logger.info("Saturday not included as a work day.")
             pass
     except Exception as e:
-        logger.error(f"An error occurred while determining work days: {e}", exc_info=True)
+        logger.error("An error occurred while determining work days: %s", e, exc_info=True)
 
     return work_days
 
-def save_to_excel(df: DataFrame, filename: str) -> None:
+
+def get_closed_dates(parameters: Dict[str, object]) -> List[date]:
     """
-    Applies specific formatting to Excel files for this project and saves them.
-    
+    Determines the calendar dates on which no shifts are worked (holidays and plant shutdowns),
+    based on parameters returned from read_shift_parameters.
+
     Parameters:
-        df (DataFrame): The DataFrame to save and format in Excel.
-        filename (str): The path where the Excel file will be saved.
+        parameters (Dict[str, object]): A dictionary containing shift configuration.
+
+    Returns:
+        List[date]: A sorted list of dates without any working shifts.
     """
+    closed_dates = set(parameters.get('holidays', [])) | set(parameters.get('shutdown_days', []))
+    return sorted(closed_dates)
+
+
+@dataclass(frozen=True)
+class ShiftCalendar:
+    """
+    Compiled shift configuration used for working-hour calculations.
+
+    Attributes:
+        work_shifts (Tuple[Tuple[int, int, int, int], ...]): Shift windows as (start_hour, start_minute, end_hour, end_minute).
+        work_days (Tuple[int, ...]): Weekdays (0 = Monday, 6 = Sunday) on which the shifts are worked.
+        closed_dates (FrozenSet[date]): Holidays and shutdown days on which no shifts are worked.
+        digest (str): SHA-256 hash of the shift parameters file the calendar was compiled from.
+    """
+    work_shifts: Tuple[Tuple[int, int, int, int], ...]
+    work_days: Tuple[int, ...]
+    closed_dates: FrozenSet[date]
+    digest: str
+
+
+# Compiled calendars keyed by absolute file path, stored with the file's mtime and content hash
+_calendar_cache: Dict[str, Tuple[int, ShiftCalendar]] = {}
+
+
+def load_shift_calendar(filename: str = 'shift_schedules.txt') -> ShiftCalendar:
+    """
+    Reads and compiles the shift parameters file into a ShiftCalendar. The compiled calendar is
+    memoized and only rebuilt when the file's modification time and content hash have changed.
+
+    Parameters:
+        filename (str): The path to the shift parameters file. Default is 'shift_schedules.txt'.
+
+    Returns:
+        ShiftCalendar: The compiled shift calendar.
+    """
+    path = os.path.abspath(filename)
     try:
-        # Define styles
-        header_fill = PatternFill(start_color='D3D3D3', end_color='D3D3D3', fill_type='solid')
-        bold_font = Font(bold=True)
-        border = Border(left=Side(border_style='thin'), right=Side(border_style='thin'), 
-                        top=Side(border_style='thin'), bottom=Side(border_style='thin'))
-        date_style = NamedStyle(name='date_style', number_format='YYYY-MM-DD')
+        mtime = os.stat(path).st_mtime_ns
+        cached = _calendar_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
 
-        logger.info("Starting Excel write operation to '%s'.", filename)
+        with open(path, 'rb') as file:
+            content = file.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if cached is not None and cached[1].digest == digest:
+            _calendar_cache[path] = (mtime, cached[1])
+            return cached[1]
 
-        # Define writer
-        writer = pd.ExcelWriter(filename, engine='openpyxl')
-        
+        parameters = _parse_shift_parameters(content.decode().splitlines(), filename)
+        logger.info("Compiled shift calendar from '%s'.", filename)
+
+    except FileNotFoundError as e:
+        logger.error("File not found: %s. Details: %s", filename, e)
+        mtime, digest, parameters = None, '', {}
+
+    calendar = ShiftCalendar(
+        work_shifts=tuple(get_work_shifts(parameters)),
+        work_days=tuple(get_work_days(parameters)),
+        closed_dates=frozenset(get_closed_dates(parameters)),
+        digest=digest,
+    )
+    if mtime is not None:
+        _calendar_cache[path] = (mtime, calendar)
+    return calendar
+
+def _excel_column_widths(df: DataFrame) -> List[int]:
+    """
+    Computes Excel column widths from the DataFrame: the longest string representation of any
+    non-empty value (or the header), plus a little extra space.
+    """
+    widths: List[int] = []
+    for column in df.columns:
+        values = df[column]
+        max_length = len(str(column))
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = values.dropna()
+            if not values.empty:
+                # Datetimes are written in full, with microseconds only when present
+                max_length = max(max_length, 26 if (values.dt.microsecond != 0).any() else 19)
+        else:
+            values = values[values.notna()]
+            values = values[values.astype(bool)]
+            if not values.empty:
+                max_length = max(max_length, int(values.astype(str).str.len().max()))
+        widths.append(max_length + 2)
+    return widths
+
+
+def _write_sheet_streaming(workbook: object, formats: Dict[str, object], df: DataFrame, sheet_name: str) -> None:
+    """
+    Writes the DataFrame to a new worksheet in a single streaming pass.
+    Borders and number formats are applied per column rather than per cell.
+    """
+    sheet = workbook.add_worksheet(sheet_name)
+
+    column_formats = []
+    values = {}
+    for column, width in zip(df.columns, _excel_column_widths(df)):
+        values[column] = df[column]
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            # Excel stores datetimes as fractional days since 1899-12-30, converted here in one pass
+            values[column] = (df[column] - pd.Timestamp('1899-12-30')) / pd.Timedelta(days=1)
+        if column == EXCEL_DATE_COLUMN:
+            column_format = formats['date']
+        elif pd.api.types.is_datetime64_any_dtype(df[column]):
+            column_format = formats['datetime']
+        else:
+            column_format = formats['cell']
+        column_formats.append(column_format)
+        sheet.set_column(len(column_formats) - 1, len(column_formats) - 1, width, column_format)
+
+    sheet.write_row(0, 0, [str(column) for column in df.columns], formats['header'])
+
+    # Rows without missing values inherit the column formats; missing values and empty strings, which
+    # xlsxwriter would skip, are written as formatted blanks so that they keep their borders
+    missing = df.isna().to_numpy(copy=True)
+    for column_number, column in enumerate(df.columns):
+        if pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column]):
+            missing[:, column_number] |= (df[column] == '').to_numpy(dtype=bool, na_value=False)
+    rows = zip(*(column_values.tolist() for column_values in values.values()))
+    for row_number, (row, row_missing) in enumerate(zip(rows, missing), start=1):
+        if not row_missing.any():
+            sheet.write_row(row_number, 0, row)
+            continue
+        for column_number, value in enumerate(row):
+            if row_missing[column_number]:
+                sheet.write_blank(row_number, column_number, None, column_formats[column_number])
+            else:
+                sheet.write(row_number, column_number, value)
+
+
+def _save_sheets_streaming(sheets: Dict[str, DataFrame], filename: str) -> None:
+    """
+    Writes each DataFrame to its own worksheet with xlsxwriter's constant memory mode.
+    """
+    # Strings are written verbatim, as openpyxl does for DataFrame values, skipping xlsxwriter's URL detection
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True, 'strings_to_urls': False})
+    try:
+        formats = {
+            'header': workbook.add_format({'bold': True, 'bg_color': '#D3D3D3', 'pattern': 1, 'border': 1,
+                                           'align': 'center', 'valign': 'top'}),
+            'cell': workbook.add_format({'border': 1}),
+            'date': workbook.add_format({'border': 1, 'num_format': 'YYYY-MM-DD'}),
+            'datetime': workbook.add_format({'border': 1, 'num_format': 'YYYY-MM-DD HH:MM:SS'}),
+        }
+        for sheet_name, df in sheets.items():
+            _write_sheet_streaming(workbook, formats, df, sheet_name)
+            logger.debug("DataFrame written to Excel in sheet '%s'.", sheet_name)
+    finally:
+        workbook.close()
+
+
+def _save_sheets_openpyxl(sheets: Dict[str, DataFrame], filename: str) -> None:
+    """
+    Writes each DataFrame to its own worksheet with pandas and formats the cells with openpyxl.
+    """
+    # Imported here rather than at module level to keep openpyxl out of the startup path
+    from openpyxl.styles import PatternFill, Font, Border, Side, NamedStyle
+    from openpyxl.utils import get_column_letter
+
+    # Define styles
+    header_fill = PatternFill(start_color='D3D3D3', end_color='D3D3D3', fill_type='solid')
+    bold_font = Font(bold=True)
+    border = Border(left=Side(border_style='thin'), right=Side(border_style='thin'), 
+                    top=Side(border_style='thin'), bottom=Side(border_style='thin'))
+    date_style = NamedStyle(name='date_style', number_format='YYYY-MM-DD')
+
+    # Define writer
+    writer = pd.ExcelWriter(filename, engine='openpyxl')
+
+    for sheet_name, df in sheets.items():
         # Write DataFrame to Excel
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-        logger.info("DataFrame written to Excel in sheet 'Sheet1'.")
+        df.to_excel(writer, index=False, sheet_name=sheet_name)
+        logger.debug("DataFrame written to Excel in sheet '%s'.", sheet_name)
 
         # Access the workbook and sheet
         workbook = writer.book
-        sheet = workbook['Sheet1']
+        sheet = workbook[sheet_name]
 
-        # Format 'Last addtn to stock' column as date (assuming it's column H)
-        for cell in sheet['H']:  # Adjust if 'Last addtn to stock' column changes
-            if cell.row != 1:  # Skip the header row
+        # Format 'Last addtn to stock' column as date, located by name
+        if EXCEL_DATE_COLUMN in df.columns:
+            date_column = get_column_letter(df.columns.get_loc(EXCEL_DATE_COLUMN) + 1)
+            for cell in sheet[date_column][1:]:  # Skip the header row
                 cell.style = date_style
-        logger.info("Applied date formatting to 'Last addtn to stock' column.")
+            logger.debug("Applied date formatting to '%s' column.", EXCEL_DATE_COLUMN)
 
         # Apply borders to all cells
         for row in sheet.iter_rows():
             for cell in row:
                 cell.border = border
-        logger.info("Applied borders to all cells in the worksheet.")
+        logger.debug("Applied borders to all cells in the worksheet.")
 
         # Apply styles to header
         for cell in sheet[1]:
             cell.fill = header_fill
             cell.font = bold_font
-        logger.info("Formatted header row with bold font and gray fill.")
-
-        # Adjust column widths based on cell content
-        for column in sheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter  # Get the column letter
-            for cell in column:
-                try:
-                    if cell.value:
-                        length = len(str(cell.value))
-                        if length > max_length:
-                            max_length = length
-                except Exception as e:
-                    logger.warning("Error processing cell '%s' for column width adjustment: %s", cell.coordinate, e)
-            adjusted_width = max_length + 2  # Add a little extra space
-            sheet.column_dimensions[column_letter].width = adjusted_width
-        logger.info("Adjusted column widths based on content.")
-
-        # Save the formatted Excel file
-        writer._save()
-        logger.info("Successfully saved the Excel file to '%s'.", filename)
+        logger.debug("Formatted header row with bold font and gray fill.")
+
+        # Adjust column widths based on the DataFrame content
+        for column_number, adjusted_width in enumerate(_excel_column_widths(df), start=1):
+            sheet.column_dimensions[get_column_letter(column_number)].width = adjusted_width
+        logger.debug("Adjusted column widths based on content.")
+
+    # Save the formatted Excel file
+    writer._save()
+
+
+def write_excel_sheets(sheets: Dict[str, DataFrame], filename: str, streaming: bool = True) -> None:
+    """
+    Saves one or more DataFrames as formatted worksheets of a single Excel file. The workbook is written
+    to a temporary file and renamed into place, so a failed write never leaves a partial workbook behind.
+    Unlike save_to_excel, errors are raised to the caller.
+
+    Parameters:
+        sheets (Dict[str, DataFrame]): The DataFrames to save, keyed by worksheet name.
+        filename (str): The path where the Excel file will be saved.
+        streaming (bool): If True and xlsxwriter is installed, write the file in a single constant-memory
+                          pass with column-level formatting. Otherwise format the workbook with openpyxl.
+    """
+    logger.info("Starting Excel write operation to '%s'.", filename)
+    if streaming and xlsxwriter is not None:
+        save_sheets = _save_sheets_streaming
+    else:
+        if streaming:
+            logger.warning("xlsxwriter is not installed, formatting '%s' with openpyxl.", filename)
+        save_sheets = _save_sheets_openpyxl
+    # pandas checks the file extension against the Excel engine, so the temporary file keeps the workbook's
+    write_atomic(filename, lambda temp_path: save_sheets(sheets, temp_path), suffix=os.path.splitext(filename)[1])
+    logger.info("Successfully saved the Excel file to '%s'.", filename)
+
 
+def save_to_excel(df: DataFrame, filename: str, streaming: bool = True) -> None:
+    """
+    Applies specific formatting to Excel files for this project and saves them.
+    
+    Parameters:
+        df (DataFrame): The DataFrame to save and format in Excel.
+        filename (str): The path where the Excel file will be saved.
+        streaming (bool): If True and xlsxwriter is installed, write the file in a single constant-memory
+                          pass with column-level formatting. Otherwise format the workbook with openpyxl.
+    """
+    try:
+        write_excel_sheets({'Sheet1': df}, filename, streaming)
     except Exception as e:
         logger.error("An error occurred while saving the Excel file: %s", e, exc_info=True)
 
@@ -234,6 +599,7 @@ def move_to_sharepoint(
         ) -> None:
     """
     Moves specified files from the source directory to the destination SharePoint directory.
+    Unchanged files are skipped and changed files are copied atomically; see publishing.publish_files.
 
     Args:
         source_dir (Optional[str]): The source directory where the files are located.
@@ -241,25 +607,26 @@ def move_to_sharepoint(
         dest_dir (Optional[str]): The destination directory (SharePoint path) where the files should be moved.
                                   This parameter must be provided.
         files_to_move (Optional[List[str]]): List of file names to move. If None, defaults to 
-                                             ['aged_load_inv.xlsx', 'aged_unload_inv.xlsx'].
+                                             ['aged_load_inv.xlsx', 'aged_unload_inv.xlsx', 'aged_8qi_inv.xlsx'].
 
     Raises:
         ValueError: If the destination directory is not provided.
         FileNotFoundError: If a specified file is not found in the source directory.
-        Exception: For any other errors that occur during the file moving process.
+        Exception: For any other errors that occur during the file moving process. All files are attempted
+                   before the first error is raised.
     """
     try:
         # Set default values
         if source_dir is None:
             source_dir = os.path.join(os.getcwd(), 'data')
-            logger.debug(f"Source directory not provided. Defaulting to {source_dir}.")
+            logger.debug("Source directory not provided. Defaulting to %s.", source_dir)
 
         if dest_dir is None:
             raise ValueError("Destination directory must be provided.")
         
         if files_to_move is None:
             files_to_move = ['aged_load_inv.xlsx', 'aged_unload_inv.xlsx', 'aged_8qi_inv.xlsx']
-            logger.debug(f"Files to move not specified. Defaulting to {files_to_move}.")
+            logger.debug("Files to move not specified. Defaulting to %s.", files_to_move)
 
         # Ensure source directory exists
         if not os.path.exists(source_dir):
@@ -269,20 +636,14 @@ def move_to_sharepoint(
         if not os.path.exists(dest_dir):
             raise FileNotFoundError(f"Destination directory '{dest_dir}' does not exist.")
 
-        # Move each file
-        for file_name in files_to_move:
-            src = os.path.join(source_dir, file_name)
-            dst = os.path.join(dest_dir, file_name)
-            try:
-                shutil.copy(src, dst)
-                logger.info(f"Successfully moved '{file_name}' from '{source_dir}' to '{dest_dir}'.")
-            except FileNotFoundError:
-                logger.error(f"File '{file_name}' not found in source directory '{source_dir}'.", exc_info=True)
-                raise
-            except Exception as e:
-                logger.error(f"Error moving file '{file_name}' from '{source_dir}' to '{dest_dir}': {e}", exc_info=True)
-                raise
+        # Publish the files in parallel, skipping any whose published copy is unchanged. Imported here
+        # because the publishing module depends on this one.
+        from .publishing import publish_files
+        results = publish_files(source_dir, dest_dir, files_to_move)
+        failures = [result for result in results if result.status == 'failed']
+        if failures:
+            raise failures[0].error
 
     except Exception as e:
-        logger.critical(f"Critical error in move_to_sharepoint: {e}", exc_info=True)
+        logger.critical("Critical error in move_to_sharepoint: %s", e, exc_info=True)
         raise
\ No newline at end of file
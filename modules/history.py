@@ -0,0 +1,322 @@
+import os
+import glob
+import logging
+import argparse
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+HISTORY_DIRECTORY = os.path.join('data', 'history')
+
+# Columns stored for every report row. Reports without an 'In Station' column store NaN.
+HISTORY_COLUMNS = ('run_time', 'report', 'Material', 'Material Description', 'Storage Type', 'Storage Bin',
+                   'Storage Unit', 'Total Stock', 'In Station', 'last_stock_placement', 'hours_elapsed')
+_TEXT_COLUMNS = ('report', 'Material', 'Material Description', 'Storage Type', 'Storage Bin', 'Storage Unit')
+_FLOAT_COLUMNS = ('Total Stock', 'In Station', 'hours_elapsed')
+
+# Files starting with '.' are ignored by pyarrow datasets, so partially written files are never read
+_TEMP_PREFIX = '.'
+_COMPACTED_NAME = 'compacted.parquet'
+
+DateLike = Union[str, date, datetime]
+
+
+def _schema():
+    import pyarrow as pa
+
+    fields = [('run_time', pa.timestamp('us'))]
+    for column in HISTORY_COLUMNS[1:]:
+        if column in _TEXT_COLUMNS:
+            fields.append((column, pa.string()))
+        elif column in _FLOAT_COLUMNS:
+            fields.append((column, pa.float64()))
+        else:
+            fields.append((column, pa.timestamp('us')))
+    return pa.schema(fields)
+
+
+def _partition_dir(root: str, run_date: date) -> str:
+    return os.path.join(root, f'run_date={run_date.isoformat()}')
+
+
+def _write_table_atomic(table: object, path: str) -> None:
+    """
+    Writes a Parquet file to a hidden temporary name and renames it into place.
+    """
+    import pyarrow.parquet as pq
+
+    temp_path = os.path.join(os.path.dirname(path), _TEMP_PREFIX + os.path.basename(path))
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+
+
+def snapshot_frame(reports: Dict[str, DataFrame], run_time: datetime) -> DataFrame:
+    """
+    Combines the report DataFrames of one run into a single frame in the history layout.
+
+    Args:
+        reports (Dict[str, DataFrame]): The report DataFrames keyed by report name.
+        run_time (datetime): The time the reports were aged at.
+
+    Returns:
+        DataFrame: One row per report row with the HISTORY_COLUMNS columns.
+    """
+    frames = []
+    for name, report in reports.items():
+        frame = DataFrame({
+            column: (report[column].to_numpy(dtype=object if column in _TEXT_COLUMNS else None)
+                     if column in report.columns else np.nan)
+            for column in HISTORY_COLUMNS[2:]
+        }, index=pd.RangeIndex(len(report)))
+        frame.insert(0, 'report', name)
+        frames.append(frame)
+    snapshot = pd.concat(frames, ignore_index=True) if frames else DataFrame(columns=HISTORY_COLUMNS[1:])
+    snapshot.insert(0, 'run_time', pd.Timestamp(run_time))
+    return snapshot.astype({column: 'float64' for column in _FLOAT_COLUMNS})
+
+
+def compact_partitions(root: str = HISTORY_DIRECTORY, before: Optional[date] = None) -> int:
+    """
+    Merges the run files of each date partition into a single file. Only partitions dated before
+    'before' are compacted, so that the current day keeps accepting appends.
+
+    Args:
+        root (str): The history directory.
+        before (Optional[date]): Only compact partitions before this date. Defaults to today.
+
+    Returns:
+        int: The number of partitions compacted.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    before = before or date.today()
+    compacted = 0
+    for partition in sorted(glob.glob(os.path.join(root, 'run_date=*'))):
+        if date.fromisoformat(os.path.basename(partition).split('=', 1)[1]) >= before:
+            continue
+        files = sorted(glob.glob(os.path.join(partition, '*.parquet')))
+        if len(files) <= 1:
+            continue
+        table = pa.concat_tables([pq.read_table(file, schema=_schema()) for file in files]).sort_by('run_time')
+        _write_table_atomic(table, os.path.join(partition, _COMPACTED_NAME))
+        for file in files:
+            if os.path.basename(file) != _COMPACTED_NAME:
+                os.remove(file)
+        compacted += 1
+        logger.debug("Compacted %s files in '%s'.", len(files), partition)
+    return compacted
+
+
+def record_snapshot(reports: Dict[str, DataFrame], run_time: datetime, root: str = HISTORY_DIRECTORY,
+                    compact: bool = True) -> str:
+    """
+    Appends the reports of one run to the snapshot store and compacts earlier days.
+
+    Args:
+        reports (Dict[str, DataFrame]): The report DataFrames keyed by report name.
+        run_time (datetime): The time the reports were aged at.
+        root (str): The history directory. Default is 'data/history'.
+        compact (bool): Compact the partitions before run_time's date. Writers running concurrently
+                        pass False and call compact_partitions once they are done.
+
+    Returns:
+        str: The path of the written snapshot file.
+    """
+    import pyarrow as pa
+
+    partition = _partition_dir(root, run_time.date())
+    os.makedirs(partition, exist_ok=True)
+    path = os.path.join(partition, f"run-{run_time.strftime('%H%M%S%f')}.parquet")
+    table = pa.Table.from_pandas(snapshot_frame(reports, run_time), schema=_schema(), preserve_index=False)
+    _write_table_atomic(table, path)
+    logger.info("Recorded %s report rows to '%s'.", table.num_rows, path)
+    if compact:
+        compact_partitions(root, before=run_time.date())
+    return path
+
+
+def _as_date_string(value: DateLike) -> str:
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat() if isinstance(value, date) else date.fromisoformat(value).isoformat()
+
+
+def load_history(
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    reports: Optional[Sequence[str]] = None,
+    columns: Optional[Sequence[str]] = None,
+    root: str = HISTORY_DIRECTORY
+        ) -> DataFrame:
+    """
+    Reads snapshot rows from the store, pruning date partitions outside [start, end].
+
+    Args:
+        start (Optional[DateLike]): The first run date to include. Includes all earlier runs if None.
+        end (Optional[DateLike]): The last run date to include. Includes all later runs if None.
+        reports (Optional[Sequence[str]]): Only include these reports. Includes all reports if None.
+        columns (Optional[Sequence[str]]): The columns to read. Reads all HISTORY_COLUMNS if None.
+        root (str): The history directory. Default is 'data/history'.
+
+    Returns:
+        DataFrame: The matching rows, with text columns as categories.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    columns = list(columns or HISTORY_COLUMNS)
+    if not glob.glob(os.path.join(root, 'run_date=*', '*.parquet')):
+        df = _schema().empty_table().select(columns).to_pandas()
+        return df.astype({column: 'category' for column in columns if column in _TEXT_COLUMNS})
+
+    partitioning = ds.partitioning(pa.schema([('run_date', pa.string())]), flavor='hive')
+    dataset = ds.dataset(root, format='parquet', partitioning=partitioning,
+                         schema=_schema().append(pa.field('run_date', pa.string())))
+    expression = None
+    conditions = []
+    if start is not None:
+        conditions.append(ds.field('run_date') >= _as_date_string(start))
+    if end is not None:
+        conditions.append(ds.field('run_date') <= _as_date_string(end))
+    if reports:
+        conditions.append(ds.field('report').isin(list(reports)))
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+    return df.astype({column: 'category' for column in columns if column in _TEXT_COLUMNS})
+
+
+def aging_trend(
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    report: Optional[str] = None,
+    freq: str = 'D',
+    root: str = HISTORY_DIRECTORY
+        ) -> DataFrame:
+    """
+    Summarizes aged inventory over time. Each run is first reduced to its row count, stock and hours,
+    then the runs in each period are averaged so that periods with more runs are not overweighted.
+
+    Args:
+        start (Optional[DateLike]): The first run date to include.
+        end (Optional[DateLike]): The last run date to include.
+        report (Optional[str]): Only include this report. Includes all reports if None.
+        freq (str): The pandas period frequency, e.g. 'D', 'W' or 'MS'.
+        root (str): The history directory.
+
+    Returns:
+        DataFrame: Per period: 'runs', the mean 'aged_rows' and 'aged_stock' per run, and the mean
+                   and maximum 'hours_elapsed'.
+    """
+    df = load_history(start, end, [report] if report else None,
+                      ['run_time', 'Total Stock', 'hours_elapsed'], root)
+    per_run = df.groupby('run_time').agg(aged_rows=('hours_elapsed', 'size'), aged_stock=('Total Stock', 'sum'),
+                                         mean_hours=('hours_elapsed', 'mean'), max_hours=('hours_elapsed', 'max'))
+    return per_run.resample(freq).agg({'aged_rows': ['size', 'mean'], 'aged_stock': 'mean', 'mean_hours': 'mean',
+                                       'max_hours': 'max'}).set_axis(
+        ['runs', 'aged_rows', 'aged_stock', 'mean_hours', 'max_hours'], axis=1)
+
+
+def top_offenders(
+    by: str = 'Storage Bin',
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    report: Optional[str] = None,
+    limit: int = 10,
+    root: str = HISTORY_DIRECTORY
+        ) -> DataFrame:
+    """
+    Ranks bins or materials by how chronically they are aged: the share of runs they appear in.
+
+    Args:
+        by (str): The column to rank, 'Storage Bin' or 'Material'.
+        start (Optional[DateLike]): The first run date to include.
+        end (Optional[DateLike]): The last run date to include.
+        report (Optional[str]): Only include this report. Includes all reports if None.
+        limit (int): The number of offenders to return.
+        root (str): The history directory.
+
+    Returns:
+        DataFrame: Indexed by the 'by' column: 'runs_aged', 'share_of_runs', 'first_seen', 'last_seen',
+                   'max_hours' and 'mean_stock', sorted by 'runs_aged' then 'max_hours'.
+    """
+    df = load_history(start, end, [report] if report else None,
+                      ['run_time', by, 'Total Stock', 'hours_elapsed'], root)
+    total_runs = df['run_time'].nunique()
+    offenders = df.groupby(by, observed=True).agg(
+        runs_aged=('run_time', 'nunique'), first_seen=('run_time', 'min'), last_seen=('run_time', 'max'),
+        max_hours=('hours_elapsed', 'max'), mean_stock=('Total Stock', 'mean'))
+    offenders.insert(1, 'share_of_runs', offenders['runs_aged'] / total_runs if total_runs else np.nan)
+    return offenders.sort_values(['runs_aged', 'max_hours'], ascending=False).head(limit)
+
+
+def dwell_distribution(
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    report: Optional[str] = None,
+    quantiles: Sequence[float] = (0.5, 0.9, 0.99),
+    root: str = HISTORY_DIRECTORY
+        ) -> DataFrame:
+    """
+    Describes how long stock dwells in each bin. A storage unit's dwell is the largest hours_elapsed it
+    reached in the bin across all runs, so a unit seen in many runs is only counted once.
+
+    Args:
+        start (Optional[DateLike]): The first run date to include.
+        end (Optional[DateLike]): The last run date to include.
+        report (Optional[str]): Only include this report. Includes all reports if None.
+        quantiles (Sequence[float]): The dwell quantiles to report.
+        root (str): The history directory.
+
+    Returns:
+        DataFrame: Indexed by 'Storage Bin': the number of 'units', the dwell quantiles ('p50', ...)
+                   and 'max' in working hours.
+    """
+    df = load_history(start, end, [report] if report else None,
+                      ['Storage Bin', 'Storage Unit', 'last_stock_placement', 'hours_elapsed'], root)
+    dwell = df.groupby(['Storage Bin', 'Storage Unit', 'last_stock_placement'], observed=True)['hours_elapsed'].max()
+    by_bin = dwell.groupby(level='Storage Bin', observed=True)
+    distribution = by_bin.quantile(list(quantiles)).unstack().reindex(columns=list(quantiles))
+    distribution.columns = [f'p{quantile * 100:g}' for quantile in quantiles]
+    distribution.insert(0, 'units', by_bin.size())
+    distribution['max'] = by_bin.max()
+    return distribution.sort_values('max', ascending=False)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Query the aged inventory snapshot history")
+    parser.add_argument('query', choices=['trend', 'top', 'dwell'])
+    parser.add_argument('--since', help='first run date to include, YYYY-MM-DD')
+    parser.add_argument('--until', help='last run date to include, YYYY-MM-DD')
+    parser.add_argument('--report', help='only include this report, e.g. aged_load_inv')
+    parser.add_argument('--by', default='Storage Bin', choices=['Storage Bin', 'Material'],
+                        help='for top, the column to rank')
+    parser.add_argument('--limit', type=int, default=20, help='for top, the number of offenders to show')
+    parser.add_argument('--freq', default='D', help='for trend, the period frequency (D, W, MS)')
+    parser.add_argument('--root', default=HISTORY_DIRECTORY, help='the history directory')
+    parser.add_argument('--csv', action='store_true', help='print CSV instead of a table')
+    args = parser.parse_args(argv)
+
+    if args.query == 'trend':
+        result = aging_trend(args.since, args.until, args.report, args.freq, args.root)
+    elif args.query == 'top':
+        result = top_offenders(args.by, args.since, args.until, args.report, args.limit, args.root)
+    else:
+        result = dwell_distribution(args.since, args.until, args.report, root=args.root)
+
+    if args.csv:
+        print(result.to_csv())
+    else:
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+import os
+import glob
+import shutil
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+import pandas as pd
+from pandas import DataFrame
+from .file_utils import file_digest, write_atomic
+from .validation import (QUARANTINE_DIRECTORY, column_matcher, normalize_columns, validate_paint_processed,
+                         validate_sap_inventory, write_quarantine)
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+SAP_INVENTORY_PATH = os.path.join('data', 'paint_inventory.xlsx')
+CACHE_DIRECTORY = os.path.join('data', 'cache')
+
+# Columns read from the SAP LX02 export and their declared dtypes. Date columns are left to openpyxl.
+SAP_INVENTORY_DTYPES: Dict[str, object] = {
+    'Material': str,
+    'Material Description': str,
+    'Storage Type': str,
+    'Storage Bin': str,
+    'Total Stock': 'float64',
+    'Storage Unit': str,
+    'Time': str,
+}
+SAP_INVENTORY_COLUMNS = list(SAP_INVENTORY_DTYPES) + ['Last stock placement', 'Last addtn to stock']
+# Without these the inventory cannot be selected or aged; the others are left empty when missing
+SAP_REQUIRED_COLUMNS = ('Material', 'Storage Type', 'Storage Bin', 'Total Stock', 'Time', 'Last stock placement')
+
+# Dtypes of the parsed inventory frame. Material, description, storage type and bin repeat across
+# many rows and are stored as categories; Storage Unit is nearly unique per row and stays a string.
+# The 'Last stock placement' and 'Time' columns are dropped once combined into 'last_stock_placement'.
+INVENTORY_SCHEMA: Dict[str, str] = {
+    'Material': 'category',
+    'Material Description': 'category',
+    'Storage Type': 'category',
+    'Storage Bin': 'category',
+}
+
+# Formats tried in order for placement dates stored as text: ISO with or without a time part, the US and
+# German SAP user settings, then per-value inference for anything else
+PLACEMENT_DATE_FORMATS = ('ISO8601', '%m/%d/%Y', '%d.%m.%Y', 'mixed')
+
+PAINT_PROCESSED_PATH = os.path.join('data', 'paint_processed.csv')
+
+# Columns read from the Tableau Paint Processed export and their declared dtypes
+PAINT_PROCESSED_DTYPES: Dict[str, object] = {
+    'PART_NO': str,
+    'GOOD': 'float64',
+    'NON-CONFIRMED': 'float64',
+    'SCRAP': 'float64',
+    'LOADED': 'float64',
+}
+
+# Bump when the cached frame layout changes so that stale cache files are not reused
+_CACHE_VERSION = 3
+
+
+def downcast_float(values: pd.Series) -> pd.Series:
+    """
+    Downcasts a float64 column to float32 when every value round-trips exactly, which holds for the
+    whole-number quantities in the exports. Columns with values float32 cannot represent are returned unchanged.
+
+    Args:
+        values (pd.Series): The column to downcast.
+
+    Returns:
+        pd.Series: The column as float32 if lossless, otherwise the original column.
+    """
+    downcast = values.astype('float32')
+    if downcast.astype('float64').equals(values.astype('float64')):
+        return downcast
+    return values
+
+
+def apply_inventory_schema(df: DataFrame) -> DataFrame:
+    """
+    Converts a parsed inventory frame to INVENTORY_SCHEMA and downcasts 'Total Stock'.
+
+    Args:
+        df (DataFrame): The inventory frame with a 'last_stock_placement' column.
+
+    Returns:
+        DataFrame: The frame with categorical text columns and the raw placement columns removed.
+    """
+    df = df.drop(columns=['Last stock placement', 'Time'], errors='ignore')
+    df = df.astype({column: dtype for column, dtype in INVENTORY_SCHEMA.items() if column in df.columns})
+    df['Total Stock'] = downcast_float(df['Total Stock'])
+    return df
+
+
+def _read_sap_inventory(path: str) -> Tuple[DataFrame, DataFrame]:
+    """
+    Reads the required columns of the SAP export and parses the stock placement timestamp. Rows that
+    fail validation, including those without a placement date, are returned separately to be quarantined
+    rather than failing the run.
+    """
+    # 'Total Stock' is parsed by the validation, so that one text value does not fail the whole read
+    text_dtypes = {column: dtype for column, dtype in SAP_INVENTORY_DTYPES.items() if dtype is str}
+    df = pd.read_excel(path, usecols=column_matcher(SAP_INVENTORY_COLUMNS), dtype=text_dtypes)
+    df = normalize_columns(df, SAP_INVENTORY_COLUMNS, SAP_REQUIRED_COLUMNS, path)
+    df, quarantined = validate_sap_inventory(df, path, PLACEMENT_DATE_FORMATS)
+    return apply_inventory_schema(df), quarantined
+
+
+def _cache_path(cache_dir: str, name: str, digest: str) -> str:
+    return os.path.join(cache_dir, f'{name}-v{_CACHE_VERSION}-{digest[:16]}.parquet')
+
+
+def _quarantine_cache_path(cache_file: str) -> str:
+    # The quarantined rows of a cached export are kept as the CSV written to the quarantine directory
+    return cache_file[:-len('.parquet')] + '.quarantine.csv'
+
+
+def _prune_cache(cache_dir: str, name: str, keep: int) -> None:
+    """
+    Removes all but the most recently used cache files for the given input, with their quarantined rows.
+    """
+    cached_files = sorted(glob.glob(os.path.join(cache_dir, f'{name}-*.parquet')), key=os.path.getmtime, reverse=True)
+    for stale_file in cached_files[keep:]:
+        try:
+            os.remove(stale_file)
+            if os.path.exists(_quarantine_cache_path(stale_file)):
+                os.remove(_quarantine_cache_path(stale_file))
+            logger.debug("Removed stale cache file '%s'.", stale_file)
+        except OSError as e:
+            logger.warning("Could not remove stale cache file '%s': %s", stale_file, e)
+
+
+def _load_cached(path: str, name: str, reader: Callable[[str], Tuple[DataFrame, Optional[DataFrame]]],
+                 cache_dir: Optional[str], keep: int, quarantine_dir: str) -> DataFrame:
+    """
+    Loads a parsed input file from the columnar cache keyed by the file's content hash,
+    falling back to the given reader and caching its result. The rows the reader rejected are written
+    to the quarantine directory, from the cache as well when the file was read before.
+    """
+    digest = file_digest(path)
+    if cache_dir is None:
+        df, quarantined = reader(path)
+        write_quarantine(quarantined, path, digest, quarantine_dir, keep)
+        return df
+
+    cache_file = _cache_path(cache_dir, name, digest)
+    if os.path.exists(cache_file):
+        try:
+            df = pd.read_parquet(cache_file)
+            os.utime(cache_file)
+            logger.info("Loaded '%s' from cache '%s'.", path, cache_file)
+            if os.path.exists(_quarantine_cache_path(cache_file)):
+                write_quarantine(_quarantine_cache_path(cache_file), path, digest, quarantine_dir, keep)
+            return df
+        except Exception as e:
+            logger.warning("Could not read cache file '%s', re-reading '%s': %s", cache_file, path, e)
+
+    df, quarantined = reader(path)
+    quarantine_file = write_quarantine(quarantined, path, digest, quarantine_dir, keep)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # The quarantined rows are cached first, so that a cached frame always has them. Both are written
+        # to temporary files and renamed, so a crash or a concurrent run never leaves a truncated cache file.
+        if quarantine_file is not None:
+            write_atomic(_quarantine_cache_path(cache_file),
+                         lambda temp_path: shutil.copyfile(quarantine_file, temp_path))
+        write_atomic(cache_file, df.to_parquet)
+        logger.info("Cached '%s' to '%s'.", path, cache_file)
+        _prune_cache(cache_dir, name, keep)
+    except ImportError as e:
+        logger.warning("Parquet support is not installed, skipping ingest cache: %s", e)
+    except Exception as e:
+        logger.warning("Could not write cache file '%s': %s", cache_file, e)
+    return df
+
+
+def load_sap_inventory(path: str = SAP_INVENTORY_PATH, cache_dir: Optional[str] = CACHE_DIRECTORY,
+                       keep: int = 5, quarantine_dir: str = QUARANTINE_DIRECTORY) -> DataFrame:
+    """
+    Loads the SAP paint inventory export. The parsed frame is cached as Parquet keyed by the
+    export's content hash, so repeated loads of the same export skip the Excel parse.
+
+    Args:
+        path (str): The path of the SAP export. Default is 'data/paint_inventory.xlsx'.
+        cache_dir (Optional[str]): Directory for the columnar cache. None disables caching.
+        keep (int): The number of cached exports to retain.
+        quarantine_dir (str): Where rows that fail validation are written. Default is 'data/quarantine'.
+
+    Returns:
+        DataFrame: The inventory rows with a parsed 'last_stock_placement' column, in INVENTORY_SCHEMA.
+    """
+    return _load_cached(path, 'paint_inventory', _read_sap_inventory, cache_dir, keep, quarantine_dir)
+
+
+def _aggregate_paint_processed(path: str, chunksize: int = 100_000) -> Tuple[DataFrame, Optional[DataFrame]]:
+    """
+    Streams the Paint Processed export in chunks, summing LOADED per PART_NO for rows without
+    any GOOD, NON-CONFIRMED or SCRAP quantity. Partial sums are folded together as they are read,
+    so memory use is bounded by the number of parts rather than the size of the file. Rows that fail
+    validation are returned separately to be quarantined.
+    """
+    partial_sums: List[pd.Series] = []
+    quarantined: List[DataFrame] = []
+    numeric_columns = [column for column, dtype in PAINT_PROCESSED_DTYPES.items() if dtype is not str]
+    # Quantities are read as text and parsed by the validation, so that one bad value only rejects its row
+    reader = pd.read_csv(path, encoding='utf-16', sep='\t', usecols=column_matcher(PAINT_PROCESSED_DTYPES),
+                         dtype=str, chunksize=chunksize)
+    first_row = 2
+    columns = None
+    with reader:
+        for chunk in reader:
+            rows = len(chunk)
+            if columns is None:
+                chunk = normalize_columns(chunk, PAINT_PROCESSED_DTYPES, PAINT_PROCESSED_DTYPES, path)
+                columns = list(chunk.columns)
+            chunk.columns = columns
+            chunk, bad_rows = validate_paint_processed(chunk, numeric_columns, first_row, path)
+            first_row += rows
+            if len(bad_rows):
+                quarantined.append(bad_rows)
+            chunk = chunk[(chunk['GOOD'] == 0) & (chunk['NON-CONFIRMED'] == 0) & (chunk['SCRAP'] == 0)]
+            partial_sums.append(chunk.groupby('PART_NO')['LOADED'].sum())
+            if len(partial_sums) >= 16:
+                partial_sums = [pd.concat(partial_sums).groupby(level=0).sum()]
+    quarantined = pd.concat(quarantined) if quarantined else None
+
+    if not partial_sums:
+        return DataFrame({'LOADED': pd.Series(dtype='float32')},
+                         index=pd.Index([], name='PART_NO', dtype=str)), quarantined
+    return downcast_float(pd.concat(partial_sums).groupby(level=0).sum()).to_frame('LOADED'), quarantined
+
+
+def load_paint_loaded(path: str = PAINT_PROCESSED_PATH, cache_dir: Optional[str] = CACHE_DIRECTORY,
+                      keep: int = 5, quarantine_dir: str = QUARANTINE_DIRECTORY) -> DataFrame:
+    """
+    Loads the LOADED quantity per part from the Tableau Paint Processed export. The aggregated table
+    is cached as Parquet keyed by the export's content hash.
+
+    Args:
+        path (str): The path of the Paint Processed export. Default is 'data/paint_processed.csv'.
+        cache_dir (Optional[str]): Directory for the columnar cache. None disables caching.
+        keep (int): The number of cached exports to retain.
+        quarantine_dir (str): Where rows that fail validation are written. Default is 'data/quarantine'.
+
+    Returns:
+        DataFrame: A 'LOADED' column indexed by PART_NO.
+    """
+    return _load_cached(path, 'paint_processed', _aggregate_paint_processed, cache_dir, keep, quarantine_dir)
@@ -1,14 +1,92 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import logging
-from typing import Tuple
-from .file_utils import read_shift_parameters, get_work_shifts, get_work_days
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple, Union
+from .aging_state import (AGING_KEY, AGING_STATE_PATH, AgingState, calendar_key, key_hashes, load_aging_state,
+                          save_aging_state)
+from .file_utils import ShiftCalendar, load_shift_calendar
+from .ingest import (CACHE_DIRECTORY, PAINT_PROCESSED_PATH, SAP_INVENTORY_PATH, load_paint_loaded,
+                     load_sap_inventory)
+from .log_config import THROTTLED
+from .metrics import track_stage
+from .validation import QUARANTINE_DIRECTORY
 
-# Set up logging for this module
+# Get a logger for this module
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
-def calculate_elapsed_hours(start_time: datetime, end_time: datetime, work_shifts: list, work_days: list) -> float:
+INVENTORY_COLUMNS = ('Material', 'Material Description', 'Storage Type', 'Storage Bin', 'Total Stock', 'Storage Unit',
+                     'last_stock_placement', 'Last addtn to stock', 'hours_elapsed')
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """
+    Declarative definition of an aged inventory report.
+
+    Attributes:
+        name (str): Name of the report, also used as the output file name stem.
+        storage_types (Tuple[str, ...]): Storage types included in the report. Empty means any storage type.
+        storage_bins (Tuple[str, ...]): Storage bins included in the report. Empty means any storage bin.
+        min_hours (Optional[float]): Minimum working hours in location for a row to be reported. None disables the filter.
+        columns (Tuple[str, ...]): Output columns of the report, in order.
+        merge_paint (bool): Whether the report is merged with the Paint Processed LOADED quantities.
+        upcoming (bool): Whether the rows that will reach min_hours before the current shift ends are
+                         listed separately by build_upcoming_reports.
+    """
+    name: str
+    storage_types: Tuple[str, ...] = ()
+    storage_bins: Tuple[str, ...] = ()
+    min_hours: Optional[float] = None
+    columns: Tuple[str, ...] = INVENTORY_COLUMNS
+    merge_paint: bool = False
+    upcoming: bool = False
+
+    @property
+    def filename(self) -> str:
+        return f'{self.name}.xlsx'
+
+    @property
+    def needs_hours(self) -> bool:
+        return self.min_hours is not None or 'hours_elapsed' in self.columns
+
+    def matches(self, storage_type: object, storage_bin: object) -> bool:
+        """
+        Checks whether rows with the given storage type and bin belong to this report.
+        """
+        return ((not self.storage_types or storage_type in self.storage_types) and
+                (not self.storage_bins or storage_bin in self.storage_bins))
+
+
+# Reports produced by process_inventory_data, in the order they are returned
+REPORT_SPECS: Tuple[ReportSpec, ...] = (
+    # Only show data that is in location for more than 4 working hours
+    ReportSpec(
+        name='aged_load_inv',
+        storage_types=('800', '801', '802'),
+        min_hours=4,
+        columns=('Material', 'Material Description', 'Storage Type', 'Storage Bin', 'Total Stock', 'LOADED',
+                 'In Station', 'Storage Unit', 'last_stock_placement', 'Last addtn to stock', 'hours_elapsed'),
+        merge_paint=True,
+        upcoming=True,
+    ),
+    # Only show data that is in location for more than 4 working hours
+    ReportSpec(
+        name='aged_unload_inv',
+        storage_bins=('UNLOAD01', 'UNLOAD02', 'UNLOAD03', 'UNLOAD04', 'UNLOAD05', 'LGUNLOAD'),
+        min_hours=4,
+        upcoming=True,
+    ),
+    ReportSpec(
+        name='aged_8qi_inv',
+        storage_types=('8QI',),
+    ),
+)
+
+
+def calculate_elapsed_hours(start_time: datetime, end_time: datetime, work_shifts: list, work_days: list,
+                            closed_dates: Iterable = ()) -> float:
     """
     Function to determine the overall time that material has been located in a storage bin
     based on working hours for each shift.
@@ -18,14 +96,19 @@ def calculate_elapsed_hours(start_time: datetime, end_time: datetime, work_shift
         end_time (datetime): The current time or the time being evaluated.
         work_shifts (list): A list of tuples defining work shifts as (start_hour, start_minute, end_hour, end_minute).
         work_days (list): A list of weekdays (0-6, where 0 is Monday) that represent workdays.
+        closed_dates (Iterable): Holidays and shutdown dates on which no shifts are worked.
 
     Returns:
         float: The total hours that the material has been in the storage bin during working hours.
     """
-    total_hours = 0
+    # Working time is summed exactly and converted to hours once, so that the result does not depend on the
+    # number of shifts summed and rounds like the batch calculation
+    total_time = timedelta(0)
+    closed_dates = set(closed_dates)
     current_time = start_time
     while current_time < end_time:
-        if current_time.weekday() in work_days:  # Check if it's a workday
+        # Check if it's a workday that is not a holiday or shutdown day
+        if current_time.weekday() in work_days and current_time.date() not in closed_dates:
             for start_hour, start_minute, end_hour, end_minute in work_shifts:
                 shift_start = current_time.replace(hour=start_hour, minute=start_minute, second=0, microsecond=0)
                 shift_end = current_time.replace(hour=end_hour, minute=end_minute, second=0, microsecond=0)
@@ -37,20 +120,400 @@ def calculate_elapsed_hours(start_time: datetime, end_time: datetime, work_shift
                     overlap_start = max(start_time, shift_start)
                     overlap_end = min(end_time, shift_end)
                     if overlap_start < overlap_end:
-                        total_hours += (overlap_end - overlap_start).total_seconds() / 3600
+                        total_time += overlap_end - overlap_start
         # Move to the next day
         current_time += timedelta(days=1)
         current_time = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
 
-    return total_hours
+    return total_time / timedelta(hours=1)
+
+
+_NS_PER_MINUTE = 60 * 10**9
+_NS_PER_DAY = 24 * 60 * _NS_PER_MINUTE
+_NS_PER_HOUR = 60 * _NS_PER_MINUTE
+
+
+def _shift_offsets(work_shifts: list) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts shift tuples into start and end offsets (in nanoseconds) from the midnight of the day
+    the shift belongs to. Overnight shifts end on the following day, as in calculate_elapsed_hours.
+    """
+    starts = []
+    ends = []
+    for start_hour, start_minute, end_hour, end_minute in work_shifts:
+        start = (start_hour * 60 + start_minute) * _NS_PER_MINUTE
+        end = (end_hour * 60 + end_minute) * _NS_PER_MINUTE
+        if end < start:
+            end += _NS_PER_DAY
+        starts.append(start)
+        ends.append(end)
+    return np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+
+
+def _closed_day_numbers(closed_dates: Iterable) -> np.ndarray:
+    """
+    Converts holiday and shutdown dates into days since the Unix epoch.
+    """
+    return np.array([np.datetime64(closed_date, 'D') for closed_date in closed_dates],
+                    dtype='datetime64[D]').astype(np.int64)
+
+
+def _is_working_day(days: np.ndarray, work_days: list, closed_days: np.ndarray) -> np.ndarray:
+    """
+    Flags which days (as days since the Unix epoch) are workdays that are not closed.
+    """
+    # The Unix epoch (1970-01-01) was a Thursday, weekday 3
+    return np.isin((days + 3) % 7, list(work_days)) & ~np.isin(days, closed_days)
+
+
+def build_working_calendar(first_day: int, last_day: int, work_shifts: list, work_days: list,
+                           closed_dates: Iterable = ()) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Builds a cumulative working-time calendar covering the given range of days.
+
+    The calendar is a piecewise linear function: between two consecutive breakpoints the
+    working time grows at a constant rate equal to the number of shifts active at that moment.
+
+    Args:
+        first_day (int): First day of the calendar, as days since the Unix epoch.
+        last_day (int): Last day of the calendar (inclusive), as days since the Unix epoch.
+        work_shifts (list): A list of tuples defining work shifts as (start_hour, start_minute, end_hour, end_minute).
+        work_days (list): A list of weekdays (0-6, where 0 is Monday) that represent workdays.
+        closed_dates (Iterable): Holidays and shutdown dates on which no shifts are worked.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Breakpoints (ns since epoch), cumulative working
+        time at each breakpoint (ns) and the rate of accrual following each breakpoint.
+    """
+    days = np.arange(first_day, last_day + 1, dtype=np.int64)
+    days = days[_is_working_day(days, work_days, _closed_day_numbers(closed_dates))]
+    shift_starts, shift_ends = _shift_offsets(work_shifts)
+
+    day_start = days[:, None] * _NS_PER_DAY
+    interval_starts = (day_start + shift_starts[None, :]).ravel()
+    interval_ends = (day_start + shift_ends[None, :]).ravel()
+    keep = interval_ends > interval_starts
+    interval_starts = interval_starts[keep]
+    interval_ends = interval_ends[keep]
+
+    if interval_starts.size == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+
+    # Every interval start raises the accrual rate by one, every interval end lowers it by one
+    points = np.concatenate([interval_starts, interval_ends])
+    steps = np.concatenate([np.ones(interval_starts.size, dtype=np.int64),
+                            -np.ones(interval_ends.size, dtype=np.int64)])
+    breakpoints, inverse = np.unique(points, return_inverse=True)
+    rates = np.cumsum(np.bincount(inverse, weights=steps, minlength=breakpoints.size)).astype(np.int64)
+    cumulative = np.zeros(breakpoints.size, dtype=np.int64)
+    cumulative[1:] = np.cumsum(np.diff(breakpoints) * rates[:-1])
+
+    return breakpoints, cumulative, rates
+
+
+def _working_time_at(times: np.ndarray, breakpoints: np.ndarray, cumulative: np.ndarray,
+                     rates: np.ndarray) -> np.ndarray:
+    """
+    Evaluates the cumulative working time (ns) of a calendar at each of the given times (ns since epoch).
+    """
+    index = np.searchsorted(breakpoints, times, side='right') - 1
+    before_calendar = index < 0
+    index = np.clip(index, 0, None)
+    working = cumulative[index] + rates[index] * (times - breakpoints[index])
+    return np.where(before_calendar, 0, working)
+
+
+def _elapsed_working_ns(starts: np.ndarray, end: Union[int, np.ndarray], work_shifts: list, work_days: list,
+                        closed_dates: Iterable = ()) -> np.ndarray:
+    """
+    Computes the exact working time in nanoseconds from each start (ns since epoch, NaT allowed)
+    to end (ns since epoch), which is either one time for all starts or one time per start. Starts that
+    are missing or not before their end accrue nothing.
+    """
+    missing = np.isnat(starts)
+    starts = starts.view(np.int64)
+    ends = np.broadcast_to(np.asarray(end, dtype=np.int64), starts.shape)
+
+    working_ns = np.zeros(starts.size, dtype=np.int64)
+    valid = ~missing & (starts < ends)
+    if not valid.any() or not work_shifts:
+        return working_ns
+
+    starts = starts[valid]
+    ends = ends[valid]
+    start_days = starts // _NS_PER_DAY
+    closed_dates = list(closed_dates)
+    breakpoints, cumulative, rates = build_working_calendar(int(start_days.min()) - 1, int(ends.max() // _NS_PER_DAY),
+                                                            work_shifts, work_days, closed_dates)
+    working = _working_time_at(ends, breakpoints, cumulative, rates) - \
+        _working_time_at(starts, breakpoints, cumulative, rates)
+
+    # calculate_elapsed_hours only considers shifts beginning on or after the day of placement, so
+    # overnight shifts carried over from the previous day must not count towards the elapsed time
+    shift_starts, shift_ends = _shift_offsets(work_shifts)
+    previous_day = start_days - 1
+    previous_is_workday = _is_working_day(previous_day, work_days, _closed_day_numbers(closed_dates))
+    for shift_start, shift_end in zip(shift_starts, shift_ends):
+        if shift_end <= _NS_PER_DAY:
+            continue
+        overlap_start = np.maximum(starts, previous_day * _NS_PER_DAY + shift_start)
+        overlap_end = np.minimum(ends, previous_day * _NS_PER_DAY + shift_end)
+        carried = np.clip(overlap_end - overlap_start, 0, None)
+        working -= np.where(previous_is_workday, carried, 0)
+
+    working_ns[valid] = working
+    return working_ns
+
+
+def _to_ns(start_times: pd.Series) -> np.ndarray:
+    return pd.to_datetime(pd.Series(start_times)).to_numpy(dtype='datetime64[ns]')
+
+
+def calculate_elapsed_hours_batch(start_times: pd.Series, end_time: datetime, work_shifts: list,
+                                  work_days: list, closed_dates: Iterable = ()) -> np.ndarray:
+    """
+    Vectorized equivalent of calculate_elapsed_hours for a whole column of placement times.
+
+    Rather than walking forward one day at a time for every row, a cumulative working-time calendar
+    is built once for the covered date range and each row is resolved with a single searchsorted lookup.
+
+    Args:
+        start_times (pd.Series): The times when the material was placed in storage.
+        end_time (datetime): The current time or the time being evaluated.
+        work_shifts (list): A list of tuples defining work shifts as (start_hour, start_minute, end_hour, end_minute).
+        work_days (list): A list of weekdays (0-6, where 0 is Monday) that represent workdays.
+        closed_dates (Iterable): Holidays and shutdown dates on which no shifts are worked.
+
+    Returns:
+        np.ndarray: The total hours each material has been in the storage bin during working hours.
+    """
+    end = np.datetime64(pd.Timestamp(end_time).to_datetime64(), 'ns').astype(np.int64)
+    return _elapsed_working_ns(_to_ns(start_times), end, work_shifts, work_days, closed_dates) / _NS_PER_HOUR
+
+
+def calculate_elapsed_ns_incremental(keys: pd.DataFrame, end_time: datetime, calendar: ShiftCalendar,
+                                     state: Optional[AgingState]) -> Tuple[np.ndarray, int]:
+    """
+    Computes the working time of each key up to end_time, reusing the working time accrued by the
+    previous run where the key is unchanged. For a reused key only the working time between the
+    previous run and end_time is added, which is the same for every key, so the cost grows with the
+    number of new or changed keys rather than with the size of the inventory. All arithmetic is in
+    integer nanoseconds, so the result is identical to a full recompute.
+
+    A key is only reused if it was placed before the previous run and any overnight shift carried
+    over from the day before its placement had ended by then; those shifts are excluded from the
+    elapsed time, so keys still inside one are recomputed.
+
+    Args:
+        keys (pd.DataFrame): The AGING_KEY columns of the rows to age.
+        end_time (datetime): The time the elapsed time is evaluated at.
+        calendar (ShiftCalendar): The compiled shift calendar.
+        state (Optional[AgingState]): The previous run's state from load_aging_state, or None.
+
+    Returns:
+        Tuple[np.ndarray, int]: The working time of each key in nanoseconds, and the number of keys reused.
+    """
+    starts = _to_ns(keys['last_stock_placement'])
+    end = np.datetime64(pd.Timestamp(end_time).to_datetime64(), 'ns').astype(np.int64)
+    working_ns = np.zeros(len(keys), dtype=np.int64)
+    reused = np.zeros(len(keys), dtype=bool)
+
+    previous = state.as_of.value if state is not None else None
+    if previous is not None and previous <= end and calendar.work_shifts:
+        # Keys are matched by hash and then by exact placement time. The accrued working time only
+        # depends on the placement time, so a hash collision between different keys cannot change the result.
+        position = pd.Index(state.accrued['key_hash']).get_indexer(key_hashes(keys))
+        found = position >= 0
+        found[found] = state.accrued['last_stock_placement'].to_numpy()[position[found]] == \
+            starts.view(np.int64)[found]
+        matched = np.zeros(len(keys), dtype=np.int64)
+        matched[found] = state.accrued['working_ns'].to_numpy(dtype=np.int64)[position[found]]
+
+        _, shift_ends = _shift_offsets(calendar.work_shifts)
+        carry_end = (starts.view(np.int64) // _NS_PER_DAY - 1) * _NS_PER_DAY + max(int(shift_ends.max()), _NS_PER_DAY)
+        reused = found & ~np.isnat(starts) & (starts.view(np.int64) < previous) & (carry_end <= previous)
+
+        if reused.any():
+            breakpoints, cumulative, rates = build_working_calendar(previous // _NS_PER_DAY - 1, end // _NS_PER_DAY,
+                                                                    calendar.work_shifts, calendar.work_days,
+                                                                    calendar.closed_dates)
+            interval = np.diff(_working_time_at(np.array([previous, end], dtype=np.int64),
+                                                breakpoints, cumulative, rates))[0]
+            working_ns[reused] = matched[reused] + interval
+
+    recompute = ~reused
+    working_ns[recompute] = _elapsed_working_ns(starts[recompute], end, calendar.work_shifts, calendar.work_days,
+                                                calendar.closed_dates)
+    return working_ns, int(reused.sum())
+
+
+def _carried_overnight(starts: np.ndarray, work_shifts: list, work_days: list,
+                       closed_dates: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For each start (ns since epoch), returns the working time of overnight shifts carried over from
+    the day before that still lies after the start, which calculate_elapsed_hours never counts, and
+    the time the last of those shifts ends (the start itself if there are none).
+    """
+    start_days = starts // _NS_PER_DAY
+    previous_day = start_days - 1
+    previous_is_workday = _is_working_day(previous_day, work_days, _closed_day_numbers(closed_dates))
+    carried = np.zeros(starts.size, dtype=np.int64)
+    carry_end = starts.copy()
+    for shift_start, shift_end in zip(*_shift_offsets(work_shifts)):
+        if shift_end <= _NS_PER_DAY:
+            continue
+        window_end = previous_day * _NS_PER_DAY + shift_end
+        overlap = np.clip(window_end - np.maximum(starts, previous_day * _NS_PER_DAY + shift_start), 0, None)
+        active = previous_is_workday & (overlap > 0)
+        carried += np.where(active, overlap, 0)
+        carry_end = np.where(active, np.maximum(carry_end, window_end), carry_end)
+    return carried, carry_end
+
+
+def _crossings_in_carry_window(starts: np.ndarray, carry_ends: np.ndarray, threshold: int, breakpoints: np.ndarray,
+                               work_shifts: list, work_days: list, closed_dates: Iterable) -> np.ndarray:
+    """
+    Finds the crossing times of rows whose threshold is reached while an overnight shift from the day
+    before their placement is still running. The elapsed time is linear between the calendar breakpoints
+    and carried shift ends, so it is evaluated at those points, for all rows in one call, and interpolated
+    exactly within the segment where it reaches the threshold.
+    """
+    rows = np.arange(starts.size)
+    # The calendar breakpoints inside each row's window, expanded row by row
+    first = np.searchsorted(breakpoints, starts)
+    counts = np.searchsorted(breakpoints, carry_ends, side='right') - first
+    window_rows = np.repeat(rows, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    window_points = breakpoints[np.repeat(first, counts) + offsets]
+    shift_ends = ((starts // _NS_PER_DAY - 1) * _NS_PER_DAY)[:, None] + _shift_offsets(work_shifts)[1][None, :]
+
+    candidate_rows = np.concatenate([rows, rows, window_rows, np.repeat(rows, shift_ends.shape[1])])
+    candidates = np.concatenate([starts, carry_ends, window_points, shift_ends.ravel()])
+    inside = (candidates >= starts[candidate_rows]) & (candidates <= carry_ends[candidate_rows])
+    candidate_rows, candidates = candidate_rows[inside], candidates[inside]
+    order = np.lexsort((candidates, candidate_rows))
+    candidate_rows, candidates = candidate_rows[order], candidates[order]
+    distinct = np.ones(candidates.size, dtype=bool)
+    distinct[1:] = (candidate_rows[1:] != candidate_rows[:-1]) | (candidates[1:] != candidates[:-1])
+    candidate_rows, candidates = candidate_rows[distinct], candidates[distinct]
+
+    elapsed = _elapsed_working_ns(starts[candidate_rows].view('datetime64[ns]'), candidates, work_shifts, work_days,
+                                  closed_dates)
+    # Each row's first candidate is its start, where nothing has elapsed, so the segment ending at the first
+    # candidate past the threshold always begins at a candidate of the same row
+    reached = np.flatnonzero(elapsed >= threshold)
+    segment = reached[np.unique(candidate_rows[reached], return_index=True)[1]]
+    rate = (elapsed[segment] - elapsed[segment - 1]) // (candidates[segment] - candidates[segment - 1])
+    return candidates[segment - 1] + -(-(threshold - elapsed[segment - 1]) // rate)
+
+
+def calculate_threshold_crossing_batch(start_times: pd.Series, threshold_hours: float, work_shifts: list,
+                                       work_days: list, closed_dates: Iterable = (),
+                                       max_days: int = 3660) -> np.ndarray:
+    """
+    Inverse of calculate_elapsed_hours_batch: the earliest time at which each row will have been in
+    its storage bin for threshold_hours working hours.
+
+    The cumulative working-time calendar is monotonic, so each crossing is found with a searchsorted
+    over the calendar's cumulative values and an exact division within the segment, instead of
+    stepping forward in time.
+
+    Args:
+        start_times (pd.Series): The times when the material was placed in storage.
+        threshold_hours (float): The working hours in location being projected.
+        work_shifts (list): A list of tuples defining work shifts as (start_hour, start_minute, end_hour, end_minute).
+        work_days (list): A list of weekdays (0-6, where 0 is Monday) that represent workdays.
+        closed_dates (Iterable): Holidays and shutdown dates on which no shifts are worked.
+        max_days (int): How far past the latest placement to look before giving up.
+
+    Returns:
+        np.ndarray: The crossing times as datetime64[ns], NaT for missing placements or thresholds that
+                    are not reached within max_days.
+    """
+    starts = _to_ns(start_times)
+    crossing = np.full(starts.size, np.datetime64('NaT'), dtype='datetime64[ns]')
+    valid = ~np.isnat(starts)
+    threshold = int(round(threshold_hours * _NS_PER_HOUR))
+    if not valid.any() or not work_shifts:
+        return crossing
+    if threshold <= 0:
+        crossing[valid] = starts[valid]
+        return crossing
+
+    closed_dates = list(closed_dates)
+    valid_starts = starts[valid].view(np.int64)
+    carried, carry_end = _carried_overnight(valid_starts, work_shifts, work_days, closed_dates)
+
+    # Extend the calendar until it covers every crossing or max_days is reached
+    first_day = int(valid_starts.min() // _NS_PER_DAY) - 1
+    last_start_day = int(valid_starts.max() // _NS_PER_DAY)
+    span = 14
+    while True:
+        breakpoints, cumulative, rates = build_working_calendar(first_day, last_start_day + span, work_shifts,
+                                                                work_days, closed_dates)
+        targets = _working_time_at(valid_starts, breakpoints, cumulative, rates) + carried + threshold
+        if cumulative[-1] >= targets.max() or span >= max_days:
+            break
+        span = min(span * 2, max_days)
+
+    index = np.searchsorted(cumulative, targets, side='left')
+    reached = index < cumulative.size
+    segment = np.clip(index - 1, 0, None)
+    # Ceiling division gives the first nanosecond at which the threshold is reached
+    rate = np.where(reached, rates[segment], 1)
+    times = breakpoints[segment] + -(-(targets - cumulative[segment]) // rate)
+    times = np.where(reached, times, np.iinfo(np.int64).min)
+
+    # Past the end of the carried shifts the elapsed time is W(t) - W(start) - carried, which the
+    # lookup above inverts exactly; crossings before that point are resolved individually
+    carried_rows = np.flatnonzero(reached & (times <= carry_end))
+    if carried_rows.size:
+        times[carried_rows] = _crossings_in_carry_window(valid_starts[carried_rows], carry_end[carried_rows],
+                                                         threshold, breakpoints, work_shifts, work_days, closed_dates)
+    crossing[valid] = times.view('datetime64[ns]')
+    return crossing
+
+
+def current_shift_end(as_of: datetime, calendar: ShiftCalendar) -> Optional[pd.Timestamp]:
+    """
+    Returns when the shift running at as_of ends. When several shifts overlap, the first of them to end
+    is used. Outside working hours the end of the next shift is returned.
+
+    Args:
+        as_of (datetime): The time to look up.
+        calendar (ShiftCalendar): The compiled shift calendar.
+
+    Returns:
+        Optional[pd.Timestamp]: The end of the current or next shift, or None if no shift is worked in the
+                                following two weeks.
+    """
+    now = pd.Timestamp(as_of).value
+    days = np.arange(now // _NS_PER_DAY - 1, now // _NS_PER_DAY + 15, dtype=np.int64)
+    days = days[_is_working_day(days, calendar.work_days, _closed_day_numbers(calendar.closed_dates))]
+    if not calendar.work_shifts or days.size == 0:
+        return None
+    shift_starts, shift_ends = _shift_offsets(calendar.work_shifts)
+    starts = (days[:, None] * _NS_PER_DAY + shift_starts[None, :]).ravel()
+    ends = (days[:, None] * _NS_PER_DAY + shift_ends[None, :]).ravel()
+
+    active = (starts <= now) & (now < ends)
+    if active.any():
+        return pd.Timestamp(int(ends[active].min()))
+    upcoming = np.flatnonzero(starts > now)
+    if upcoming.size == 0:
+        return None
+    return pd.Timestamp(int(ends[upcoming[np.argmin(starts[upcoming])]]))
 
-def compute_elapsed_hours(row: pd.Series) -> float:
+
+def compute_elapsed_hours(row: pd.Series, calendar: Optional[ShiftCalendar] = None) -> float:
     """
     Computes the elapsed hours based on working hours that material has
     been located in a storage bin for each entry.
 
     Args:
         row (pd.Series): A single row of the DataFrame containing data for a specific material.
+        calendar (Optional[ShiftCalendar]): The compiled shift calendar. If None, the memoized
+                                            calendar for 'shift_schedules.txt' is used.
 
     Returns:
         float: The number of hours the material has been in storage.
@@ -58,80 +521,342 @@ def compute_elapsed_hours(row: pd.Series) -> float:
     try:
         #logger.debug(f"Computing elapsed hours for material: {row['Material']}")
 
-        # Get work shifts and work days based on parameters
-        parameters = read_shift_parameters()
-        work_shifts = get_work_shifts(parameters)
-        work_days = get_work_days(parameters)
+        if calendar is None:
+            calendar = load_shift_calendar()
 
         # Prepare calculation for now and last stock placement
         last_placement = pd.to_datetime(row['last_stock_placement'])
         now = datetime.now()
 
         # Calculate elapsed hours
-        elapsed_hours = calculate_elapsed_hours(last_placement, now, work_shifts, work_days)
+        elapsed_hours = calculate_elapsed_hours(last_placement, now, calendar.work_shifts, calendar.work_days,
+                                                calendar.closed_dates)
         #logger.debug(f"Elapsed hours for material {row['Material']}: {elapsed_hours:.2f} hours")
 
         return round(elapsed_hours, 2)
 
     except Exception as e:
-        logger.error(f"Error computing elapsed hours for material {row['Material']}: {e}", exc_info=True)
+        logger.error("Error computing elapsed hours for material %s: %s", row['Material'], e, exc_info=True,
+                     extra=THROTTLED)
         raise
 
-def process_inventory_data() -> Tuple[pd.DataFrame, pd.DataFrame]:
+
+def select_report_rows(df: pd.DataFrame, specs: Iterable[ReportSpec] = REPORT_SPECS) -> Dict[str, np.ndarray]:
     """
-    Performs the bulk of the processing work. Returns two dataframes: aged_load_inv and aged_unload_inv.
+    Locates the rows belonging to each report in a single grouped pass over storage type and bin.
+
+    Args:
+        df (pd.DataFrame): The inventory DataFrame.
+        specs (Iterable[ReportSpec]): The reports to select rows for.
 
     Returns:
-        Tuple[pd.DataFrame, pd.DataFrame]: DataFrames for aged load and unload inventory.
+        Dict[str, np.ndarray]: Sorted row positions in df for each report name.
     """
-    try:
-        logger.info("Starting inventory data processing.")
+    # observed=True keeps categorical columns from expanding into every type and bin combination
+    groups = df.groupby(['Storage Type', 'Storage Bin'], sort=False, dropna=False, observed=True).indices
+    report_rows: Dict[str, np.ndarray] = {}
+    for spec in specs:
+        matched = [positions for (storage_type, storage_bin), positions in groups.items()
+                   if spec.matches(storage_type, storage_bin)]
+        report_rows[spec.name] = np.sort(np.concatenate(matched)) if matched else np.empty(0, dtype=np.intp)
+    return report_rows
+
+
+def prepare_inventory(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, np.ndarray]]:
+    """
+    Selects the inventory columns used by the reports and locates the rows of every report.
+
+    Args:
+        df (pd.DataFrame): The SAP inventory as returned by load_sap_inventory.
+
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, np.ndarray]]: The inventory frame and the row positions of each report.
+    """
+    columns = ['Material', 'Material Description', 'Storage Type', 'Storage Bin', 'Total Stock', 'Storage Unit',
+               'last_stock_placement', 'Last addtn to stock']
+    # Frames already in the ingest schema hold exactly these columns and are used without a copy
+    if list(df.columns) != columns:
+        df = df[columns]
+    return df, select_report_rows(df, REPORT_SPECS)
+
+
+def age_inventory(df: pd.DataFrame, report_rows: Dict[str, np.ndarray], calendar: ShiftCalendar,
+                  as_of: datetime, state_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Adds the 'hours_elapsed' column, computing working hours only for rows of reports that need them.
+    Rows no report ages are left as NaN. The hours are not rounded, so that thresholds are applied to
+    the exact working time; build_reports rounds them for display.
+
+    Args:
+        df (pd.DataFrame): The inventory frame from prepare_inventory.
+        report_rows (Dict[str, np.ndarray]): The row positions of each report from prepare_inventory.
+        calendar (ShiftCalendar): The compiled shift calendar.
+        as_of (datetime): The time the elapsed hours are evaluated at.
+        state_path (Optional[str]): If provided, working time accrued by the previous run is reused from
+                                    this aging state file and the file is updated for the next run.
+
+    Returns:
+        pd.DataFrame: A shallow copy of df with the 'hours_elapsed' column; df itself is not modified.
+    """
+    aged_rows = [report_rows[spec.name] for spec in REPORT_SPECS if spec.needs_hours]
+    aged_rows = np.unique(np.concatenate(aged_rows)) if aged_rows else np.empty(0, dtype=np.intp)
+    logger.info("Computing elapsed hours for %s of %s inventory rows.", len(aged_rows), len(df))
+
+    hours_elapsed = np.full(len(df), np.nan)
+    if state_path is None:
+        # Compute elapsed hours for the selected entries in a single vectorized pass
+        elapsed_hours = calculate_elapsed_hours_batch(df['last_stock_placement'].iloc[aged_rows], as_of,
+                                                      calendar.work_shifts, calendar.work_days, calendar.closed_dates)
+    else:
+        keys = df[AGING_KEY].iloc[aged_rows]
+        working_ns, reused = calculate_elapsed_ns_incremental(keys, as_of, calendar,
+                                                              load_aging_state(calendar, state_path))
+        logger.info("Reused accrued working time for %s of %s rows.", reused, len(keys))
+        elapsed_hours = working_ns / _NS_PER_HOUR
+
+        accrued = pd.DataFrame({
+            'key_hash': key_hashes(keys),
+            'last_stock_placement': _to_ns(keys['last_stock_placement']).view(np.int64),
+            'working_ns': working_ns,
+        })[keys['last_stock_placement'].notna().to_numpy()]
+        accrued = accrued.drop_duplicates('key_hash')
+        save_aging_state(AgingState(pd.Timestamp(as_of), calendar_key(calendar), accrued), state_path)
+    hours_elapsed[aged_rows] = elapsed_hours
+
+    # The inventory columns are shared with df rather than copied
+    aged = df.copy(deep=False)
+    aged['hours_elapsed'] = hours_elapsed
+    return aged
+
+
+def _lookup_loaded(materials: pd.Series, paint_loaded: pd.DataFrame) -> np.ndarray:
+    """
+    Returns the LOADED quantity of each material, NaN for materials without paint data.
+    Categorical materials are looked up once per category rather than once per row.
+    """
+    loaded = paint_loaded['LOADED']
+    if isinstance(materials.dtype, pd.CategoricalDtype):
+        by_category = loaded.reindex(materials.cat.categories).to_numpy(dtype='float64')
+        # Code -1 marks a missing material and selects the appended NaN
+        return np.append(by_category, np.nan)[materials.cat.codes.to_numpy()]
+    return loaded.reindex(materials).to_numpy(dtype='float64')
+
 
-        # Load the paint inventory Excel file and drop rows with missing 'Last stock placement'
-        df = pd.read_excel(r'data\paint_inventory.xlsx').dropna(subset=['Last stock placement'])
-        df['last_stock_placement'] = pd.to_datetime(df['Last stock placement'].astype(str) + ' ' + df['Time'].astype(str))
-        df = df[['Material', 'Material Description', 'Storage Type', 'Storage Bin', 'Total Stock', 'Storage Unit',
-                 'last_stock_placement', 'Last addtn to stock']]
+def project_aging(df: pd.DataFrame, report_rows: Dict[str, np.ndarray], calendar: ShiftCalendar) -> pd.DataFrame:
+    """
+    Adds the 'ages_at' column: when each row of a report with an hour threshold that has not reached
+    it yet will do so. Rows that are already aged or have no threshold are left as NaT.
+
+    Args:
+        df (pd.DataFrame): The inventory frame from age_inventory.
+        report_rows (Dict[str, np.ndarray]): The row positions of each report from prepare_inventory.
+        calendar (ShiftCalendar): The compiled shift calendar.
+
+    Returns:
+        pd.DataFrame: A shallow copy of df with the 'ages_at' column.
+    """
+    hours_elapsed = df['hours_elapsed'].to_numpy()
+    ages_at = np.full(len(df), np.datetime64('NaT'), dtype='datetime64[ns]')
+    thresholds = {spec.min_hours for spec in REPORT_SPECS if spec.min_hours is not None}
+    for threshold in sorted(thresholds, reverse=True):
+        rows = [report_rows[spec.name] for spec in REPORT_SPECS if spec.min_hours == threshold]
+        rows = np.unique(np.concatenate(rows))
+        rows = rows[~(hours_elapsed[rows] >= threshold)]
+        ages_at[rows] = calculate_threshold_crossing_batch(df['last_stock_placement'].iloc[rows], threshold,
+                                                           calendar.work_shifts, calendar.work_days,
+                                                           calendar.closed_dates)
+
+    projected = df.copy(deep=False)
+    projected['ages_at'] = ages_at
+    return projected
+
+
+def next_crossing(df: pd.DataFrame, as_of: datetime) -> Optional[pd.Timestamp]:
+    """
+    Returns the earliest 'ages_at' after as_of, i.e. when the reports will next change through aging
+    alone, or None if no row is projected to age.
+    """
+    ages_at = df['ages_at']
+    upcoming = ages_at[ages_at > pd.Timestamp(as_of)]
+    return upcoming.min() if not upcoming.empty else None
+
+
+def round_hours(hours: np.ndarray) -> np.ndarray:
+    """
+    Rounds elapsed hours to two decimals for display exactly like the scalar compute_elapsed_hours. Python's
+    round rounds the decimal value correctly, while np.round rounds the scaled binary value, so the two only
+    differ for values within rounding error of a half; those few are rounded with round.
+    """
+    hours = np.asarray(hours, dtype='float64')
+    scaled = hours * 100
+    rounded = np.round(scaled) / 100
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    rounded[ties] = [round(value, 2) for value in hours[ties].tolist()]
+    return rounded
+
+
+def display_stock(stock: pd.Series) -> pd.Series:
+    """
+    Returns whole-number stock quantities as integers, as read from the export, rather than the compact
+    float32 they are stored in. Columns with fractions or missing values stay floats.
+    """
+    values = stock.to_numpy(dtype='float64')
+    if len(values) and np.isfinite(values).all() and (values == np.round(values)).all():
+        return pd.Series(values.astype('int64'), index=stock.index, name=stock.name)
+    return stock.astype('float64')
+
+
+def _report_frame(df: pd.DataFrame, spec: ReportSpec, rows: np.ndarray, loaded: Optional[np.ndarray],
+                  columns: Tuple[str, ...]) -> pd.DataFrame:
+    """
+    Copies the report's rows out of df once, merging the LOADED quantities if the report needs them.
+    Hours are compared unrounded by the callers and rounded here only for display.
+    """
+    computed: Dict[str, np.ndarray] = {}
+    if spec.merge_paint:
+        # Drop material that is no longer in station; material without paint data is kept
+        in_station = df['Total Stock'].to_numpy(dtype='float64')[rows] - loaded[rows]
+        kept = in_station != 0
+        rows = rows[kept]
+        computed = {'LOADED': loaded[rows], 'In Station': in_station[kept]}
+
+    report = df.iloc[rows, [df.columns.get_loc(column) for column in columns if column not in computed]]
+    for column in columns:
+        if column in computed:
+            report.insert(columns.index(column), column, computed[column])
+    display = {}
+    if 'hours_elapsed' in report.columns:
+        display['hours_elapsed'] = round_hours(report['hours_elapsed'].to_numpy())
+    if 'Total Stock' in report.columns:
+        display['Total Stock'] = display_stock(report['Total Stock'])
+    return report.assign(**display)
 
-        # Compute elapsed hours for each entry
-        df['hours_elapsed'] = df.apply(compute_elapsed_hours, axis=1)
 
-        # Filter data for aged load inventory
-        # Only show data that is in location for more than 4 working hours
-        aged_load_inv = df[(df['Storage Type'].isin(['800', '801', '802'])) & (df['hours_elapsed'] >= 4)]
+def build_reports(df: pd.DataFrame, report_rows: Dict[str, np.ndarray],
+                  paint_loaded: Optional[pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    Splits each report out of the aged inventory, applies its hour threshold and merges the
+    Paint Processed LOADED quantities into the reports that need them.
+
+    Args:
+        df (pd.DataFrame): The inventory frame from age_inventory.
+        report_rows (Dict[str, np.ndarray]): The row positions of each report from prepare_inventory.
+        paint_loaded (Optional[pd.DataFrame]): LOADED per PART_NO from load_paint_loaded. Only required
+                                               when a report merges paint data.
+
+    Returns:
+        Dict[str, pd.DataFrame]: The report DataFrames keyed by report name, in REPORT_SPECS order.
+    """
+    # Thresholds and the paint merge are applied to row positions, so each report is copied out of
+    # df exactly once
+    hours_elapsed = df['hours_elapsed'].to_numpy()
+    loaded = (_lookup_loaded(df['Material'], paint_loaded)
+              if any(spec.merge_paint for spec in REPORT_SPECS) else None)
+    reports: Dict[str, pd.DataFrame] = {}
+    for spec in REPORT_SPECS:
+        rows = report_rows[spec.name]
+        if spec.min_hours is not None:
+            rows = rows[hours_elapsed[rows] >= spec.min_hours]
+        reports[spec.name] = _report_frame(df, spec, rows, loaded, spec.columns)
+    return reports
+
+
+def build_upcoming_reports(df: pd.DataFrame, report_rows: Dict[str, np.ndarray],
+                           paint_loaded: Optional[pd.DataFrame],
+                           shift_end: Optional[pd.Timestamp]) -> Dict[str, pd.DataFrame]:
+    """
+    Lists the rows of the reports with upcoming set that have not reached their threshold yet but will
+    before the current shift ends, with the time each one ages in 'ages_at'. These are kept out of the
+    reports from build_reports, which only ever hold aged inventory.
+
+    Args:
+        df (pd.DataFrame): The inventory frame from project_aging.
+        report_rows (Dict[str, np.ndarray]): The row positions of each report from prepare_inventory.
+        paint_loaded (Optional[pd.DataFrame]): LOADED per PART_NO from load_paint_loaded. Only required
+                                               when a report merges paint data.
+        shift_end (Optional[pd.Timestamp]): The end of the current shift from current_shift_end. If None,
+                                            the upcoming reports are empty.
+
+    Returns:
+        Dict[str, pd.DataFrame]: The upcoming rows keyed by report name, for the reports with upcoming set.
+    """
+    specs = [spec for spec in REPORT_SPECS if spec.upcoming and spec.min_hours is not None]
+    hours_elapsed = df['hours_elapsed'].to_numpy()
+    ages_at = df['ages_at'].to_numpy()
+    loaded = (_lookup_loaded(df['Material'], paint_loaded)
+              if any(spec.merge_paint for spec in specs) else None)
+    reports: Dict[str, pd.DataFrame] = {}
+    for spec in specs:
+        rows = report_rows[spec.name]
+        if shift_end is None:
+            rows = rows[:0]
+        else:
+            rows = rows[(hours_elapsed[rows] < spec.min_hours) &
+                        (ages_at[rows] <= np.datetime64(shift_end.to_datetime64(), 'ns'))]
+        reports[spec.name] = _report_frame(df, spec, rows, loaded, spec.columns + ('ages_at',))
+    return reports
+
+
+def process_inventory_data(calendar: Optional[ShiftCalendar] = None,
+                           as_of: Optional[datetime] = None,
+                           state_path: Optional[str] = AGING_STATE_PATH,
+                           sap_path: str = SAP_INVENTORY_PATH,
+                           paint_path: str = PAINT_PROCESSED_PATH,
+                           cache_dir: Optional[str] = CACHE_DIRECTORY,
+                           cache_keep: int = 5,
+                           quarantine_dir: str = QUARANTINE_DIRECTORY) -> Tuple[pd.DataFrame, ...]:
+    """
+    Performs the bulk of the processing work. Returns one DataFrame per report in REPORT_SPECS:
+    aged_load_inv, aged_unload_inv and aged_8qi_inv.
+
+    Args:
+        calendar (Optional[ShiftCalendar]): The compiled shift calendar. If None, it is loaded once
+                                            from 'shift_schedules.txt' for the whole run.
+        as_of (Optional[datetime]): The time the elapsed hours are evaluated at. Defaults to now.
+        state_path (Optional[str]): The aging state file used to age incrementally across runs.
+                                    None recomputes every row from its placement time.
+        sap_path (str): The SAP export. Default is 'data/paint_inventory.xlsx'.
+        paint_path (str): The Paint Processed export. Default is 'data/paint_processed.csv'.
+        cache_dir (Optional[str]): Directory for the ingest cache. None disables caching.
+        cache_keep (int): The number of cached exports of each kind to retain.
+        quarantine_dir (str): Where rows of the exports that fail validation are written.
 
-        # Filter data for aged unload inventory
-        unload_bins = ["UNLOAD01", "UNLOAD02", "UNLOAD03", "UNLOAD04", "UNLOAD05", "LGUNLOAD"]
-        # Only show data that is in location for more than 4 working hours
-        aged_unload_inv = df[(df['Storage Bin'].isin(unload_bins)) & (df['hours_elapsed'] >= 4)]
+    Returns:
+        Tuple[pd.DataFrame, ...]: DataFrames for aged load, unload and 8QI inventory.
+    """
+    try:
+        logger.info("Starting inventory data processing.")
 
-        # Filter data for aged 8QI inventory
-        aged_8qi_inv = df[df['Storage Type'].isin(["8QI"])]
+        # Load the paint inventory export (from the columnar cache when unchanged); rows with missing
+        # 'Last stock placement' are dropped
+        with track_stage('ingest') as stage:
+            df = load_sap_inventory(sap_path, cache_dir, cache_keep, quarantine_dir)
+            stage.rows = len(df)
 
-        # Load the Paint Processed CSV file
-        paint_df = pd.read_csv(r'data\paint_processed.csv', encoding='utf-16', sep='\t')
+        with track_stage('filter', rows=len(df)):
+            df, report_rows = prepare_inventory(df)
 
-        # Filter and group the paint_df based on conditions
-        paint_filtered = paint_df[
-            (paint_df['GOOD'] == 0) & 
-            (paint_df['NON-CONFIRMED'] == 0) & 
-            (paint_df['SCRAP'] == 0)
-        ]
+        # Compile the shift calendar once for the whole run
+        if calendar is None:
+            calendar = load_shift_calendar()
+        as_of = as_of or datetime.now()
 
-        # Group by PART_NO and aggregate LOADED column
-        paint_grouped = paint_filtered.groupby('PART_NO', as_index=False).agg({'LOADED': 'sum'})
+        # Only rows some report uses are aged
+        with track_stage('aging', profile=True) as stage:
+            df = age_inventory(df, report_rows, calendar, as_of, state_path)
+            stage.rows = int(df['hours_elapsed'].notna().sum())
 
-        # Merge the aggregated data with the aged_load_inv DataFrame
-        aged_load_inv = pd.merge(aged_load_inv, paint_grouped, left_on='Material', right_on='PART_NO', how='left')
-        aged_load_inv['In Station'] = aged_load_inv['Total Stock'] - aged_load_inv['LOADED']
-        aged_load_inv = aged_load_inv[['Material', 'Material Description', 'Storage Type', 'Storage Bin', 'Total Stock', 'LOADED',
-                                       'In Station', 'Storage Unit', 'last_stock_placement', 'Last addtn to stock', 'hours_elapsed']]
-        aged_load_inv = aged_load_inv[(aged_load_inv['In Station'] != 0)]
+        # Load the LOADED quantity per part from the Paint Processed export if any report needs it
+        with track_stage('merge') as stage:
+            paint_loaded = (load_paint_loaded(paint_path, cache_dir, cache_keep, quarantine_dir)
+                            if any(spec.merge_paint for spec in REPORT_SPECS) else None)
+            reports = build_reports(df, report_rows, paint_loaded)
+            stage.rows = sum(len(report) for report in reports.values())
 
         logger.info("Inventory data processing complete.")
 
-        return aged_load_inv, aged_unload_inv, aged_8qi_inv
+        return tuple(reports[spec.name] for spec in REPORT_SPECS)
 
     except Exception as e:
-        logger.error(f"Error processing inventory data: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        logger.error("Error processing inventory data: %s", e, exc_info=True)
+        raise
@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+import multiprocessing
+import multiprocessing.util
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+LOG_DIRECTORY = 'logs'
+LOG_FILE = 'app.jsonl'
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Pass as 'extra' on warnings and errors logged once per row, which are the only records rate limited
+THROTTLED = {'throttled': True}
+
+# Attributes every LogRecord has; anything else was passed through 'extra' and is written as a field
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName', 'throttled'}
+
+_SUMMARY_MESSAGE = "Suppressed %s more messages like '%s' from %s in %.0fs (last: %s)"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line with the time, level, logger, message, process and
+    thread, the formatted exception if any, and any fields passed through 'extra'.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+@dataclass
+class _RepeatWindow:
+    started: float
+    seen: int = 0
+    suppressed: int = 0
+    last_record: Optional[logging.LogRecord] = None
+
+
+class AsyncLogHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a QueueListener thread, which formats and writes them, so the logging thread only
+    pays for an enqueue. Records are not formatted before they are queued, so arguments are rendered in
+    the background; pass immutable values (ids, counts, strings) rather than objects that change afterwards.
+
+    Records logged with extra=THROTTLED, i.e. per-row warnings and errors, are rate limited: after
+    repeat_limit of them with the same logger, level and message template within repeat_interval seconds,
+    further ones are counted rather than written, and a single summary with the count is written when the
+    window ends or flush_repeats() is called. Since the template is the key, this relies on lazy '%s'
+    formatting rather than f-strings. All other records are always written.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, targets: List[logging.Handler], repeat_limit: int = 10,
+                 repeat_interval: float = 60.0) -> None:
+        super().__init__(log_queue)
+        self.targets = targets
+        self.repeat_limit = repeat_limit
+        self.repeat_interval = repeat_interval
+        self._pid = os.getpid()
+        self._repeats_lock = threading.Lock()
+        self._windows: Dict[Tuple[str, int, str], _RepeatWindow] = {}
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so the record does not need to be formatted or pickled here
+        return record
+
+    def _summary(self, key: Tuple[str, int, str], window: _RepeatWindow, now: float) -> logging.LogRecord:
+        name, level, template = key
+        return logging.getLogger(name).makeRecord(
+            name, level, __file__, 0, _SUMMARY_MESSAGE,
+            (window.suppressed, template, name, now - window.started, window.last_record.getMessage()), None,
+            extra={'repeated': window.suppressed, 'template': template})
+
+    def _write(self, record: logging.LogRecord) -> None:
+        if os.getpid() == self._pid:
+            self.enqueue(self.prepare(record))
+            return
+        # A process forked without worker_logging() has no listener thread, so it writes to the targets directly
+        for target in self.targets:
+            if record.levelno >= target.level:
+                target.handle(record)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not getattr(record, 'throttled', False):
+            try:
+                self._write(record)
+            except Exception:
+                self.handleError(record)
+            return
+        key = (record.name, record.levelno, str(record.msg))
+        summary = None
+        with self._repeats_lock:
+            window = self._windows.get(key)
+            if window is None or record.created - window.started >= self.repeat_interval:
+                if window is not None and window.suppressed:
+                    summary = self._summary(key, window, record.created)
+                window = self._windows[key] = _RepeatWindow(record.created)
+            window.seen += 1
+            allowed = window.seen <= self.repeat_limit
+            if not allowed:
+                window.suppressed += 1
+                window.last_record = record
+        try:
+            if summary is not None:
+                self._write(summary)
+            if allowed:
+                self._write(record)
+        except Exception:
+            self.handleError(record)
+
+    def flush_repeats(self) -> int:
+        """
+        Writes a summary for every message that is being suppressed and starts new windows.
+
+        Returns:
+            int: The number of suppressed records summarized.
+        """
+        now = datetime.now().timestamp()
+        with self._repeats_lock:
+            windows, self._windows = self._windows, {}
+        summaries = [self._summary(key, window, now) for key, window in windows.items() if window.suppressed]
+        for summary in summaries:
+            self._write(summary)
+        return sum(summary.repeated for summary in summaries)
+
+
+class _WorkerLogHandler(AsyncLogHandler):
+    """
+    Rate limits a worker process's records like the parent's handler and sends them to the parent through a
+    multiprocessing queue. Records are formatted before they are sent, so that they can be pickled.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return logging.handlers.QueueHandler.prepare(self, record)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[AsyncLogHandler] = None
+_directory: Optional[str] = None
+_worker_listener: Optional[logging.handlers.QueueListener] = None
+_worker_queue: Optional['multiprocessing.queues.Queue'] = None
+
+
+def configure_logging(
+    directory: str = LOG_DIRECTORY,
+    level: int = logging.INFO,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    console: bool = True,
+    repeat_limit: int = 10,
+    repeat_interval: float = 60.0
+        ) -> AsyncLogHandler:
+    """
+    Routes all logging through a queue to a background thread that writes rotating JSON lines to
+    logs/app.jsonl and readable lines to the console. Replaces any handlers on the root logger, and
+    stops the background thread at exit after writing the queued records. Calling it again for the same
+    directory in the same process keeps the installed handler rather than opening the log file again.
+
+    Args:
+        directory (str): The log directory. Default is 'logs'.
+        level (int): The root logger level.
+        max_bytes (int): Size at which app.jsonl is rotated.
+        backup_count (int): The number of rotated files kept.
+        console (bool): Also write records to stderr.
+        repeat_limit (int): Records with the same template written per repeat_interval before suppressing.
+        repeat_interval (float): Seconds per rate limiting window.
+
+    Returns:
+        AsyncLogHandler: The handler installed on the root logger.
+    """
+    global _listener, _handler, _directory
+    if (_handler is not None and _handler._pid == os.getpid() and _directory == os.path.abspath(directory)
+            and _handler in logging.getLogger().handlers):
+        logging.getLogger().setLevel(level)
+        return _handler
+    os.makedirs(directory, exist_ok=True)
+    stop_logging()
+
+    file_handler = logging.handlers.RotatingFileHandler(os.path.join(directory, LOG_FILE), maxBytes=max_bytes,
+                                                        backupCount=backup_count, encoding='utf-8', delay=True)
+    file_handler.setFormatter(JsonLinesFormatter())
+    targets: List[logging.Handler] = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        targets.append(console_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _handler = AsyncLogHandler(log_queue, targets, repeat_limit, repeat_interval)
+    _listener = logging.handlers.QueueListener(log_queue, *targets, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    _directory = os.path.abspath(directory)
+    return _handler
+
+
+def _init_worker(log_queue: 'multiprocessing.queues.Queue', level: int, repeat_limit: int,
+                 repeat_interval: float) -> None:
+    handler = _WorkerLogHandler(log_queue, [], repeat_limit, repeat_interval)
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    # Summarize what the worker suppressed before it exits, ahead of the queue's own finalizer
+    multiprocessing.util.Finalize(handler, handler.flush_repeats, exitpriority=20)
+
+
+def worker_logging() -> Tuple[Optional[Callable[..., None]], tuple]:
+    """
+    Returns the initializer and its arguments for a ProcessPoolExecutor, so that its workers, whether spawned
+    or forked, send their records to this process's log files instead of the lastResort handler. A
+    background thread writes them. Returns (None, ()) when configure_logging has not been called.
+
+    Returns:
+        Tuple[Optional[Callable[..., None]], tuple]: The initializer and initargs arguments of the pool.
+    """
+    global _worker_listener, _worker_queue
+    if _listener is None or _handler is None or _handler._pid != os.getpid():
+        return None, ()
+    if _worker_listener is None:
+        _worker_queue = multiprocessing.get_context('spawn').Queue()
+        _worker_listener = logging.handlers.QueueListener(_worker_queue, *_listener.handlers,
+                                                          respect_handler_level=True)
+        _worker_listener.start()
+    return _init_worker, (_worker_queue, logging.getLogger().level, _handler.repeat_limit, _handler.repeat_interval)
+
+
+def flush_repeats() -> int:
+    """
+    Writes summaries of the messages suppressed so far, e.g. at the end of each run, so that every run's
+    log accounts for its repeated errors.
+
+    Returns:
+        int: The number of suppressed records summarized.
+    """
+    return _handler.flush_repeats() if _handler is not None else 0
+
+
+def stop_logging() -> None:
+    """
+    Summarizes suppressed messages, writes all queued records and stops the background thread.
+    """
+    global _listener, _handler, _directory, _worker_listener, _worker_queue
+    if _listener is None:
+        return
+    if _worker_listener is not None:
+        _worker_listener.stop()
+        _worker_queue.close()
+        _worker_listener = _worker_queue = None
+    flush_repeats()
+    _listener.stop()
+    for target in _listener.handlers:
+        target.close()
+    logging.getLogger().removeHandler(_handler)
+    _listener = _handler = _directory = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import logging
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Iterator, List, Optional
+from .file_utils import write_atomic
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+METRICS_DIRECTORY = 'logs'
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """
+    Returns the peak resident set size of this process so far, or None if it cannot be determined.
+    """
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                            ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                            ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return None
+            return int(counters.PeakWorkingSetSize)
+
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+        return int(peak if sys.platform == 'darwin' else peak * 1024)
+    except Exception:
+        return None
+
+
+@dataclass
+class StageMetrics:
+    """
+    Measurements for one pipeline stage.
+
+    Attributes:
+        stage (str): The name of the stage.
+        seconds (float): Wall time spent in the stage.
+        rows (Optional[int]): The number of rows the stage processed, if applicable.
+        rows_per_second (Optional[float]): Throughput of the stage, if rows were recorded.
+        peak_rss_bytes (Optional[int]): Peak resident set size of the process at the end of the stage.
+        error (Optional[str]): The error raised by the stage, if it failed.
+    """
+    stage: str
+    seconds: float = 0.0
+    rows: Optional[int] = None
+    rows_per_second: Optional[float] = None
+    peak_rss_bytes: Optional[int] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class RunMetrics:
+    """
+    Collects the stage measurements of one pipeline run and exports them.
+
+    Attributes:
+        started_at (datetime): When the run started.
+        profile_dir (Optional[str]): If set, profiled stages dump cProfile and tracemalloc output here.
+        stages (List[StageMetrics]): The stages measured so far, in order of completion.
+    """
+    started_at: datetime = field(default_factory=datetime.now)
+    profile_dir: Optional[str] = None
+    stages: List[StageMetrics] = field(default_factory=list)
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+
+    def to_record(self, success: bool) -> dict:
+        """
+        Returns the run as a JSON-serializable record.
+        """
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'duration_seconds': time.perf_counter() - self._start,
+            'success': success,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'stages': [asdict(stage) for stage in self.stages],
+        }
+
+    def write(self, success: bool, directory: Optional[str] = None) -> None:
+        """
+        Appends the run to metrics.jsonl and rewrites the Prometheus textfile collector file
+        aged_inventory.prom. The directory defaults to METRICS_TEXTFILE_DIR, or 'logs' if unset.
+
+        Parameters:
+            success (bool): Whether the run completed successfully.
+            directory (Optional[str]): The directory to write the metrics files to.
+        """
+        directory = directory or os.getenv("METRICS_TEXTFILE_DIR") or METRICS_DIRECTORY
+        record = self.to_record(success)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, 'metrics.jsonl'), 'a') as file:
+                file.write(json.dumps(record) + '\n')
+
+            # Written to a temporary file and renamed so that node_exporter never reads a partial file
+            def write_prometheus(temp_path: str) -> None:
+                with open(temp_path, 'w') as file:
+                    file.write(_prometheus_text(record))
+
+            write_atomic(os.path.join(directory, 'aged_inventory.prom'), write_prometheus)
+            logger.info("Wrote run metrics to '%s'.", directory)
+        except Exception as e:
+            logger.warning("Could not write run metrics to '%s': %s", directory, e)
+
+
+def _prometheus_text(record: dict) -> str:
+    """
+    Formats a run record in the Prometheus text exposition format.
+    """
+    lines = [
+        '# HELP aged_inventory_last_run_timestamp_seconds Start time of the last pipeline run.',
+        '# TYPE aged_inventory_last_run_timestamp_seconds gauge',
+        f"aged_inventory_last_run_timestamp_seconds {datetime.fromisoformat(record['started_at']).timestamp():.0f}",
+        '# HELP aged_inventory_last_run_success Whether the last pipeline run succeeded.',
+        '# TYPE aged_inventory_last_run_success gauge',
+        f"aged_inventory_last_run_success {int(record['success'])}",
+        '# HELP aged_inventory_last_run_duration_seconds Wall time of the last pipeline run.',
+        '# TYPE aged_inventory_last_run_duration_seconds gauge',
+        f"aged_inventory_last_run_duration_seconds {record['duration_seconds']:.6f}",
+    ]
+    series = [
+        ('stage_duration_seconds', 'Wall time of each stage in the last run.', 'seconds'),
+        ('stage_rows', 'Rows processed by each stage in the last run.', 'rows'),
+        ('stage_rows_per_second', 'Throughput of each stage in the last run.', 'rows_per_second'),
+        ('stage_peak_rss_bytes', 'Peak resident set size at the end of each stage in the last run.', 'peak_rss_bytes'),
+    ]
+    for name, description, key in series:
+        lines.append(f'# HELP aged_inventory_{name} {description}')
+        lines.append(f'# TYPE aged_inventory_{name} gauge')
+        for stage in record['stages']:
+            if stage[key] is not None:
+                lines.append(f'aged_inventory_{name}{{stage="{stage["stage"]}"}} {stage[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+# Measurements are recorded into the current run; library callers that never start a run still work
+_current_run = RunMetrics()
+
+
+def start_run(profile_dir: Optional[str] = None) -> RunMetrics:
+    """
+    Starts collecting metrics for a new pipeline run.
+
+    Parameters:
+        profile_dir (Optional[str]): If set, profiled stages dump cProfile and tracemalloc output here.
+
+    Returns:
+        RunMetrics: The new run, which subsequent stages are recorded into.
+    """
+    global _current_run
+    _current_run = RunMetrics(profile_dir=profile_dir)
+    return _current_run
+
+
+def current_run() -> RunMetrics:
+    """
+    Returns the run that stages are currently recorded into.
+    """
+    return _current_run
+
+
+@contextmanager
+def track_stage(stage: str, rows: Optional[int] = None, profile: bool = False) -> Iterator[StageMetrics]:
+    """
+    Measures a pipeline stage and records it into the current run. The yielded StageMetrics can be
+    updated with the number of rows once it is known.
+
+    Parameters:
+        stage (str): The name of the stage.
+        rows (Optional[int]): The number of rows the stage processes, if known up front.
+        profile (bool): Whether this stage is a hot path that is profiled when the run has a profile_dir.
+    """
+    run = _current_run
+    metrics = StageMetrics(stage, rows=rows)
+    profiler = None
+    if profile and run.profile_dir:
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
+
+    start = time.perf_counter()
+    try:
+        yield metrics
+    except BaseException as e:
+        metrics.error = str(e)
+        raise
+    finally:
+        metrics.seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            _dump_profile(run.profile_dir, stage, profiler)
+        if metrics.rows is not None and metrics.seconds > 0:
+            metrics.rows_per_second = metrics.rows / metrics.seconds
+        metrics.peak_rss_bytes = peak_rss_bytes()
+        run.stages.append(metrics)
+        if metrics.rows is not None:
+            logger.info("Stage '%s' took %.3fs for %s rows.", stage, metrics.seconds, metrics.rows)
+        else:
+            logger.info("Stage '%s' took %.3fs.", stage, metrics.seconds)
+
+
+def _dump_profile(profile_dir: str, stage: str, profiler: cProfile.Profile) -> None:
+    """
+    Writes the cProfile statistics and the top tracemalloc allocation sites of a stage.
+    """
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(profile_dir, f'{stage}.prof'))
+        snapshot = tracemalloc.take_snapshot()
+        with open(os.path.join(profile_dir, f'{stage}.tracemalloc.txt'), 'w') as file:
+            current, peak = tracemalloc.get_traced_memory()
+            file.write(f'current={current} peak={peak}\n')
+            for statistic in snapshot.statistics('lineno')[:25]:
+                file.write(f'{statistic}\n')
+        logger.info("Wrote profile for stage '%s' to '%s'.", stage, profile_dir)
+    except Exception as e:
+        logger.warning("Could not write profile for stage '%s': %s", stage, e)
+    finally:
+        tracemalloc.stop()
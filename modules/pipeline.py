@@ -0,0 +1,374 @@
+import os
+import json
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+import pandas as pd
+from .file_utils import file_digest, write_atomic
+from .log_config import worker_logging
+from .metrics import track_stage
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+PIPELINE_STATE_PATH = os.path.join('data', 'pipeline_state.json')
+
+# Bumped when the stage key changes, so that no stage is skipped on a key computed differently
+_STATE_VERSION = 1
+
+# The input under which stages with processes set receive the run's process pool
+PROCESS_POOL = 'process_pool'
+
+
+class PipelineError(RuntimeError):
+    """
+    One or more stages of a pipeline run failed.
+
+    Attributes:
+        failed (Dict[str, str]): The error message of each failed stage.
+    """
+
+    def __init__(self, failed: Dict[str, str]) -> None:
+        self.failed = failed
+        super().__init__(f"{len(failed)} pipeline stages failed: "
+                         + '; '.join(f'{name}: {error}' for name, error in failed.items()))
+
+
+@dataclass
+class Stage:
+    """
+    One step of the pipeline and what it depends on.
+
+    Attributes:
+        name (str): The stage's name, used in logs, metrics and the pipeline state.
+        run (Callable[[Dict[str, object]], Optional[Dict[str, object]]]): Called with the stage's inputs keyed
+            by name, returns its outputs keyed by name.
+        inputs (Tuple[str, ...]): The outputs of other stages the stage reads.
+        outputs (Tuple[str, ...]): The values the stage returns.
+        after (Tuple[str, ...]): Stages that must finish first although no value is passed, e.g. copying the
+                                 exports before they are read.
+        files (Union[Sequence[str], Callable]): The files the stage reads, or a callable returning them from
+                                                the inputs. Their content is part of the stage's key.
+        config (Dict[str, object]): Settings that change the stage's result. Part of the stage's key.
+        reusable (bool): The outputs are file paths (a path or a list of paths), which are kept in the
+                         pipeline state. The stage is skipped when its key is unchanged since it last
+                         succeeded and its output files are unchanged. Stages with in-memory outputs such as
+                         DataFrames always run.
+        always_run (bool): Run even when the key is unchanged, e.g. acquisition, which fetches new data.
+        lock (Optional[str]): Stages with the same lock never run at the same time, e.g. the GUI automations
+                              sharing one desktop.
+        profile (bool): Passed to track_stage.
+        rows (Optional[Callable[[Dict[str, object]], int]]): Counts the rows the stage processed from its
+                                                              inputs and outputs, for the run metrics.
+        processes (bool): The stage runs work in worker processes. It receives the run's shared process pool
+                          as its PROCESS_POOL input, which is not part of its key.
+    """
+    name: str
+    run: Callable[[Dict[str, object]], Optional[Dict[str, object]]]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    after: Tuple[str, ...] = ()
+    files: Union[Sequence[str], Callable[[Dict[str, object]], Iterable[str]]] = ()
+    config: Dict[str, object] = field(default_factory=dict)
+    reusable: bool = False
+    always_run: bool = False
+    lock: Optional[str] = None
+    profile: bool = False
+    rows: Optional[Callable[[Dict[str, object]], int]] = None
+    processes: bool = False
+
+
+def fingerprint(value: object) -> object:
+    """
+    Returns a JSON-serializable fingerprint of a stage input. DataFrames are hashed by content, index,
+    columns and dtypes, so an equal frame built in another run has the same fingerprint.
+    """
+    if isinstance(value, pd.DataFrame):
+        digest = hashlib.sha256(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        digest.update(repr([(str(column), str(dtype)) for column, dtype in value.dtypes.items()]).encode())
+        return f'frame:{digest.hexdigest()}'
+    if isinstance(value, dict):
+        return {str(key): fingerprint(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [fingerprint(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def _paths(outputs: Dict[str, object]) -> List[str]:
+    paths: List[str] = []
+    for value in outputs.values():
+        paths.extend(value if isinstance(value, (list, tuple)) else [value])
+    return [str(path) for path in paths if path is not None]
+
+
+def _digests(paths: Iterable[str]) -> Dict[str, Optional[str]]:
+    return {path: file_digest(path) if os.path.exists(path) else None for path in paths}
+
+
+def load_pipeline_state(path: str = PIPELINE_STATE_PATH) -> Dict[str, dict]:
+    """
+    Loads the state of the previous runs: the last run's status and each stage's key, status and outputs.
+    """
+    try:
+        with open(path, 'r') as file:
+            state = json.load(file)
+        if state.get('version') == _STATE_VERSION:
+            return state
+        logger.info("Pipeline state '%s' has an older format, running every stage.", path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Could not read pipeline state '%s', running every stage: %s", path, e)
+    return {'version': _STATE_VERSION, 'run': {}, 'stages': {}}
+
+
+def _save_pipeline_state(state: Dict[str, dict], path: str) -> None:
+    def write(temp_path: str) -> None:
+        with open(temp_path, 'w') as file:
+            json.dump(state, file, indent=2)
+
+    try:
+        write_atomic(path, write)
+    except Exception as e:
+        logger.warning("Could not save pipeline state '%s': %s", path, e)
+
+
+class Pipeline:
+    """
+    Runs stages as a dependency graph. A stage starts as soon as the stages it depends on have finished,
+    so independent stages run concurrently in a thread pool. A stage whose inputs, files and config are
+    unchanged since it last succeeded is skipped when it is reusable. When a stage fails, the stages that
+    depend on it are not run, the others still are, and the run can be resumed: stages that succeeded in
+    the failed run are then skipped if their key is unchanged and their outputs still exist.
+
+    The state of each stage is saved to the pipeline state file as soon as the stage finishes. Stages that
+    run work in worker processes share one process pool per run. Its workers are spawned rather than forked,
+    since forking from the stage threads could copy a lock another thread holds, and log to the run's log
+    files through worker_logging.
+    """
+
+    def __init__(self, stages: List[Stage], state_path: str = PIPELINE_STATE_PATH) -> None:
+        self.stages = {}
+        self.state_path = state_path
+        producers: Dict[str, str] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Stage '{stage.name}' is defined more than once.")
+            self.stages[stage.name] = stage
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"'{output}' is an output of both '{producers[output]}' and '{stage.name}'.")
+                producers[output] = stage.name
+
+        self.dependencies: Dict[str, Set[str]] = {}
+        for stage in stages:
+            unknown = [name for name in stage.inputs if name not in producers]
+            unknown += [name for name in stage.after if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown inputs or stages {unknown}.")
+            self.dependencies[stage.name] = {producers[name] for name in stage.inputs} | set(stage.after)
+        self.levels = self._levels()
+
+    def _levels(self) -> Dict[str, int]:
+        """
+        Returns each stage's step in the plan: one more than the latest step it depends on.
+        """
+        levels: Dict[str, int] = {}
+        while len(levels) < len(self.stages):
+            ready = [name for name in self.stages if name not in levels
+                     and all(dependency in levels for dependency in self.dependencies[name])]
+            if not ready:
+                cycle = [name for name in self.stages if name not in levels]
+                raise ValueError(f"Stages {cycle} depend on each other in a cycle.")
+            for name in ready:
+                levels[name] = 1 + max((levels[dependency] for dependency in self.dependencies[name]), default=0)
+        return levels
+
+    def stage_key(self, stage: Stage, inputs: Dict[str, object]) -> str:
+        """
+        Hashes everything a stage's result depends on: its name, config, inputs and the content of its files.
+        """
+        files = stage.files(inputs) if callable(stage.files) else stage.files
+        key = {
+            'version': _STATE_VERSION,
+            'stage': stage.name,
+            'config': stage.config,
+            'inputs': {name: fingerprint(inputs[name]) for name in stage.inputs},
+            'files': _digests(files),
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _needs_key(self, stage: Stage) -> bool:
+        # Stages with in-memory outputs are never skipped, so hashing their inputs would be wasted
+        return stage.reusable or not stage.outputs
+
+    def _skip_reason(self, stage: Stage, key: Optional[str], previous: Optional[dict],
+                     resume_run: Optional[str]) -> Optional[str]:
+        """
+        Returns why a stage can be skipped, or None if it has to run.
+        """
+        if key is None or previous is None or previous.get('status') != 'ok' or previous.get('key') != key:
+            return None
+        if _digests(previous.get('digests', {})) != previous.get('digests', {}):
+            return None
+        if resume_run is not None and previous.get('run') == resume_run:
+            return 'it succeeded in the interrupted run'
+        if stage.reusable and not stage.always_run:
+            return 'its inputs and config are unchanged'
+        return None
+
+    def _execute(self, stage: Stage, inputs: Dict[str, object], previous: Optional[dict],
+                 resume_run: Optional[str]) -> Tuple[Dict[str, object], Optional[str], Optional[str]]:
+        """
+        Runs or skips one stage in a worker thread.
+
+        Returns:
+            Tuple[Dict[str, object], Optional[str], Optional[str]]: The outputs, the stage's key if it was
+                                                                     computed, and why it was skipped if it was.
+        """
+        key = self.stage_key(stage, inputs) if self._needs_key(stage) else None
+        reason = self._skip_reason(stage, key, previous, resume_run)
+        if reason is not None:
+            logger.info("Skipping stage '%s': %s.", stage.name, reason)
+            return dict(previous.get('outputs', {})), key, reason
+
+        with track_stage(stage.name, profile=stage.profile) as metrics:
+            outputs = stage.run(inputs) or {}
+            missing = [name for name in stage.outputs if name not in outputs]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' did not return its outputs {missing}.")
+            if stage.rows is not None:
+                metrics.rows = stage.rows({**inputs, **outputs})
+        return outputs, key, None
+
+    def _resume_run(self, state: Dict[str, dict], resume: bool) -> Optional[str]:
+        if not resume:
+            return None
+        run = state.get('run', {})
+        if not run.get('id') or run.get('status') == 'ok':
+            logger.info("The previous run did not fail, nothing to resume.")
+            return None
+        logger.info("Resuming the run started at %s.", run['id'])
+        return run['id']
+
+    def describe(self, resume: bool = False) -> str:
+        """
+        Returns the plan as text: the stages by step, what each depends on, and whether it will run or be
+        skipped. Stages whose key depends on values computed by earlier stages can only be decided then.
+        """
+        state = load_pipeline_state(self.state_path)
+        resume_run = self._resume_run(state, resume)
+        lines = [f"Pipeline plan ({len(self.stages)} stages, {max(self.levels.values(), default=0)} steps"
+                 + (f", resuming the run started at {resume_run})" if resume_run else ")")]
+        for name in sorted(self.stages, key=lambda name: self.levels[name]):
+            stage = self.stages[name]
+            previous = state['stages'].get(name)
+            skippable = self._needs_key(stage) and (resume_run is not None or (stage.reusable and not stage.always_run))
+            if not skippable:
+                action = 'run' + (' (always)' if stage.always_run else '')
+            elif stage.inputs or callable(stage.files):
+                action = 'run unless its inputs are unchanged'
+            else:
+                reason = self._skip_reason(stage, self.stage_key(stage, {}), previous, resume_run)
+                action = f'skip, {reason}' if reason else 'run'
+            dependencies = ', '.join(sorted(self.dependencies[name])) or '-'
+            lines.append(f"  {self.levels[name]:>2}  {name:<28} after: {dependencies:<40} {action}")
+        return '\n'.join(lines)
+
+    def run(self, resume: bool = False, max_workers: int = 4,
+            process_workers: Optional[int] = None) -> Dict[str, object]:
+        """
+        Runs the pipeline.
+
+        Args:
+            resume (bool): Skip the stages that succeeded in the previous run if that run failed and their
+                           key is unchanged, e.g. to publish again without downloading the exports again.
+            max_workers (int): Maximum number of stages running at once.
+            process_workers (Optional[int]): Size of the process pool shared by the stages with processes set.
+                                             Defaults to the number of CPUs.
+
+        Returns:
+            Dict[str, object]: The outputs of all stages.
+
+        Raises:
+            PipelineError: If any stage failed, after every stage that does not depend on it has finished.
+        """
+        state = load_pipeline_state(self.state_path)
+        resume_run = self._resume_run(state, resume)
+        previous_stages = dict(state['stages'])
+        run_id = datetime.now().isoformat(timespec='seconds')
+        state['run'] = {'id': run_id, 'status': 'running'}
+        _save_pipeline_state(state, self.state_path)
+
+        values: Dict[str, object] = {}
+        status: Dict[str, str] = {}
+        failed: Dict[str, str] = {}
+        pending = sorted(self.stages, key=lambda name: self.levels[name])
+        running: Dict[Future, Stage] = {}
+        locks: Set[str] = set()
+        pool = None
+        if any(stage.processes for stage in self.stages.values()):
+            initializer, initargs = worker_logging()
+            pool = ProcessPoolExecutor(max_workers=process_workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=initializer, initargs=initargs)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while pending or running:
+                    for name in list(pending):
+                        stage = self.stages[name]
+                        dependencies = self.dependencies[name]
+                        if any(status.get(dependency) == 'blocked' or dependency in failed
+                               for dependency in dependencies):
+                            logger.warning("Not running stage '%s' because a stage it depends on failed.", name)
+                            status[name] = 'blocked'
+                            pending.remove(name)
+                        elif all(dependency in status for dependency in dependencies) and stage.lock not in locks:
+                            if stage.lock is not None:
+                                locks.add(stage.lock)
+                            inputs = {input_name: values[input_name] for input_name in stage.inputs}
+                            if stage.processes:
+                                inputs[PROCESS_POOL] = pool
+                            running[executor.submit(self._execute, stage, inputs, previous_stages.get(name),
+                                                    resume_run)] = stage
+                            pending.remove(name)
+                    if not running:
+                        continue
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage = running.pop(future)
+                        locks.discard(stage.lock)
+                        entry = {'run': run_id, 'finished_at': datetime.now().isoformat(timespec='seconds')}
+                        try:
+                            outputs, key, skipped = future.result()
+                            values.update(outputs)
+                            status[stage.name] = 'skipped' if skipped else 'ok'
+                            entry.update(status='ok', key=key)
+                            if stage.reusable:
+                                entry.update(outputs=outputs, digests=_digests(_paths(outputs)))
+                        except Exception as e:
+                            logger.error("Stage '%s' failed: %s", stage.name, e, exc_info=True)
+                            failed[stage.name] = str(e) or type(e).__name__
+                            status[stage.name] = 'failed'
+                            entry.update(status='failed', error=failed[stage.name])
+                        state['stages'][stage.name] = entry
+                        _save_pipeline_state(state, self.state_path)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        state['run']['status'] = 'failed' if failed else 'ok'
+        _save_pipeline_state(state, self.state_path)
+        skipped = sum(value == 'skipped' for value in status.values())
+        blocked = sum(value == 'blocked' for value in status.values())
+        logger.info("Pipeline finished: %s stages ran, %s skipped, %s failed, %s not run.",
+                    len(status) - skipped - blocked - len(failed), skipped, len(failed), blocked)
+        if failed:
+            raise PipelineError(failed)
+        return values
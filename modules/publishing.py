@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Optional
+from .file_utils import file_digest
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = os.path.join('data', 'publish_manifest.json')
+
+# OneDrive does not sync files starting with '~$' or ending in '.tmp', so readers never see partial copies
+_TEMP_PREFIX = '~$'
+_TEMP_SUFFIX = '.tmp'
+
+
+@dataclass
+class PublishResult:
+    """
+    Outcome of publishing one file.
+
+    Attributes:
+        file_name (str): The name of the published file.
+        status (str): 'published', 'unchanged' or 'failed'.
+        digest (Optional[str]): SHA-256 hash of the file content, if it could be read.
+        attempts (int): The number of copy attempts made.
+        error (Optional[BaseException]): The error raised if publishing failed.
+    """
+    file_name: str
+    status: str
+    digest: Optional[str] = None
+    attempts: int = 0
+    error: Optional[BaseException] = None
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, Dict[str, Dict[str, object]]]:
+    """
+    Loads the manifest of published file versions, keyed by destination directory and file name.
+
+    Args:
+        path (str): The path of the manifest file.
+
+    Returns:
+        Dict[str, Dict[str, Dict[str, object]]]: The manifest, or an empty manifest if none exists yet.
+    """
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning("Could not read publish manifest '%s', starting a new one: %s", path, e)
+        return {}
+
+
+def _save_manifest(manifest: Dict[str, Dict[str, Dict[str, object]]], path: str) -> None:
+    """
+    Writes the manifest through a temporary file so that it is never left half-written.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + _TEMP_SUFFIX
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def _is_published(dst: str, digest: str, entry: Optional[Dict[str, object]]) -> bool:
+    """
+    Checks whether the destination already holds content with the given hash. The recorded manifest entry
+    is trusted while the destination's size and mtime are unchanged; otherwise the destination is hashed.
+    """
+    try:
+        stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    if entry is not None and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+        return entry.get('sha256') == digest
+    return file_digest(dst) == digest
+
+
+def _copy_atomic(src: str, dst: str) -> None:
+    """
+    Copies src next to dst under a temporary name and renames it into place.
+    """
+    temp_path = os.path.join(os.path.dirname(dst), _TEMP_PREFIX + os.path.basename(dst) + _TEMP_SUFFIX)
+    try:
+        shutil.copyfile(src, temp_path)
+        os.replace(temp_path, dst)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _publish_file(src: str, dst: str, entry: Optional[Dict[str, object]], retries: int,
+                  backoff: float) -> PublishResult:
+    """
+    Publishes a single file, skipping it if unchanged and retrying transient errors with exponential backoff.
+    """
+    file_name = os.path.basename(dst)
+    try:
+        digest = file_digest(src)
+        if _is_published(dst, digest, entry):
+            logger.info("Skipped '%s', the published copy is unchanged.", file_name)
+            return PublishResult(file_name, 'unchanged', digest)
+    except FileNotFoundError as e:
+        logger.error("File '%s' not found in source directory '%s'.", file_name, os.path.dirname(src))
+        return PublishResult(file_name, 'failed', error=e)
+
+    for attempt in range(1, retries + 2):
+        try:
+            _copy_atomic(src, dst)
+            logger.info("Successfully published '%s' to '%s'.", file_name, os.path.dirname(dst))
+            return PublishResult(file_name, 'published', digest, attempt)
+        except FileNotFoundError as e:
+            logger.error("Error publishing '%s': %s", file_name, e)
+            return PublishResult(file_name, 'failed', digest, attempt, e)
+        except OSError as e:
+            if attempt > retries:
+                logger.error("Error publishing '%s' after %s attempts: %s", file_name, attempt, e)
+                return PublishResult(file_name, 'failed', digest, attempt, e)
+            delay = backoff * 2 ** (attempt - 1)
+            logger.warning("Attempt %s to publish '%s' failed, retrying in %.1fs: %s", attempt, file_name, delay, e)
+            time.sleep(delay)
+
+
+def publish_files(
+    source_dir: str,
+    dest_dir: str,
+    files: List[str],
+    manifest_path: str = MANIFEST_PATH,
+    max_workers: int = 4,
+    retries: int = 3,
+    backoff: float = 0.5
+        ) -> List[PublishResult]:
+    """
+    Publishes files from the source directory to the destination directory. Files whose content matches the
+    published copy are skipped, changed files are copied in parallel and renamed into place atomically, and
+    transient errors are retried with exponential backoff. Published versions are recorded in a manifest.
+
+    Args:
+        source_dir (str): The directory containing the files to publish.
+        dest_dir (str): The directory to publish the files to.
+        files (List[str]): The names of the files to publish.
+        manifest_path (str): The path of the manifest of published versions.
+        max_workers (int): The maximum number of concurrent copies.
+        retries (int): The number of retries after a failed copy.
+        backoff (float): The delay in seconds before the first retry, doubled on each further retry.
+
+    Returns:
+        List[PublishResult]: The outcome for each file, in the order given.
+    """
+    manifest = load_manifest(manifest_path)
+    published = manifest.setdefault(os.path.abspath(dest_dir), {})
+    manifest_lock = Lock()
+
+    def publish(file_name: str) -> PublishResult:
+        dst = os.path.join(dest_dir, file_name)
+        result = _publish_file(os.path.join(source_dir, file_name), dst, published.get(file_name), retries, backoff)
+        if result.status == 'published' or (result.status == 'unchanged' and file_name not in published):
+            stat = os.stat(dst)
+            with manifest_lock:
+                published[file_name] = {
+                    'sha256': result.digest,
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'published_at': datetime.now().isoformat(timespec='seconds'),
+                }
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files)))) as executor:
+        results = list(executor.map(publish, files))
+
+    try:
+        _save_manifest(manifest, manifest_path)
+    except Exception as e:
+        logger.warning("Could not write publish manifest '%s': %s", manifest_path, e)
+    return results
@@ -0,0 +1,160 @@
+import os
+import time
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from pandas import DataFrame
+from .file_utils import write_excel_sheets
+from .log_config import worker_logging
+from .metrics import start_run, track_stage
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+# The sheet listing the rows that will age before the current shift ends, next to a report's aged rows
+UPCOMING_SHEET = 'Aging this shift'
+
+
+@dataclass
+class RenderResult:
+    """
+    Outcome of rendering one Excel report.
+
+    Attributes:
+        filename (str): The path of the rendered workbook.
+        seconds (float): Wall time spent rendering the workbook.
+        error (Optional[str]): The error message if rendering failed, otherwise None.
+    """
+    filename: str
+    seconds: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _render_workbook(sheets: Dict[str, DataFrame], filename: str, streaming: bool,
+                     profile_dir: Optional[str] = None) -> float:
+    """
+    Renders a single workbook and returns the time it took. Runs inside a worker process, so profiling
+    output is written from here rather than from the parent's render stage.
+    """
+    start = time.perf_counter()
+    if profile_dir:
+        start_run(profile_dir)
+        with track_stage(f'render-{_sheet_name(filename)}', profile=True):
+            write_excel_sheets(sheets, filename, streaming)
+    else:
+        write_excel_sheets(sheets, filename, streaming)
+    return time.perf_counter() - start
+
+
+def _sheet_name(filename: str) -> str:
+    # Excel limits worksheet names to 31 characters
+    return os.path.splitext(os.path.basename(filename.replace('\\', '/')))[0][:31]
+
+
+def render_reports(
+    reports: Dict[str, DataFrame],
+    workbook: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    streaming: bool = True,
+    profile_dir: Optional[str] = None,
+    upcoming: Optional[Dict[str, DataFrame]] = None
+        ) -> List[RenderResult]:
+    """
+    Renders the reports to Excel concurrently in a process pool. A report that fails to render is
+    logged and recorded in its result without affecting the other reports.
+
+    Args:
+        reports (Dict[str, DataFrame]): The report DataFrames keyed by output file path.
+        workbook (Optional[str]): If provided, all reports are written as sheets of this single workbook
+                                  instead of one file per report. Sheets are named after the report files.
+        max_workers (Optional[int]): Maximum number of worker processes. Defaults to one per workbook.
+        streaming (bool): Passed to write_excel_sheets to select the streaming writer.
+        profile_dir (Optional[str]): If provided, each worker dumps cProfile and tracemalloc output for its
+                                     workbook to this directory.
+        upcoming (Optional[Dict[str, DataFrame]]): The rows that will age this shift, keyed by the file path
+                                                   of the report they belong to.
+
+    Returns:
+        List[RenderResult]: The outcome of each rendered workbook, in the order submitted.
+    """
+    return render_workbooks(report_workbooks(reports, workbook, upcoming), max_workers, streaming, profile_dir)
+
+
+def report_workbooks(reports: Dict[str, DataFrame], workbook: Optional[str] = None,
+                     upcoming: Optional[Dict[str, DataFrame]] = None) -> Dict[str, Dict[str, DataFrame]]:
+    """
+    Lays the reports out as workbooks for render_workbooks: one 'Sheet1' workbook per report file, or
+    a single workbook with one sheet per report if workbook is provided. A report's upcoming rows follow
+    it in an UPCOMING_SHEET sheet, or in a '<report> upcoming' sheet of the single workbook.
+    """
+    upcoming = upcoming or {}
+    workbooks: Dict[str, Dict[str, DataFrame]] = {workbook: {}} if workbook is not None else {}
+    for filename, df in reports.items():
+        if workbook is not None:
+            sheets = workbooks[workbook]
+            sheets[_sheet_name(filename)] = df
+            if filename in upcoming:
+                sheets[_sheet_name(f'{os.path.splitext(filename)[0]} upcoming')] = upcoming[filename]
+        else:
+            workbooks[filename] = {'Sheet1': df}
+            if filename in upcoming:
+                workbooks[filename][UPCOMING_SHEET] = upcoming[filename]
+    return workbooks
+
+
+def render_workbooks(
+    workbooks: Dict[str, Dict[str, DataFrame]],
+    max_workers: Optional[int] = None,
+    streaming: bool = True,
+    profile_dir: Optional[str] = None,
+    executor: Optional[Executor] = None
+        ) -> List[RenderResult]:
+    """
+    Renders workbooks concurrently in a process pool, one worker per workbook.
+
+    Args:
+        workbooks (Dict[str, Dict[str, DataFrame]]): The worksheets of each workbook, keyed by output file
+                                                     path and then by sheet name.
+        max_workers (Optional[int]): Maximum number of worker processes. Defaults to one per workbook.
+        streaming (bool): Passed to write_excel_sheets to select the streaming writer.
+        profile_dir (Optional[str]): If provided, each worker dumps cProfile and tracemalloc output for its
+                                     workbook to this directory.
+        executor (Optional[Executor]): A process pool to render in, e.g. the one shared by a pipeline run.
+                                       It is left running. If None, a pool is created for these workbooks
+                                       and max_workers applies.
+
+    Returns:
+        List[RenderResult]: The outcome of each rendered workbook, in the order submitted.
+    """
+    results: Dict[str, RenderResult] = {}
+    start = time.perf_counter()
+    pool = executor
+    if pool is None:
+        initializer, initargs = worker_logging()
+        pool = ProcessPoolExecutor(max_workers=max_workers or len(workbooks) or 1, initializer=initializer,
+                                   initargs=initargs)
+    try:
+        futures = {pool.submit(_render_workbook, sheets, filename, streaming, profile_dir): filename
+                   for filename, sheets in workbooks.items()}
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                seconds = future.result()
+                results[filename] = RenderResult(filename, seconds)
+                logger.info("Rendered '%s' in %.2fs.", filename, seconds)
+            except Exception as e:
+                results[filename] = RenderResult(filename, time.perf_counter() - start, str(e))
+                logger.error("Failed to render '%s': %s", filename, e, exc_info=e)
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+    failed = sum(not result.ok for result in results.values())
+    logger.info("Rendered %s of %s workbooks in %.2fs.", len(results) - failed, len(results),
+                time.perf_counter() - start)
+    return [results[filename] for filename in workbooks]
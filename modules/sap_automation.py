@@ -3,18 +3,34 @@ import os
 import time
 import win32com.client
 import pyautogui
+from .file_utils import get_file_wait_timeout, wait_for_file
 
 logger = logging.getLogger(__name__)  # Initialize the module-specific logger
 
+def _wait_for_window(title: str, timeout: float, poll_interval: float = 0.25) -> bool:
+    """
+    Waits until a window whose title contains the given text is open.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pyautogui.getWindowsWithTitle(title):
+            return True
+        time.sleep(poll_interval)
+    return False
+
 def get_sap_stock() -> None:
     """
-    Automates the GUI process in SAP to retrieve stock data for Plant 8. 
+    Automates the GUI process in SAP to retrieve stock data for the plant selected by the STOCK_VARIANT
+    variant (Plant 8's P8AGEDINV by default).
     Assumes the user is actively logged into SAP and has required permissions.
     """
     stock_transaction=os.getenv("STOCK_TRANSACTION")
+    stock_variant = os.getenv("STOCK_VARIANT", "P8AGEDINV")
+    export_file = os.path.join(os.getenv("SAP_GUI_PATH", ""), "paint_inventory.XLSX")
+    export_started = time.time()
 
     try:
-        logger.info("Starting SAP stock retrieval for Plant 8.")
+        logger.info("Starting SAP stock retrieval for variant '%s'.", stock_variant)
 
         # Connect to SAP GUI
         sap_gui = win32com.client.GetObject("SAPGUI")
@@ -28,11 +44,11 @@ def get_sap_stock() -> None:
         session.StartTransaction(Transaction=stock_transaction)
         logger.info("Transaction LX02 started.")
 
-        # Set the variant for Plant 8 aged inventory
+        # Set the variant for the plant's aged inventory
         session.findById("wnd[0]/tbar[1]/btn[17]").press()
         variant_input = session.findById("wnd[1]/usr/txtV-LOW")
-        variant_input.text = "P8AGEDINV"
-        logger.info("Variant 'P8AGEDINV' selected.")
+        variant_input.text = stock_variant
+        logger.info("Variant '%s' selected.", stock_variant)
 
         # Clear the "User" field and press Execute
         ename_field = session.findById("wnd[1]/usr/txtENAME-LOW")
@@ -53,13 +69,17 @@ def get_sap_stock() -> None:
         logger.info("Report exported to 'paint_inventory.XLSX'.")
 
     except Exception as e:
-        logger.error(f"Error occurred during SAP stock retrieval: {e}", exc_info=True)
+        logger.error("Error occurred during SAP stock retrieval: %s", e, exc_info=True)
 
-    # Wait and close the Excel document
+    # Wait for the export to be written and Excel to open it, then close the Excel document
     try:
-        time.sleep(5)  # Wait for Excel to open
+        timeout = get_file_wait_timeout()
+        if not wait_for_file(export_file, timeout=timeout, newer_than=export_started):
+            logger.error("Export '%s' was not written within %.0f seconds.", export_file, timeout)
+        if not _wait_for_window("paint_inventory", timeout=timeout):
+            logger.warning("Excel window for the export did not open within the timeout.")
         pyautogui.click(865, 557)  # Focus on the Excel window
         pyautogui.hotkey('alt', 'f4')  # Close Excel
         logger.info("Closed Excel document.")
     except Exception as e:
-        logger.error(f"Error while closing Excel: {e}", exc_info=True)
\ No newline at end of file
+        logger.error("Error while closing Excel: %s", e, exc_info=True)
\ No newline at end of file
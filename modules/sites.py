@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+from .log_config import worker_logging
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+SITES_CONFIG_PATH = 'sites.json'
+
+
+@dataclass
+class SiteConfig:
+    """
+    One plant the pipeline runs for.
+
+    Attributes:
+        name (str): The plant's name, used in logs and results.
+        directory (str): The plant's working directory. It holds the plant's own shift_schedules.txt, and
+                         its data/ and logs/ directories are created there.
+        environment (Dict[str, str]): Environment variables set while the plant runs, e.g. STOCK_VARIANT,
+                                      SHAREPOINT_DIRECTORY or REPORT_WORKBOOK. Variables not set here
+                                      are inherited from the .env file.
+    """
+    name: str
+    directory: str
+    environment: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class SiteResult:
+    """
+    Outcome of running the pipeline for one plant.
+
+    Attributes:
+        name (str): The plant's name.
+        seconds (float): Wall time spent on the plant.
+        error (Optional[str]): The error message if the plant failed, otherwise None.
+    """
+    name: str
+    seconds: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def load_sites(path: str = SITES_CONFIG_PATH) -> List[SiteConfig]:
+    """
+    Loads the plant configuration. The file is a JSON list of objects with 'name', 'directory' and an
+    optional 'environment' mapping. Relative directories are resolved against the configuration file's
+    directory.
+
+    Args:
+        path (str): The path of the configuration file. Default is 'sites.json'.
+
+    Returns:
+        List[SiteConfig]: The configured plants, in file order.
+
+    Raises:
+        ValueError: If a plant has no name or directory, or two plants share a name.
+    """
+    with open(path, 'r') as file:
+        entries = json.load(file)
+
+    base_directory = os.path.dirname(os.path.abspath(path))
+    sites: List[SiteConfig] = []
+    for entry in entries:
+        if not entry.get('name') or not entry.get('directory'):
+            raise ValueError(f"Every site in '{path}' needs a 'name' and a 'directory': {entry}")
+        if any(site.name == entry['name'] for site in sites):
+            raise ValueError(f"Site '{entry['name']}' is configured more than once in '{path}'.")
+        environment = {key: str(value) for key, value in entry.get('environment', {}).items()}
+        sites.append(SiteConfig(entry['name'], os.path.join(base_directory, entry['directory']), environment))
+    logger.info("Loaded %s sites from '%s': %s.", len(sites), path, ', '.join(site.name for site in sites))
+    return sites
+
+
+@contextmanager
+def site_context(site: SiteConfig) -> Iterator[None]:
+    """
+    Runs the enclosed code in the plant's directory with its environment variables set, restoring the
+    working directory and environment afterwards. BASE_DIRECTORY defaults to the plant's directory so
+    that copy_and_rename_files places the exports in the plant's data/ directory.
+    """
+    directory = os.path.abspath(site.directory)
+    environment = {'BASE_DIRECTORY': directory, **site.environment}
+    previous_directory = os.getcwd()
+    previous_environment = {key: os.environ.get(key) for key in environment}
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    os.environ.update(environment)
+    try:
+        yield
+    finally:
+        os.chdir(previous_directory)
+        for key, value in previous_environment.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _run_site(site: SiteConfig, task: Callable[[], None]) -> SiteResult:
+    """
+    Runs the task for one plant. Runs inside a worker process, so any error is returned rather than raised
+    and never affects the other plants.
+    """
+    start = time.perf_counter()
+    try:
+        with site_context(site):
+            task()
+        return SiteResult(site.name, time.perf_counter() - start)
+    except Exception as e:
+        logger.error("Site '%s' failed: %s", site.name, e, exc_info=True)
+        return SiteResult(site.name, time.perf_counter() - start, str(e) or type(e).__name__)
+
+
+def run_sites(sites: List[SiteConfig], task: Callable[[], None],
+              max_workers: Optional[int] = None) -> List[SiteResult]:
+    """
+    Runs a task for every plant concurrently in a process pool, one worker per plant, so the wall time is
+    bounded by the slowest plant. Each worker runs the task in the plant's directory with its environment.
+
+    Args:
+        sites (List[SiteConfig]): The plants to run.
+        task (Callable[[], None]): A picklable callable, e.g. a module-level function or functools.partial.
+        max_workers (Optional[int]): Maximum number of worker processes. Defaults to one per plant.
+
+    Returns:
+        List[SiteResult]: The outcome of each plant, in the order given.
+    """
+    results: Dict[str, SiteResult] = {}
+    start = time.perf_counter()
+    initializer, initargs = worker_logging()
+    with ProcessPoolExecutor(max_workers=max_workers or len(sites) or 1, initializer=initializer,
+                             initargs=initargs) as executor:
+        futures = {executor.submit(_run_site, site, task): site.name for site in sites}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # The worker process itself died, e.g. it ran out of memory
+                results[name] = SiteResult(name, time.perf_counter() - start, str(e))
+            if results[name].ok:
+                logger.info("Site '%s' finished in %.2fs.", name, results[name].seconds)
+            else:
+                logger.error("Site '%s' failed after %.2fs: %s", name, results[name].seconds, results[name].error)
+
+    failed = sum(not result.ok for result in results.values())
+    logger.info("Ran %s of %s sites in %.2fs.", len(results) - failed, len(results), time.perf_counter() - start)
+    return [results[site.name] for site in sites]
@@ -3,6 +3,7 @@ import os
 import time
 import pyautogui
 from dotenv import load_dotenv
+from .file_utils import get_file_wait_timeout, wait_for_file
 
 # Get a logger for this module
 logger = logging.getLogger(__name__)
@@ -16,6 +17,9 @@ def get_tableau(browser_open: bool = False) -> None:
         browser_open (bool): If True, assumes that the browser is already open to Tableau.
     """
     try:
+        # The fixed waits below are for the browser and Tableau pages to render. Unlike the download, which
+        # is awaited with wait_for_file, a page load leaves nothing on disk to poll, and locating it on
+        # screen would need reference screenshots for every resolution, so those waits stay.
         logger.info("Attempting to open Chrome for Tableau data download...")
         # Click the chrome icon on the taskbar. If user is logged in to tableau, window should be minimized
         # before running this program.
@@ -56,16 +60,23 @@ def get_tableau(browser_open: bool = False) -> None:
         # Begin data download process on Tableau dashboard
         logger.info("Initiating Tableau data download.")
         pyautogui.click(165, 145)  # Open download menu
-        time.sleep(30)
+        time.sleep(30)  # The download dialog queries the workbook's data before it can be used
         pyautogui.click(1740, 145)  # Select 'Data' tab
         time.sleep(0.5)
         pyautogui.click(1766, 249)  # Click 'Download'
         time.sleep(2)
+        download_started = time.time()
         pyautogui.press('tab')
         pyautogui.press('right')
         pyautogui.press('tab')
         pyautogui.press('enter')
-        time.sleep(30)
+
+        # Wait for the download to land in the Downloads folder instead of sleeping a fixed time
+        download = os.path.join(os.getenv("DOWNLOADS_PATH", ""), 'Paint Processed.csv')
+        if wait_for_file(download, timeout=get_file_wait_timeout(), newer_than=download_started):
+            logger.info("Download '%s' completed.", download)
+        else:
+            logger.error("Download '%s' did not complete within the timeout.", download)
 
         if not browser_open:
             pyautogui.hotkey('alt', 'f4')  # Close browser if it was opened by this script
@@ -75,4 +86,4 @@ def get_tableau(browser_open: bool = False) -> None:
         logger.info("Tableau data download completed successfully.")
         
     except Exception as e:
-        logger.error(f"An error occurred during Tableau data download: {e}", exc_info=True)
\ No newline at end of file
+        logger.error("An error occurred during Tableau data download: %s", e, exc_info=True)
\ No newline at end of file
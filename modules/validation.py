@@ -0,0 +1,235 @@
+import os
+import glob
+import shutil
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from .file_utils import write_atomic
+
+# Get a logger for this module
+logger = logging.getLogger(__name__)
+
+QUARANTINE_DIRECTORY = os.path.join('data', 'quarantine')
+
+# Column holding the reasons a quarantined row was rejected, and its row number in the export
+REASON_COLUMN = 'quarantine_reason'
+SOURCE_ROW_COLUMN = 'source_row'
+
+
+class SchemaError(ValueError):
+    """
+    An export is missing columns the pipeline cannot run without.
+    """
+
+
+def _column_key(column: object) -> str:
+    return ' '.join(str(column).split()).casefold()
+
+
+def column_matcher(expected: Iterable[str]):
+    """
+    Returns a usecols callable that accepts the expected columns regardless of case and surrounding or
+    repeated whitespace, so that a renamed header such as 'Storage bin ' is still read.
+    """
+    keys = {_column_key(column) for column in expected}
+    return lambda column: _column_key(column) in keys
+
+
+def normalize_columns(df: DataFrame, expected: Iterable[str], required: Iterable[str], source: str) -> DataFrame:
+    """
+    Renames columns that match an expected column up to case and whitespace to the expected name, and adds
+    missing optional columns as empty.
+
+    Args:
+        df (DataFrame): The frame as read from the export.
+        expected (Iterable[str]): All columns the pipeline reads.
+        required (Iterable[str]): The columns without which the export cannot be processed.
+        source (str): The export's path, for messages.
+
+    Returns:
+        DataFrame: The frame with the expected column names.
+
+    Raises:
+        SchemaError: If a required column is missing.
+    """
+    expected = list(expected)
+    canonical = {_column_key(column): column for column in expected}
+    renames = {column: canonical[_column_key(column)] for column in df.columns
+               if _column_key(column) in canonical and column != canonical[_column_key(column)]}
+    if renames:
+        logger.warning("Renamed columns of '%s' to the expected names: %s", source, renames)
+        df = df.rename(columns=renames)
+
+    missing = [column for column in expected if column not in df.columns]
+    missing_required = [column for column in missing if column in set(required)]
+    if missing_required:
+        raise SchemaError(f"'{source}' is missing required columns {missing_required}; found {list(df.columns)}")
+    if missing:
+        logger.warning("'%s' is missing optional columns %s, leaving them empty.", source, missing)
+        for column in missing:
+            df[column] = np.nan
+    return df
+
+
+def _reasons(checks: List[Tuple[str, np.ndarray]], rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Combines boolean failure masks into a mask of bad rows and the '; '-joined reasons of each bad row.
+    """
+    bad = np.zeros(rows, dtype=bool)
+    for _, failed in checks:
+        bad |= failed
+    reasons = np.full(int(bad.sum()), '', dtype=object)
+    for reason, failed in checks:
+        failed = failed[bad]
+        reasons[failed] = reasons[failed] + np.where(reasons[failed] == '', '', '; ') + reason
+    return bad, reasons
+
+
+def _split(df: DataFrame, checks: List[Tuple[str, np.ndarray]], first_row: int,
+           source: str) -> Tuple[DataFrame, DataFrame]:
+    """
+    Splits a frame into the rows that passed every check and the quarantined rows with their reasons and
+    row numbers in the export.
+    """
+    bad, reasons = _reasons(checks, len(df))
+    if not bad.any():
+        return df, df.iloc[:0].assign(**{REASON_COLUMN: pd.Series(dtype=object),
+                                         SOURCE_ROW_COLUMN: pd.Series(dtype='int64')})
+    quarantined = df[bad].copy()
+    quarantined.insert(0, REASON_COLUMN, reasons)
+    quarantined.insert(0, SOURCE_ROW_COLUMN, np.flatnonzero(bad) + first_row)
+    logger.warning("Quarantined %s of %s rows of '%s': %s", len(quarantined), len(df), source,
+                   ', '.join(f'{reason} ({int(failed.sum())})' for reason, failed in checks if failed.any()))
+    return df[~bad], quarantined
+
+
+def parse_dates(values: pd.Series, date_formats: Sequence[str]) -> pd.Series:
+    """
+    Parses dates stored as text, trying each format in turn on the values no earlier format could parse.
+    Values that fail every format are NaT.
+    """
+    dates = pd.to_datetime(values, format=date_formats[0], errors='coerce')
+    for date_format in date_formats[1:]:
+        pending = dates.isna() & values.notna()
+        if not pending.any():
+            break
+        dates = dates.mask(pending, pd.to_datetime(values[pending], format=date_format, errors='coerce'))
+    return dates
+
+
+def validate_sap_inventory(df: DataFrame, source: str,
+                           date_formats: Sequence[str] = ('ISO8601', 'mixed')) -> Tuple[DataFrame, DataFrame]:
+    """
+    Checks the rows of the SAP export in bulk and parses the stock placement timestamp. Rows whose placement
+    date fails every format, without a valid placement time, or with a non-numeric 'Total Stock' are
+    quarantined.
+
+    Args:
+        df (DataFrame): The export with normalized column names, as read by read_excel.
+        source (str): The export's path, for messages.
+        date_formats (Sequence[str]): The formats tried in order for placement dates stored as text.
+
+    Returns:
+        Tuple[DataFrame, DataFrame]: The valid rows with a 'last_stock_placement' column and a numeric
+                                     'Total Stock', and the quarantined rows as read with their reasons.
+    """
+    dates = df['Last stock placement']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = parse_dates(dates, date_formats)
+    times = pd.to_timedelta(df['Time'].astype(str), errors='coerce')
+    stock = pd.to_numeric(df['Total Stock'], errors='coerce').astype('float64')
+
+    missing_date = df['Last stock placement'].isna().to_numpy()
+    missing_time = df['Time'].isna().to_numpy()
+    checks = [
+        ('missing Last stock placement', missing_date),
+        ('unparseable Last stock placement', dates.isna().to_numpy() & ~missing_date),
+        ('missing Time', missing_time),
+        ('unparseable Time', ((times.isna() | (times < pd.Timedelta(0)) | (times >= pd.Timedelta(days=1)))
+                              .to_numpy() & ~missing_time)),
+        ('non-numeric Total Stock', stock.isna().to_numpy() & df['Total Stock'].notna().to_numpy()),
+    ]
+    # Quarantined rows keep the values as read; the parsed columns align to the valid rows by index
+    valid, quarantined = _split(df, checks, first_row=2, source=source)
+    valid = valid.assign(**{'Total Stock': stock, 'last_stock_placement': dates.dt.normalize() + times})
+    return valid, quarantined
+
+
+def validate_paint_processed(chunk: DataFrame, numeric_columns: Iterable[str], first_row: int,
+                             source: str) -> Tuple[DataFrame, DataFrame]:
+    """
+    Checks a chunk of the Tableau Paint Processed export in bulk. Rows without a PART_NO or with a
+    non-numeric quantity are quarantined.
+
+    Args:
+        chunk (DataFrame): Rows of the export with normalized column names, read as text.
+        numeric_columns (Iterable[str]): The quantity columns.
+        first_row (int): The line number of the chunk's first row in the export.
+        source (str): The export's path, for messages.
+
+    Returns:
+        Tuple[DataFrame, DataFrame]: The valid rows with numeric quantities, and the quarantined rows as
+                                     read with their reasons.
+    """
+    checks = [('missing PART_NO', chunk['PART_NO'].isna().to_numpy())]
+    numeric: Dict[str, pd.Series] = {}
+    for column in numeric_columns:
+        numeric[column] = pd.to_numeric(chunk[column], errors='coerce')
+        checks.append((f'non-numeric {column}', numeric[column].isna().to_numpy() & chunk[column].notna().to_numpy()))
+    valid, quarantined = _split(chunk, checks, first_row, source)
+    return valid.assign(**numeric), quarantined
+
+
+def quarantine_path(source: str, digest: str, directory: str = QUARANTINE_DIRECTORY) -> str:
+    """
+    Returns where the quarantined rows of an export are written: <directory>/<export name>-<digest>.csv,
+    named after the export's content hash so that every export keeps its own file.
+    """
+    return os.path.join(directory, f'{os.path.splitext(os.path.basename(source))[0]}-{digest[:16]}.csv')
+
+
+def _prune_quarantine(source: str, directory: str, keep: int) -> None:
+    """
+    Removes all but the most recently written quarantine files of an export.
+    """
+    pattern = os.path.join(directory, f'{os.path.splitext(os.path.basename(source))[0]}-*.csv')
+    for stale_file in sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)[keep:]:
+        try:
+            os.remove(stale_file)
+        except OSError as e:
+            logger.warning("Could not remove stale quarantine file '%s': %s", stale_file, e)
+
+
+def write_quarantine(quarantined: Union[DataFrame, str, None], source: str, digest: str,
+                     directory: str = QUARANTINE_DIRECTORY, keep: int = 5) -> Optional[str]:
+    """
+    Writes the quarantined rows of an export to quarantine_path(). Nothing is written when the export has
+    no quarantined rows. Older files of the same export beyond keep are removed.
+
+    Args:
+        quarantined (Union[DataFrame, str, None]): The quarantined rows with their reasons, the path of a
+                                                   CSV file already holding them, or None if there are none.
+        source (str): The export's path.
+        digest (str): The SHA-256 hash of the export's content.
+        directory (str): The quarantine directory. Default is 'data/quarantine'.
+        keep (int): The number of quarantine files of the export to retain.
+
+    Returns:
+        Optional[str]: The path written, or None if there was nothing to quarantine.
+    """
+    if quarantined is None or (isinstance(quarantined, DataFrame) and quarantined.empty):
+        return None
+    path = quarantine_path(source, digest, directory)
+    try:
+        if isinstance(quarantined, DataFrame):
+            write_atomic(path, lambda temp_path: quarantined.to_csv(temp_path, index=False))
+        else:
+            write_atomic(path, lambda temp_path: shutil.copyfile(quarantined, temp_path))
+        logger.warning("Wrote quarantined rows of '%s' to '%s'.", source, path)
+        _prune_quarantine(source, directory, keep)
+        return path
+    except Exception as e:
+        logger.error("Could not write quarantined rows of '%s' to '%s': %s", source, path, e)
+        return None
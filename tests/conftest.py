@@ -0,0 +1,41 @@
+import os
+import sys
+import shutil
+from datetime import date
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.generate_data import generate  # noqa: E402
+from modules.file_utils import ShiftCalendar  # noqa: E402
+
+# Day shifts, a shift running past midnight, weekend work with closed days, round-the-clock shifts with a
+# holiday, and an overnight shift overlapping the next day's first shift
+CALENDARS = {
+    'two_shifts': ShiftCalendar(((6, 0, 14, 30), (14, 30, 23, 0)), (0, 1, 2, 3, 4), frozenset(), 'two_shifts'),
+    'overnight': ShiftCalendar(((7, 0, 15, 0), (22, 0, 6, 0)), (0, 1, 2, 3, 4), frozenset(), 'overnight'),
+    'closed_days': ShiftCalendar(((6, 0, 18, 0),), (0, 1, 2, 3, 4, 5),
+                                 frozenset({date(2024, 3, 1), date(2024, 3, 4), date(2024, 3, 12)}), 'closed_days'),
+    'three_shifts_holiday': ShiftCalendar(((6, 0, 14, 0), (14, 0, 22, 0), (22, 0, 6, 0)), (0, 1, 2, 3, 4),
+                                          frozenset({date(2024, 3, 6)}), 'three_shifts_holiday'),
+    'overlapping': ShiftCalendar(((6, 0, 14, 0), (20, 0, 8, 0)), (0, 1, 2, 3, 4), frozenset({date(2024, 3, 13)}),
+                                 'overlapping'),
+}
+
+
+@pytest.fixture(params=sorted(CALENDARS))
+def calendar(request) -> ShiftCalendar:
+    return CALENDARS[request.param]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    A working directory with the repo's shift schedule and a small synthetic SAP and Paint Processed export
+    in data/, as main.py and the daemon expect to find them.
+    """
+    shutil.copy(os.path.join(REPO_ROOT, 'shift_schedules.txt'), tmp_path)
+    generate(str(tmp_path / 'data'), rows=500, seed=3)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
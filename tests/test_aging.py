@@ -0,0 +1,140 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.generate_data import generate_inventory
+from conftest import CALENDARS
+from modules.inventory_processing import (calculate_elapsed_hours, calculate_elapsed_hours_batch,
+                                          calculate_threshold_crossing_batch, current_shift_end, round_hours,
+                                          select_report_rows)
+
+AS_OF = datetime(2024, 3, 13, 9, 17, 23)
+
+
+def random_placements(rows: int, seed: int) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(0, 21 * 24 * 3600, rows)
+    placements = pd.Series(pd.Timestamp(AS_OF) - pd.to_timedelta(seconds, unit='s'))
+    # Placements exactly on shift boundaries and at midnight
+    placements.iloc[:4] = [pd.Timestamp('2024-03-11 06:00'), pd.Timestamp('2024-03-11 14:30'),
+                           pd.Timestamp('2024-03-12 00:00'), pd.Timestamp('2024-03-08 22:00')]
+    return placements
+
+
+def scalar_hours(placements: pd.Series, calendar) -> np.ndarray:
+    return np.array([calculate_elapsed_hours(start, AS_OF, calendar.work_shifts, calendar.work_days,
+                                             calendar.closed_dates) for start in placements.dt.to_pydatetime()])
+
+
+def test_batch_matches_scalar(calendar):
+    placements = random_placements(2000, seed=1)
+    batch = calculate_elapsed_hours_batch(placements, AS_OF, calendar.work_shifts, calendar.work_days,
+                                          calendar.closed_dates)
+    np.testing.assert_array_equal(batch, scalar_hours(placements, calendar))
+
+
+def test_display_rounding_matches_scalar(calendar):
+    placements = random_placements(2000, seed=2)
+    batch = calculate_elapsed_hours_batch(placements, AS_OF, calendar.work_shifts, calendar.work_days,
+                                          calendar.closed_dates)
+    expected = [round(hours, 2) for hours in scalar_hours(placements, calendar).tolist()]
+    assert round_hours(batch).tolist() == expected
+
+
+def test_round_hours_rounds_decimal_halves_like_round():
+    # 23.575 is stored just below the half, so round() gives 23.57 where np.round gives 23.58
+    assert round_hours(np.array([23.575, 0.125, 4.0])).tolist() == [round(23.575, 2), round(0.125, 2), 4.0]
+
+
+def test_round_hours_matches_round_on_every_half_and_random_hours():
+    rng = np.random.default_rng(7)
+    hours = np.concatenate([np.arange(200_000) / 200, np.arange(200_000) / 200 + 1e-9, rng.uniform(0, 5000, 200_000),
+                            [np.nan, 0.0, 1e9 + 0.005]])
+    expected = [round(value, 2) for value in hours.tolist()]
+    np.testing.assert_array_equal(round_hours(hours), expected)
+
+
+def scalar_ns(start: pd.Timestamp, end: pd.Timestamp, calendar) -> float:
+    # Timestamps keep calculate_elapsed_hours exact to the nanosecond
+    return calculate_elapsed_hours(start, end, calendar.work_shifts, calendar.work_days, calendar.closed_dates)
+
+
+def placements_around_shifts(rows: int, seed: int) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    placements = pd.Series(pd.Timestamp('2024-02-26') + pd.to_timedelta(rng.integers(0, 21 * 24 * 3600, rows),
+                                                                          unit='s'))
+    # Placements inside an overnight shift carried over from the previous day, on a holiday, before a
+    # weekend and at a shift boundary
+    placements.iloc[:8] = [pd.Timestamp('2024-03-05 23:30'), pd.Timestamp('2024-03-06 02:15:30'),
+                           pd.Timestamp('2024-03-06 10:00'), pd.Timestamp('2024-03-01 21:00'),
+                           pd.Timestamp('2024-03-09 05:59:59'), pd.Timestamp('2024-03-07 06:00'),
+                           pd.Timestamp('2024-03-05 02:00'), pd.Timestamp('2024-03-08 05:45:10.5')]
+    return placements
+
+
+@pytest.mark.parametrize('threshold_hours', [0.25, 4, 13.5, 40])
+def test_crossing_is_the_first_nanosecond_the_threshold_is_reached(calendar, threshold_hours):
+    placements = placements_around_shifts(150, seed=int(threshold_hours * 4))
+    crossings = calculate_threshold_crossing_batch(placements, threshold_hours, calendar.work_shifts,
+                                                   calendar.work_days, calendar.closed_dates)
+    assert not np.isnat(crossings).any()
+    for start, crossing in zip(placements, pd.DatetimeIndex(crossings)):
+        assert scalar_ns(start, crossing, calendar) >= threshold_hours
+        assert scalar_ns(start, crossing - pd.Timedelta(1, 'ns'), calendar) < threshold_hours
+
+
+def test_crossing_of_missing_and_unreachable_rows(calendar):
+    placements = pd.Series([pd.Timestamp('2024-03-05 10:00'), pd.NaT])
+    crossings = calculate_threshold_crossing_batch(placements, 4, calendar.work_shifts, calendar.work_days,
+                                                   calendar.closed_dates)
+    assert not np.isnat(crossings[0]) and np.isnat(crossings[1])
+
+    # Not reached within max_days, or never with no working days
+    assert np.isnat(calculate_threshold_crossing_batch(placements, 1000, calendar.work_shifts, calendar.work_days,
+                                                       calendar.closed_dates, max_days=7)).all()
+    assert np.isnat(calculate_threshold_crossing_batch(placements, 4, calendar.work_shifts, (),
+                                                       calendar.closed_dates)).all()
+
+
+def test_zero_threshold_is_crossed_at_placement(calendar):
+    placements = pd.Series([pd.Timestamp('2024-03-05 10:00'), pd.Timestamp('2024-03-09 12:00')])
+    crossings = calculate_threshold_crossing_batch(placements, 0, calendar.work_shifts, calendar.work_days,
+                                                   calendar.closed_dates)
+    assert (crossings == placements.to_numpy()).all()
+
+
+@pytest.mark.parametrize('as_of, shift_end', [
+    # During the day shift, and during an overnight shift that started the day before
+    ('2024-03-05 10:00', '2024-03-05 14:00'),
+    ('2024-03-05 03:00', '2024-03-05 06:00'),
+    # Outside working hours the next shift's end is used, skipping the weekend and the holiday
+    ('2024-03-09 12:00', '2024-03-11 14:00'),
+    ('2024-03-05 23:30', '2024-03-06 06:00'),
+])
+def test_current_shift_end(as_of, shift_end):
+    assert current_shift_end(datetime.fromisoformat(as_of), CALENDARS['three_shifts_holiday']) == \
+        pd.Timestamp(shift_end)
+
+
+def inventory_locations(categorical: bool) -> pd.DataFrame:
+    df = generate_inventory(3_000, AS_OF, parts=200, seed=9)[['Storage Type', 'Storage Bin']]
+    # Rows without a storage type or bin belong to no report with that filter
+    df.loc[[3, 7], 'Storage Type'] = None
+    df.loc[[5, 7], 'Storage Bin'] = None
+    return df.astype('category') if categorical else df
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_report_rows_match_the_original_filters(categorical):
+    df = inventory_locations(categorical)
+    unload_bins = ["UNLOAD01", "UNLOAD02", "UNLOAD03", "UNLOAD04", "UNLOAD05", "LGUNLOAD"]
+    expected = {
+        'aged_load_inv': df['Storage Type'].isin(['800', '801', '802']),
+        'aged_unload_inv': df['Storage Bin'].isin(unload_bins),
+        'aged_8qi_inv': df['Storage Type'].isin(["8QI"]),
+    }
+    report_rows = select_report_rows(df)
+    assert list(report_rows) == list(expected)
+    for name, mask in expected.items():
+        assert mask.any()
+        np.testing.assert_array_equal(report_rows[name], np.flatnonzero(mask.to_numpy()))
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from modules.aging_state import load_aging_state
+from modules.inventory_processing import REPORT_SPECS, age_inventory, calculate_elapsed_ns_incremental
+
+pytest.importorskip('pyarrow')
+
+START = datetime(2024, 3, 4, 5, 30)
+
+
+def random_inventory(rng: np.random.Generator, rows: int, as_of: datetime) -> pd.DataFrame:
+    seconds = rng.integers(0, 10 * 24 * 3600, rows)
+    return pd.DataFrame({
+        'Material': rng.choice([f'M{part}' for part in range(50)], rows),
+        'Storage Bin': rng.choice(['UNLOAD01', 'UNLOAD02', 'LGUNLOAD', 'A-01'], rows),
+        'last_stock_placement': pd.Timestamp(as_of) - pd.to_timedelta(seconds, unit='s'),
+    })
+
+
+def churn(rng: np.random.Generator, df: pd.DataFrame, as_of: datetime) -> pd.DataFrame:
+    # Some pallets leave, some are moved to another bin and new ones arrive since the previous run
+    df = df[rng.random(len(df)) > 0.1].copy()
+    moved = rng.random(len(df)) < 0.05
+    df.loc[moved, 'Storage Bin'] = 'A-02'
+    arrived = random_inventory(rng, int(rng.integers(0, 40)), as_of)
+    return pd.concat([df, arrived], ignore_index=True)
+
+
+def report_rows(df: pd.DataFrame):
+    return {spec.name: np.arange(len(df)) for spec in REPORT_SPECS}
+
+
+def test_incremental_matches_full_recompute(calendar, tmp_path):
+    rng = np.random.default_rng(sum(map(ord, calendar.digest)))
+    state_path = str(tmp_path / 'aging_state.parquet')
+    as_of = START
+    df = random_inventory(rng, 400, as_of)
+    for _ in range(12):
+        # Runs minutes to days apart, including repeated runs at the same time
+        as_of += timedelta(seconds=int(rng.choice([0, 300, 3600 * 7, 3600 * 30, 3600 * 50])))
+        df = churn(rng, df, as_of)
+        incremental = age_inventory(df, report_rows(df), calendar, as_of, state_path)
+        full = age_inventory(df, report_rows(df), calendar, as_of)
+        np.testing.assert_array_equal(incremental['hours_elapsed'].to_numpy(), full['hours_elapsed'].to_numpy())
+
+
+def test_unmoved_keys_are_reused(calendar, tmp_path):
+    rng = np.random.default_rng(7)
+    state_path = str(tmp_path / 'aging_state.parquet')
+    df = random_inventory(rng, 200, START)
+    age_inventory(df, report_rows(df), calendar, START, state_path)
+
+    as_of = START + timedelta(hours=1)
+    working_ns, reused = calculate_elapsed_ns_incremental(df, as_of, calendar, load_aging_state(calendar, state_path))
+    assert reused > 0
+    full, _ = calculate_elapsed_ns_incremental(df, as_of, calendar, None)
+    np.testing.assert_array_equal(working_ns, full)
@@ -0,0 +1,163 @@
+import json
+import threading
+import http.client
+from datetime import datetime
+import pandas as pd
+import pytest
+from modules import api
+from modules.api import ReportServer, ReportStore, RequestError, handle_request
+
+FIRST_RUN = datetime(2024, 3, 11, 8)
+SECOND_RUN = datetime(2024, 3, 11, 9)
+
+
+def load_report(hours=(5.0, 9.5, 30.0)):
+    return pd.DataFrame({
+        'Material': pd.Categorical(['M1', 'M2', 'M3']),
+        'Storage Type': pd.Categorical(['800', '800', '810']),
+        'Storage Bin': ['B1', 'B2', 'B3'],
+        'hours_elapsed': list(hours),
+    })
+
+
+@pytest.fixture
+def store():
+    store = ReportStore()
+    store.publish({'aged_load_inv': load_report()}, FIRST_RUN)
+    return store
+
+
+def get(store, target, **headers):
+    status, response_headers, body = handle_request(store, 'GET', target, headers)
+    return status, response_headers, json.loads(body) if body and 'json' in response_headers['Content-Type'] else body
+
+
+def test_publish_serializes_the_unfiltered_bodies(store):
+    assert list(store.snapshot.bodies) == [('aged_load_inv', (), (), None, 'json'),
+                                           ('aged_load_inv', (), (), None, 'csv')]
+    status, headers, body = get(store, '/reports/aged_load_inv')
+    assert status == 200 and body['count'] == 3 and body['as_of'] == '2024-03-11T08:00:00'
+    status, headers, body = get(store, '/reports/aged_load_inv.csv')
+    assert headers['Content-Type'].startswith('text/csv')
+    assert body.decode().splitlines()[0] == 'Material,Storage Type,Storage Bin,hours_elapsed'
+
+
+def test_etag_round_trip(store):
+    _, headers, _ = get(store, '/reports/aged_load_inv?min_hours=8')
+    status, not_modified, body = get(store, '/reports/aged_load_inv?min_hours=8', **{'if-none-match': headers['ETag']})
+    assert status == 304 and body == b'' and not_modified['ETag'] == headers['ETag']
+
+    # The same content rebuilt by a later run keeps its ETag; other content or another query does not
+    store.publish({'aged_load_inv': load_report()}, SECOND_RUN)
+    assert get(store, '/reports/aged_load_inv?min_hours=8', **{'if-none-match': headers['ETag']})[0] == 304
+    assert get(store, '/reports/aged_load_inv?min_hours=9', **{'if-none-match': headers['ETag']})[0] == 200
+    store.publish({'aged_load_inv': load_report((5.0, 9.5, 31.0))}, SECOND_RUN)
+    assert get(store, '/reports/aged_load_inv?min_hours=8', **{'if-none-match': headers['ETag']})[0] == 200
+
+
+@pytest.mark.parametrize('query, materials', [
+    ('storage_type=800', ['M1', 'M2']),
+    ('bin=B3,B1', ['M1', 'M3']),
+    ('min_hours=9.5', ['M2', 'M3']),
+    ('storage_type=800&bin=B2&bin=B3', ['M2']),
+    ('storage_type=900', []),
+])
+def test_filters(store, query, materials):
+    _, _, body = get(store, f'/reports/aged_load_inv?{query}')
+    assert [row['Material'] for row in body['rows']] == materials
+    assert body['count'] == len(materials)
+
+
+@pytest.mark.parametrize('method, target, status', [
+    ('GET', '/reports/aged_unload_inv', 404),
+    ('GET', '/nothing', 404),
+    ('GET', '/reports/aged_load_inv?colour=red', 400),
+    ('GET', '/reports/aged_load_inv?min_hours=many', 400),
+    ('GET', '/reports/aged_load_inv?format=xml', 400),
+    ('POST', '/reports/aged_load_inv', 405),
+])
+def test_invalid_requests(store, method, target, status):
+    with pytest.raises(RequestError) as error:
+        handle_request(store, method, target, {})
+    assert error.value.status == status
+
+
+def test_nothing_is_served_before_the_first_run():
+    store = ReportStore()
+    assert get(store, '/health')[2] == {'status': 'waiting for the first run', 'as_of': None}
+    with pytest.raises(RequestError) as error:
+        handle_request(store, 'GET', '/reports', {})
+    assert error.value.status == 503
+
+
+def test_body_cache_evicts_the_least_recently_used_query(store, monkeypatch):
+    monkeypatch.setattr(api, '_MAX_CACHED_BODIES', 4)
+    get(store, '/reports/aged_load_inv?min_hours=1')
+    get(store, '/reports/aged_load_inv')
+    get(store, '/reports/aged_load_inv?min_hours=2')
+    get(store, '/reports/aged_load_inv?min_hours=3')
+    # The unfiltered JSON body was used again, so the unfiltered CSV body is the one evicted
+    assert [(key[3], key[4]) for key in store.snapshot.bodies] == [(1.0, 'json'), (None, 'json'), (2.0, 'json'),
+                                                                  (3.0, 'json')]
+    cached = store.snapshot.bodies[('aged_load_inv', (), (), 2.0, 'json')]
+    assert get(store, '/reports/aged_load_inv?min_hours=2')[2]['count'] == 3
+    assert store.snapshot.bodies[('aged_load_inv', (), (), 2.0, 'json')] is cached
+
+
+@pytest.fixture
+def server(store):
+    server = ReportServer(store, port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def request(server, target, connection=None, **headers):
+    connection = connection or http.client.HTTPConnection(server.host, server.port, timeout=10)
+    connection.request('GET', target, headers=headers)
+    response = connection.getresponse()
+    return response.status, dict(response.getheaders()), response.read()
+
+
+def test_server_answers_over_keep_alive_connections(server):
+    connection = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    status, headers, body = request(server, '/reports/aged_load_inv?storage_type=810', connection)
+    assert status == 200 and json.loads(body)['count'] == 1
+    status, _, body = request(server, '/reports/aged_load_inv?storage_type=810', connection,
+                              **{'If-None-Match': headers['ETag']})
+    assert status == 304 and body == b''
+    status, _, body = request(server, '/reports/aged_load_inv?bin=', connection)
+    assert status == 200 and json.loads(body)['count'] == 3
+    status, _, body = request(server, '/reports/missing', connection)
+    assert status == 404 and 'missing' in json.loads(body)['error']
+    connection.close()
+
+
+def test_publishing_during_a_request_never_mixes_runs(server, store, monkeypatch):
+    serialize = api.serialize
+    serializing, release = threading.Event(), threading.Event()
+
+    # Holds the server in the middle of serializing a filtered body of the first run
+    def slow_serialize(report, name, as_of, fmt):
+        if threading.current_thread().name == 'report-api':
+            serializing.set()
+            release.wait(10)
+        return serialize(report, name, as_of, fmt)
+
+    monkeypatch.setattr(api, 'serialize', slow_serialize)
+    responses = []
+    client = threading.Thread(target=lambda: responses.append(request(server, '/reports/aged_load_inv?min_hours=1')))
+    client.start()
+    assert serializing.wait(10)
+    store.publish({'aged_load_inv': load_report((1.0, 2.0, 3.0)).iloc[:1]}, SECOND_RUN)
+    release.set()
+    client.join(10)
+
+    status, headers, body = responses[0]
+    body = json.loads(body)
+    assert headers['X-Report-As-Of'] == body['as_of'] == '2024-03-11T08:00:00'
+    assert body['count'] == 3
+
+    status, headers, body = request(server, '/reports/aged_load_inv?min_hours=1')
+    assert headers['X-Report-As-Of'] == json.loads(body)['as_of'] == '2024-03-11T09:00:00'
+    assert json.loads(body)['count'] == 1
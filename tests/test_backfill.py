@@ -0,0 +1,60 @@
+import os
+from datetime import date, datetime
+import pytest
+from conftest import CALENDARS, generate
+from modules.backfill import backfill, find_snapshots, parse_snapshot_time
+from modules.history import load_history
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('2024-03-01T0600', datetime(2024, 3, 1, 6)),
+    ('2024-03-01T143015', datetime(2024, 3, 1, 14, 30, 15)),
+    ('2024-03-01_1430', datetime(2024, 3, 1, 14, 30)),
+    ('2024-03-01 1430', datetime(2024, 3, 1, 14, 30)),
+    ('20240301_0600', datetime(2024, 3, 1, 6)),
+    # strptime would read these with single digit fields
+    ('2024-3-1T0600', None),
+    ('2024-03-01T630', None),
+    ('2024-03-01T06:00', None),
+    ('2024-03-01', None),
+    ('archive', None),
+])
+def test_parse_snapshot_time(name, expected):
+    assert parse_snapshot_time(name) == expected
+
+
+def test_find_snapshots_filters_and_sorts(tmp_path):
+    for name in ('2024-03-05_0600', '2024-03-01T1400', '2024-03-01T0600', '2024-03-09T0600', 'notes',
+                 '2024-03-02T0600'):
+        (tmp_path / name).mkdir()
+        if name != '2024-03-02T0600':
+            (tmp_path / name / 'paint_inventory.xlsx').write_bytes(b'')
+    (tmp_path / '2024-03-03T0600').write_text('a file, not a snapshot')
+
+    snapshots = find_snapshots(str(tmp_path))
+    assert [snapshot.name for snapshot in snapshots] == ['2024-03-01T0600', '2024-03-01T1400', '2024-03-05_0600',
+                                                         '2024-03-09T0600']
+    assert snapshots[0].paint_path == os.path.join(str(tmp_path), '2024-03-01T0600', 'paint_processed.csv')
+
+    selected = find_snapshots(str(tmp_path), since=date(2024, 3, 1), until=date(2024, 3, 5))
+    assert [snapshot.as_of for snapshot in selected] == [datetime(2024, 3, 1, 6), datetime(2024, 3, 1, 14),
+                                                         datetime(2024, 3, 5, 6)]
+
+
+def test_backfill_ages_each_snapshot_at_its_own_time(tmp_path):
+    exports = tmp_path / 'exports'
+    times = [datetime(2024, 3, 4, 6), datetime(2024, 3, 4, 14), datetime(2024, 3, 5, 6)]
+    for as_of in times:
+        generate(str(exports / as_of.strftime('%Y-%m-%dT%H%M')), rows=300, as_of=as_of, seed=5)
+    (exports / 'broken').mkdir()
+
+    output = tmp_path / 'backfill'
+    results = backfill(find_snapshots(str(exports)), CALENDARS['two_shifts'], str(output), max_workers=2)
+    assert [result.name for result in results] == ['2024-03-04T0600', '2024-03-04T1400', '2024-03-05T0600']
+    assert all(result.ok and result.rows > 0 for result in results)
+
+    history = load_history(root=str(output / 'history'))
+    assert sorted(history['run_time'].unique()) == times
+    assert history.groupby('run_time').size().tolist() == [result.rows for result in results]
+    # The runs of each day are compacted once all workers are done
+    assert os.listdir(output / 'history' / 'run_date=2024-03-04') == ['compacted.parquet']
@@ -0,0 +1,57 @@
+import os
+from modules import daemon
+from modules.daemon import InventoryDaemon
+from modules.delta import load_previous_reports
+
+
+def test_failed_publish_is_retried_on_the_next_cycle(workdir, monkeypatch):
+    share = workdir / 'share'
+    share.mkdir()
+    calls = []
+
+    def move_to_sharepoint(source_dir, dest_dir, files_to_move):
+        calls.append(list(files_to_move))
+        if len(calls) == 1:
+            raise OSError('SharePoint is unreachable')
+
+    monkeypatch.setattr(daemon, 'move_to_sharepoint', move_to_sharepoint)
+    watcher = InventoryDaemon(output_dir='data', refresh_interval=3600, dest_dir=str(share), record_history=False)
+
+    changed = watcher.run_once()
+    assert changed
+    assert calls == [['aged_8qi_inv.xlsx', 'aged_delta.xlsx', 'aged_load_inv.xlsx', 'aged_unload_inv.xlsx']]
+
+    # Nothing changed, but the files that failed to publish are published now
+    assert watcher.run_once() == []
+    assert calls[1] == calls[0]
+
+    # Once published, an unchanged cycle publishes nothing
+    watcher.run_once()
+    assert len(calls) == 2
+    assert all(os.path.exists(os.path.join('data', name)) for name in calls[0])
+
+
+def test_watch_cycles_write_the_delta_and_advance_the_baseline_once_published(workdir, monkeypatch):
+    published = []
+    failing = [True]
+
+    def move_to_sharepoint(source_dir, dest_dir, files_to_move):
+        if failing[0]:
+            raise OSError('SharePoint is unreachable')
+        published.extend(files_to_move)
+
+    monkeypatch.setattr(daemon, 'move_to_sharepoint', move_to_sharepoint)
+    watcher = InventoryDaemon(output_dir='data', refresh_interval=3600, dest_dir=str(workdir / 'share'),
+                              record_history=False)
+    baseline = os.path.join('data', 'cache', 'previous_reports.parquet')
+
+    watcher.run_once()
+    assert os.path.exists(os.path.join('data', 'aged_delta.xlsx'))
+    # Readers have not seen this cycle yet, so it is not the baseline
+    assert load_previous_reports(baseline) is None
+
+    failing[0] = False
+    watcher.run_once()
+    assert 'aged_delta.xlsx' in published
+    previous = load_previous_reports(baseline)
+    assert set(previous['report']) == {'aged_load_inv', 'aged_unload_inv', 'aged_8qi_inv'}
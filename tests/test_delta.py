@@ -0,0 +1,79 @@
+from datetime import datetime
+import pandas as pd
+from modules.delta import compute_deltas, delta_sheets, load_previous_reports, save_previous_reports
+
+
+def report(*rows):
+    return pd.DataFrame({
+        'Material': pd.Categorical([row[0] for row in rows]),
+        'Storage Bin': [row[1] for row in rows],
+        'Storage Type': 'PNT',
+        'Total Stock': 1.0,
+        'last_stock_placement': pd.to_datetime([row[2] for row in rows]),
+        'hours_elapsed': [row[3] for row in rows],
+    })
+
+
+FIRST_RUN = datetime(2024, 3, 11, 8)
+SECOND_RUN = datetime(2024, 3, 11, 9)
+
+
+def test_second_snapshot_lists_newly_aged_and_cleared_rows(tmp_path):
+    path = str(tmp_path / 'previous_reports.parquet')
+    save_previous_reports({'aged_load_inv': report(('M1', 'B1', '2024-03-08 06:00', 20.0),
+                                                   ('M2', 'B2', '2024-03-08 07:00', 19.0))}, FIRST_RUN, path)
+
+    # M2 was moved out, M3 aged, and M1 is still aged with more hours
+    current = report(('M1', 'B1', '2024-03-08 06:00', 21.0), ('M3', 'B3', '2024-03-08 12:00', 4.5))
+    deltas = compute_deltas({'aged_load_inv': current}, load_previous_reports(path))
+    delta = deltas['aged_load_inv']
+    assert delta.newly_aged['Material'].tolist() == ['M3']
+    assert delta.still_aged['Material'].tolist() == ['M1']
+    assert delta.cleared['Material'].tolist() == ['M2']
+    assert delta.cleared['run_time'].tolist() == [pd.Timestamp(FIRST_RUN)]
+    assert 'report' not in delta.cleared.columns
+
+    sheets = delta_sheets(deltas)
+    assert list(sheets) == ['aged_load_inv newly aged', 'aged_load_inv cleared']
+    assert 'last_seen' in sheets['aged_load_inv cleared'].columns
+
+
+def test_a_row_placed_again_in_the_same_bin_is_newly_aged(tmp_path):
+    path = str(tmp_path / 'previous_reports.parquet')
+    save_previous_reports({'aged_load_inv': report(('M1', 'B1', '2024-03-08 06:00', 20.0))}, FIRST_RUN, path)
+    current = report(('M1', 'B1', '2024-03-11 06:00', 4.0))
+    delta = compute_deltas({'aged_load_inv': current}, load_previous_reports(path))['aged_load_inv']
+    assert len(delta.newly_aged) == 1 and len(delta.cleared) == 1
+
+
+def test_report_missing_from_the_previous_snapshot_is_all_new(tmp_path):
+    path = str(tmp_path / 'previous_reports.parquet')
+    save_previous_reports({'aged_load_inv': report(('M1', 'B1', '2024-03-08 06:00', 20.0))}, FIRST_RUN, path)
+    unload = report(('M1', 'B1', '2024-03-08 06:00', 20.0), ('M9', 'B9', '2024-03-07 06:00', 30.0))
+    deltas = compute_deltas({'aged_load_inv': report(('M1', 'B1', '2024-03-08 06:00', 21.0)),
+                             'aged_unload_inv': unload}, load_previous_reports(path))
+    assert deltas['aged_load_inv'].newly_aged.empty
+    assert deltas['aged_unload_inv'].newly_aged['Material'].tolist() == ['M1', 'M9']
+    assert deltas['aged_unload_inv'].cleared.empty
+
+
+def test_missing_or_corrupt_baseline_treats_every_row_as_new(tmp_path):
+    path = tmp_path / 'previous_reports.parquet'
+    assert load_previous_reports(str(path)) is None
+    path.write_bytes(b'not parquet')
+    assert load_previous_reports(str(path)) is None
+
+    current = report(('M1', 'B1', '2024-03-08 06:00', 20.0))
+    delta = compute_deltas({'aged_load_inv': current}, None)['aged_load_inv']
+    assert delta.newly_aged['Material'].tolist() == ['M1']
+    assert delta.still_aged.empty and delta.cleared.empty
+
+
+def test_saving_replaces_the_baseline(tmp_path):
+    path = str(tmp_path / 'previous_reports.parquet')
+    save_previous_reports({'aged_load_inv': report(('M1', 'B1', '2024-03-08 06:00', 20.0))}, FIRST_RUN, path)
+    save_previous_reports({'aged_load_inv': report(('M2', 'B2', '2024-03-08 06:00', 20.0))}, SECOND_RUN, path)
+    previous = load_previous_reports(path)
+    assert previous['Material'].tolist() == ['M2']
+    assert previous['run_time'].tolist() == [pd.Timestamp(SECOND_RUN)]
+    assert [name for name in tmp_path.iterdir() if name.suffix == '.tmp'] == []
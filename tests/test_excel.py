@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from modules.file_utils import write_excel_sheets
+from modules.inventory_processing import REPORT_SPECS
+
+
+def load_report() -> pd.DataFrame:
+    columns = REPORT_SPECS[0].columns
+    return pd.DataFrame({
+        'Material': ['M-1', 'M-22', None],
+        'Material Description': ['Bracket', 'Rear door panel, left', 'Hood'],
+        'Storage Type': pd.Categorical(['800', '801', '802']),
+        'Storage Bin': ['B1', 'B2', 'B3'],
+        'Total Stock': np.array([1, 12.5, 3], dtype='float32'),
+        'LOADED': [np.nan, 2.0, 1.0],
+        'In Station': [np.nan, 10.5, 2.0],
+        'Storage Unit': ['U1', 'U2', ''],
+        'last_stock_placement': pd.to_datetime(['2024-03-08 06:00:00', '2024-03-08 07:30:15', '2024-03-11 22:00:00']),
+        'Last addtn to stock': pd.to_datetime(['2024-03-01', None, '2024-03-04']),
+        'hours_elapsed': [21.5, 20.25, 4.0],
+    })[list(columns)]
+
+
+def read_sheet(path):
+    sheet = load_workbook(path)['Sheet1']
+    cells = [[(cell.value, cell.number_format, cell.border.left.style) for cell in row] for row in sheet.iter_rows()]
+    header = [(cell.font.bold, cell.fill.fgColor.rgb[-6:]) for cell in sheet[1]]
+    widths = [sheet.column_dimensions[letter].width for letter in 'ABCDEFGHIJK']
+    return cells, header, widths
+
+
+@pytest.fixture
+def workbooks(tmp_path):
+    paths = []
+    for streaming in (True, False):
+        path = str(tmp_path / f'aged_load_inv_{streaming}.xlsx')
+        write_excel_sheets({'Sheet1': load_report()}, path, streaming=streaming)
+        paths.append(path)
+    return [read_sheet(path) for path in paths]
+
+
+def test_streaming_and_openpyxl_workbooks_match(workbooks):
+    (streamed, streamed_header, streamed_widths), (formatted, formatted_header, formatted_widths) = workbooks
+    assert [[value for value, _, _ in row] for row in streamed] == [[value for value, _, _ in row] for row in formatted]
+    assert streamed_header == formatted_header == [(True, 'D3D3D3')] * 11
+    # xlsxwriter stores the width with Excel's cell padding added, openpyxl stores it as given
+    assert streamed_widths == pytest.approx(formatted_widths, abs=0.72)
+    # Every cell has a border, blanks included
+    for rows in (streamed, formatted):
+        assert {border for row in rows for _, _, border in row} == {'thin'}
+
+
+def test_date_format_follows_the_column_name(workbooks):
+    for rows, _, widths in workbooks:
+        header = [value for value, _, _ in rows[0]]
+        date_column = header.index('Last addtn to stock')
+        # The original formatting assumed the column was 'H', which is 'Storage Unit' in the load report
+        assert date_column == 9 and header[7] == 'Storage Unit'
+        assert [row[date_column][1] for row in rows[1:] if row[date_column][0] is not None] == ['YYYY-MM-DD'] * 2
+        assert all(row[7][1] == 'General' for row in rows[1:])
+        assert [int(width) for width in widths[:2]] == [len('Material') + 2, len('Rear door panel, left') + 2]
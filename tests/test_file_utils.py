@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from datetime import date
+from modules import file_utils
+from modules.file_utils import copy_and_rename_files, load_shift_calendar, wait_for_file
+
+
+def write_slowly(path: str, chunks: int, interval: float, delay: float = 0.0) -> threading.Thread:
+    # Stands in for a browser or SAP writing an export in pieces
+    def write() -> None:
+        time.sleep(delay)
+        with open(path, 'wb') as file:
+            for _ in range(chunks):
+                file.write(b'x' * 1024)
+                file.flush()
+                time.sleep(interval)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+
+def test_waits_until_the_writer_has_finished(tmp_path):
+    path = str(tmp_path / 'Paint Processed.csv')
+    writer = write_slowly(path, chunks=8, interval=0.1, delay=0.2)
+    try:
+        assert wait_for_file(path, timeout=10, settle_time=0.3, poll_interval=0.02)
+        assert os.path.getsize(path) == 8 * 1024
+    finally:
+        writer.join()
+
+
+def test_returns_soon_after_the_file_settles(tmp_path):
+    path = str(tmp_path / 'paint_inventory.XLSX')
+    writer = write_slowly(path, chunks=2, interval=0.05)
+    start = time.monotonic()
+    try:
+        assert wait_for_file(path, timeout=10, settle_time=0.2, poll_interval=0.02)
+    finally:
+        writer.join()
+    assert time.monotonic() - start < 2
+
+
+def test_times_out_when_the_file_never_arrives(tmp_path):
+    start = time.monotonic()
+    assert not wait_for_file(str(tmp_path / 'missing.csv'), timeout=0.3, poll_interval=0.05)
+    assert 0.3 <= time.monotonic() - start < 2
+
+
+def test_ignores_a_stale_copy_until_it_is_replaced(tmp_path):
+    path = str(tmp_path / 'Paint Processed.csv')
+    with open(path, 'wb') as file:
+        file.write(b'old export')
+    os.utime(path, (time.time() - 3600, time.time() - 3600))
+    started = time.time()
+
+    assert not wait_for_file(path, timeout=0.3, settle_time=0.1, poll_interval=0.05, newer_than=started)
+    writer = write_slowly(path, chunks=3, interval=0.05, delay=0.1)
+    try:
+        assert wait_for_file(path, timeout=10, settle_time=0.2, poll_interval=0.02, newer_than=started)
+    finally:
+        writer.join()
+    assert os.path.getsize(path) == 3 * 1024
+
+
+def test_copy_waits_past_exports_left_by_an_earlier_run(tmp_path, monkeypatch):
+    downloads, sap = tmp_path / 'Downloads', tmp_path / 'SAP'
+    downloads.mkdir()
+    sap.mkdir()
+    (tmp_path / 'data').mkdir()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DOWNLOADS_PATH', str(downloads))
+    monkeypatch.setenv('SAP_GUI_PATH', str(sap))
+    monkeypatch.setenv('BASE_DIRECTORY', str(tmp_path))
+    monkeypatch.setenv('FILE_WAIT_TIMEOUT', '2')
+
+    # Yesterday's Tableau download is still there and the SAP export is rewritten by this run
+    (downloads / 'Paint Processed.csv').write_text('stale')
+    os.utime(downloads / 'Paint Processed.csv', (time.time() - 86400, time.time() - 86400))
+    started = time.time()
+    (sap / 'paint_inventory.XLSX').write_text('fresh')
+    os.utime(sap / 'paint_inventory.XLSX', (started + 1, started + 1))
+
+    copy_and_rename_files(newer_than=started)
+    assert not (tmp_path / 'data' / 'paint_processed.csv').exists()
+    assert (downloads / 'Paint Processed.csv').exists()
+    assert (tmp_path / 'data' / 'paint_inventory.xlsx').read_text() == 'fresh'
+
+
+def test_shift_calendar_parses_windows_holidays_and_shutdowns(tmp_path):
+    path = tmp_path / 'shift_schedules.txt'
+    path.write_text('shift_windows=05:00-11:00, 20:30-00:30\n'
+                    'include_saturday=True\n'
+                    'holidays=2024-12-25, 2025-01-01\n'
+                    'shutdown_days=2024-07-01..2024-07-03\n')
+    calendar = load_shift_calendar(str(path))
+    assert calendar.work_shifts == ((5, 0, 11, 0), (20, 30, 0, 30))
+    assert calendar.work_days == (0, 1, 2, 3, 4, 5)
+    assert calendar.closed_dates == {date(2024, 12, 25), date(2025, 1, 1), date(2024, 7, 1), date(2024, 7, 2),
+                                     date(2024, 7, 3)}
+
+
+def test_shift_calendar_is_rebuilt_only_when_the_content_changes(tmp_path, monkeypatch):
+    path = tmp_path / 'shift_schedules.txt'
+    path.write_text('first_shift=True\nfirst_hours=8\nholidays=2024-12-25\n')
+    parsed = []
+    parse = file_utils._parse_shift_parameters
+    monkeypatch.setattr(file_utils, '_parse_shift_parameters', lambda *args: parsed.append(args) or parse(*args))
+
+    calendar = load_shift_calendar(str(path))
+    assert load_shift_calendar(str(path)) is calendar
+    # Touching the file rehashes it, but the same content is not parsed again
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    assert load_shift_calendar(str(path)) is calendar
+    assert len(parsed) == 1
+
+    path.write_text('first_shift=True\nfirst_hours=8\nholidays=2024-12-26\n')
+    os.utime(path, (time.time() + 20, time.time() + 20))
+    changed = load_shift_calendar(str(path))
+    assert len(parsed) == 2
+    assert changed.closed_dates == {date(2024, 12, 26)} and changed.digest != calendar.digest
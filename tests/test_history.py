@@ -0,0 +1,88 @@
+import os
+from datetime import date, datetime
+import pandas as pd
+import pytest
+from modules.history import aging_trend, compact_partitions, load_history, record_snapshot, top_offenders
+
+RUNS = [datetime(2024, 3, 4, 8), datetime(2024, 3, 4, 16), datetime(2024, 3, 5, 8), datetime(2024, 3, 6, 8)]
+
+
+def report(bins, hours, stock=1.0):
+    return pd.DataFrame({
+        'Material': [f'M-{name}' for name in bins],
+        'Storage Type': '800',
+        'Storage Bin': list(bins),
+        'Storage Unit': [f'U-{name}' for name in bins],
+        'Total Stock': stock,
+        'last_stock_placement': pd.Timestamp('2024-03-01 06:00'),
+        'hours_elapsed': list(hours),
+    })
+
+
+@pytest.fixture
+def history(tmp_path):
+    root = str(tmp_path / 'history')
+    # Bin B1 is aged in every run, B2 in the first two and B3 only in the last
+    record_snapshot({'aged_load_inv': report(['B1', 'B2'], [10, 5]), 'aged_unload_inv': report(['U1'], [4])},
+                    RUNS[0], root)
+    record_snapshot({'aged_load_inv': report(['B1', 'B2'], [18, 13])}, RUNS[1], root)
+    record_snapshot({'aged_load_inv': report(['B1'], [26])}, RUNS[2], root)
+    record_snapshot({'aged_load_inv': report(['B1', 'B3'], [34, 4], stock=3.0)}, RUNS[3], root)
+    return root
+
+
+def partition_files(root):
+    return {name: sorted(os.listdir(os.path.join(root, name))) for name in sorted(os.listdir(root))}
+
+
+def test_runs_are_partitioned_by_date_and_earlier_days_compacted(history):
+    files = partition_files(history)
+    assert list(files) == ['run_date=2024-03-04', 'run_date=2024-03-05', 'run_date=2024-03-06']
+    assert files['run_date=2024-03-04'] == ['compacted.parquet']
+    # A day with one run is left as it is, and the current day keeps accepting appends
+    assert files['run_date=2024-03-05'] == ['run-080000000000.parquet']
+    record_snapshot({'aged_load_inv': report(['B1'], [40])}, datetime(2024, 3, 6, 16), history)
+    assert len(partition_files(history)['run_date=2024-03-06']) == 2
+
+    assert compact_partitions(history, before=date(2024, 3, 7)) == 1
+    assert partition_files(history)['run_date=2024-03-06'] == ['compacted.parquet']
+    assert load_history(root=history)['run_time'].nunique() == 5
+
+
+def test_compaction_keeps_every_row(history):
+    rows = load_history(root=history).sort_values(['run_time', 'report', 'Storage Bin'], ignore_index=True)
+    assert rows['run_time'].tolist() == [RUNS[0]] * 3 + [RUNS[1]] * 2 + [RUNS[2]] + [RUNS[3]] * 2
+    assert rows['report'].tolist()[:3] == ['aged_load_inv', 'aged_load_inv', 'aged_unload_inv']
+    assert rows['In Station'].isna().all()
+
+
+def test_queries_prune_dates_and_reports(history):
+    rows = load_history('2024-03-05', date(2024, 3, 6), reports=['aged_load_inv'],
+                        columns=['run_time', 'Storage Bin'], root=history)
+    assert list(rows.columns) == ['run_time', 'Storage Bin']
+    assert sorted(rows['Storage Bin']) == ['B1', 'B1', 'B3']
+    assert load_history(reports=['aged_unload_inv'], root=history)['Storage Bin'].tolist() == ['U1']
+    assert load_history(root=os.path.join(history, 'missing')).empty
+
+
+def test_aging_trend_averages_the_runs_of_each_period(history):
+    trend = aging_trend(report='aged_load_inv', root=history)
+    assert trend['runs'].tolist() == [2, 1, 1]
+    assert trend['aged_rows'].tolist() == [2, 1, 2]
+    assert trend['aged_stock'].tolist() == [2, 1, 6]
+    assert trend['max_hours'].tolist() == [18, 26, 34]
+
+    weekly = aging_trend(report='aged_load_inv', freq='W', root=history)
+    assert weekly['runs'].tolist() == [4]
+    assert weekly['aged_rows'].tolist() == [7 / 4]
+
+
+def test_top_offenders_rank_bins_by_share_of_runs(history):
+    offenders = top_offenders(report='aged_load_inv', root=history)
+    assert offenders.index.tolist() == ['B1', 'B2', 'B3']
+    assert offenders['runs_aged'].tolist() == [4, 2, 1]
+    assert offenders['share_of_runs'].tolist() == [1, 0.5, 0.25]
+    assert offenders.loc['B1', 'first_seen'] == RUNS[0] and offenders.loc['B1', 'last_seen'] == RUNS[3]
+    assert offenders.loc['B2', 'max_hours'] == 13
+
+    assert top_offenders(by='Material', start='2024-03-06', limit=1, root=history).index.tolist() == ['M-B1']
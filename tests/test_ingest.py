@@ -0,0 +1,93 @@
+import os
+import tracemalloc
+from datetime import datetime
+import pandas as pd
+import pytest
+from benchmarks.generate_data import (generate_inventory, generate_paint_processed, write_inventory,
+                                      write_paint_processed)
+from modules import ingest
+from modules.ingest import INVENTORY_SCHEMA, _aggregate_paint_processed, load_paint_loaded, load_sap_inventory
+
+
+@pytest.fixture(scope='module')
+def paint_processed(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('exports') / 'paint_processed.csv')
+    write_paint_processed(generate_paint_processed(50_000, parts=500), path)
+    return path
+
+
+def expected_loaded(path: str) -> pd.Series:
+    df = pd.read_csv(path, encoding='utf-16', sep='\t', dtype={'PART_NO': str})
+    df = df[(df['GOOD'] == 0) & (df['NON-CONFIRMED'] == 0) & (df['SCRAP'] == 0)]
+    return df.groupby('PART_NO')['LOADED'].sum().astype('float64')
+
+
+def test_chunked_aggregate_matches_a_single_pass(paint_processed):
+    # Small chunks fold the partial sums together many times over
+    loaded, quarantined = _aggregate_paint_processed(paint_processed, chunksize=1_000)
+    expected = expected_loaded(paint_processed)
+    assert quarantined is None
+    assert loaded['LOADED'].dtype == 'float32'
+    pd.testing.assert_series_equal(loaded['LOADED'].astype('float64').sort_index(), expected, check_names=False)
+
+
+def test_chunked_aggregate_memory_does_not_grow_with_the_file(tmp_path):
+    def peak(path: str) -> int:
+        tracemalloc.start()
+        try:
+            _aggregate_paint_processed(path, chunksize=2_000)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    peaks = []
+    for rows in (30_000, 60_000):
+        path = str(tmp_path / f'paint_processed_{rows}.csv')
+        write_paint_processed(generate_paint_processed(rows, parts=500), path)
+        peaks.append(peak(path))
+    # Twice the rows, but the same chunk size and number of parts. Reading the whole file would double the peak.
+    assert peaks[1] < peaks[0] * 1.5
+
+
+def test_inventory_frame_uses_the_compact_schema(tmp_path):
+    path = str(tmp_path / 'paint_inventory.xlsx')
+    write_inventory(generate_inventory(2_000, datetime(2024, 3, 13, 9, 0), parts=200), path)
+    df = load_sap_inventory(path, cache_dir=None, quarantine_dir=str(tmp_path / 'quarantine'))
+
+    for column, dtype in INVENTORY_SCHEMA.items():
+        assert str(df[column].dtype) == dtype
+    assert df['Total Stock'].dtype == 'float32'
+    assert 'Last stock placement' not in df.columns and 'Time' not in df.columns
+    assert df['last_stock_placement'].notna().all()
+    objects = df.astype({column: object for column in INVENTORY_SCHEMA})
+    assert df.memory_usage(deep=True).sum() < objects.memory_usage(deep=True).sum() / 2
+
+
+def test_paint_processed_cache_is_keyed_by_content(tmp_path, monkeypatch):
+    cache_dir, quarantine_dir = str(tmp_path / 'cache'), str(tmp_path / 'quarantine')
+    path = str(tmp_path / 'paint_processed.csv')
+    export = generate_paint_processed(5_000, parts=100)
+    export['GOOD'] = export['GOOD'].astype(str)
+    export.loc[10, 'GOOD'] = 'x'
+    write_paint_processed(export, path)
+
+    reads = []
+    aggregate = ingest._aggregate_paint_processed
+    monkeypatch.setattr(ingest, '_aggregate_paint_processed', lambda path: reads.append(path) or aggregate(path))
+    loaded = load_paint_loaded(path, cache_dir=cache_dir, quarantine_dir=quarantine_dir)
+    pd.testing.assert_frame_equal(load_paint_loaded(path, cache_dir=cache_dir, quarantine_dir=quarantine_dir), loaded)
+    assert len(reads) == 1
+    # The quarantined row is cached with the aggregate and written again when it is loaded from the cache
+    for name in os.listdir(quarantine_dir):
+        os.remove(os.path.join(quarantine_dir, name))
+    load_paint_loaded(path, cache_dir=cache_dir, quarantine_dir=quarantine_dir)
+    assert len(reads) == 1 and len(os.listdir(quarantine_dir)) == 1
+
+    # A new export is read and cached again, and only the most recent exports are kept
+    for seed in (1, 2):
+        write_paint_processed(generate_paint_processed(5_000, parts=100, seed=seed), path)
+        changed = load_paint_loaded(path, cache_dir=cache_dir, keep=2, quarantine_dir=quarantine_dir)
+    assert len(reads) == 3
+    assert not changed.equals(loaded)
+    cached = [name for name in os.listdir(cache_dir) if name.endswith('.parquet')]
+    assert len(cached) == 2 and all(name.startswith('paint_processed-') for name in cached)
@@ -0,0 +1,42 @@
+import os
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from modules.log_config import LOG_FILE, THROTTLED, configure_logging, stop_logging, worker_logging
+
+
+def log_from_worker(index):
+    logger = logging.getLogger('modules.render')
+    logger.info("Rendered workbook %s.", index)
+    for row in range(15):
+        logger.warning("Row %s has no placement date.", row, extra=THROTTLED)
+
+
+@pytest.mark.parametrize('method', ['spawn', 'fork'])
+def test_worker_records_reach_the_log_file(tmp_path, method):
+    if method not in multiprocessing.get_all_start_methods():
+        pytest.skip(f'{method} is not available on this platform')
+    configure_logging(str(tmp_path), console=False, repeat_limit=10)
+    try:
+        initializer, initargs = worker_logging()
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context(method), initializer=initializer,
+                                 initargs=initargs) as executor:
+            list(executor.map(log_from_worker, [1]))
+    finally:
+        stop_logging()
+
+    with open(os.path.join(tmp_path, LOG_FILE)) as file:
+        records = [json.loads(line) for line in file]
+    messages = [record['message'] for record in records]
+    assert 'Rendered workbook 1.' in messages
+    # Per-row warnings are rate limited in the worker, and the suppressed ones summarized when it exits
+    assert sum(message.endswith('has no placement date.') for message in messages) == 10
+    assert any(message.startswith("Suppressed 5 more messages like 'Row %s has no placement date.'")
+               for message in messages)
+    assert {record['process'] for record in records} != {os.getpid()}
+
+
+def test_workers_are_not_configured_without_logging():
+    assert worker_logging() == (None, ())
@@ -0,0 +1,116 @@
+import os
+import pytest
+from modules.pipeline import Pipeline, PipelineError, Stage
+
+
+# Two exports read by their own stages, combined into a report that is then published, recording which stages ran
+@pytest.fixture
+def plant(tmp_path):
+    for name in ('load', 'unload'):
+        (tmp_path / f'{name}.csv').write_text(f'{name} export')
+    ran = []
+    failing = set()
+
+    def reader(name):
+        def run(inputs):
+            ran.append(f'read_{name}')
+            out = tmp_path / f'{name}.out'
+            out.write_text((tmp_path / f'{name}.csv').read_text().upper())
+            return {name: str(out)}
+        return Stage(f'read_{name}', run, outputs=(name,), files=[str(tmp_path / f'{name}.csv')], reusable=True)
+
+    def combine(inputs):
+        ran.append('combine')
+        if 'combine' in failing:
+            raise RuntimeError('workbook locked')
+        out = tmp_path / 'report.out'
+        out.write_text(open(inputs['load']).read() + open(inputs['unload']).read())
+        return {'report': str(out)}
+
+    def publish(inputs):
+        ran.append('publish')
+
+    stages = [reader('load'), reader('unload'),
+              Stage('combine', combine, inputs=('load', 'unload'), outputs=('report',), reusable=True,
+                    files=lambda inputs: [inputs['load'], inputs['unload']]),
+              Stage('publish', publish, inputs=('report',))]
+    return Pipeline(stages, state_path=str(tmp_path / 'pipeline_state.json')), ran, failing, tmp_path
+
+
+def test_unchanged_inputs_skip_every_reusable_stage(plant):
+    pipeline, ran, _, tmp_path = plant
+    first = pipeline.run()
+    assert sorted(ran) == ['combine', 'publish', 'read_load', 'read_unload']
+
+    ran.clear()
+    assert pipeline.run() == first
+    assert ran == ['publish']
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_changed_input_reruns_only_its_downstream_stages(plant):
+    pipeline, ran, _, tmp_path = plant
+    pipeline.run()
+    (tmp_path / 'unload.csv').write_text('new unload export')
+
+    ran.clear()
+    pipeline.run()
+    assert sorted(ran) == ['combine', 'publish', 'read_unload']
+    assert (tmp_path / 'report.out').read_text() == 'LOAD EXPORTNEW UNLOAD EXPORT'
+
+
+def test_deleted_output_reruns_its_stage(plant):
+    pipeline, ran, _, tmp_path = plant
+    pipeline.run()
+    (tmp_path / 'load.out').unlink()
+
+    ran.clear()
+    pipeline.run()
+    assert 'read_load' in ran and 'read_unload' not in ran
+
+
+def test_resume_reruns_only_the_failed_stage_and_its_dependents(plant):
+    pipeline, ran, failing, _ = plant
+    pipeline.stages['read_load'].always_run = True
+    failing.add('combine')
+    with pytest.raises(PipelineError) as error:
+        pipeline.run()
+    assert error.value.failed == {'combine': 'workbook locked'}
+    assert 'publish' not in ran
+
+    failing.clear()
+    ran.clear()
+    pipeline.run(resume=True)
+    # read_load always runs, except when resuming a run it already succeeded in
+    assert sorted(ran) == ['combine', 'publish']
+
+    ran.clear()
+    pipeline.run(resume=True)
+    assert sorted(ran) == ['publish', 'read_load']
+
+
+def test_describe_plans_without_running(plant):
+    pipeline, ran, _, _ = plant
+    plan = pipeline.describe().splitlines()
+    assert plan[0] == 'Pipeline plan (4 stages, 3 steps)'
+    assert [line.split()[:2] for line in plan[1:]] == [['1', 'read_load'], ['1', 'read_unload'], ['2', 'combine'],
+                                                      ['3', 'publish']]
+    assert plan[1].endswith(' run')
+    assert ran == []
+
+    pipeline.run()
+    plan = pipeline.describe().splitlines()
+    assert plan[1].endswith('skip, its inputs and config are unchanged')
+    assert plan[3].endswith('run unless its inputs are unchanged')
+    assert plan[4].endswith(' run')
+    assert 'after: combine' in plan[4]
+
+
+def test_invalid_graphs_are_rejected():
+    def noop(inputs):
+        return None
+
+    with pytest.raises(ValueError, match='unknown'):
+        Pipeline([Stage('a', noop, inputs=('missing',))])
+    with pytest.raises(ValueError, match='cycle'):
+        Pipeline([Stage('a', noop, after=('b',)), Stage('b', noop, after=('a',))])
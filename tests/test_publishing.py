@@ -0,0 +1,85 @@
+import os
+import pytest
+from modules import publishing
+from modules.file_utils import move_to_sharepoint
+from modules.publishing import publish_files
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    source, dest = tmp_path / 'data', tmp_path / 'share'
+    source.mkdir()
+    dest.mkdir()
+    for name in ('aged_load_inv.xlsx', 'aged_unload_inv.xlsx'):
+        (source / name).write_bytes(name.encode() * 1000)
+    return source, dest, str(tmp_path / 'publish_manifest.json')
+
+
+def publish(dirs, files=('aged_load_inv.xlsx', 'aged_unload_inv.xlsx'), **kwargs):
+    source, dest, manifest = dirs
+    return {result.file_name: result for result in publish_files(str(source), str(dest), list(files), manifest,
+                                                                 **kwargs)}
+
+
+def test_publishes_copies_without_leaving_temporary_files(dirs):
+    source, dest, _ = dirs
+    results = publish(dirs)
+    assert {result.status for result in results.values()} == {'published'}
+    assert sorted(os.listdir(dest)) == ['aged_load_inv.xlsx', 'aged_unload_inv.xlsx']
+    assert (dest / 'aged_load_inv.xlsx').read_bytes() == (source / 'aged_load_inv.xlsx').read_bytes()
+
+
+def test_skips_unchanged_and_republishes_changed_files(dirs):
+    source, dest, _ = dirs
+    publish(dirs)
+    mtime = os.stat(dest / 'aged_unload_inv.xlsx').st_mtime_ns
+    (source / 'aged_load_inv.xlsx').write_bytes(b'changed')
+
+    results = publish(dirs)
+    assert results['aged_load_inv.xlsx'].status == 'published'
+    assert results['aged_unload_inv.xlsx'].status == 'unchanged'
+    assert (dest / 'aged_load_inv.xlsx').read_bytes() == b'changed'
+    assert os.stat(dest / 'aged_unload_inv.xlsx').st_mtime_ns == mtime
+
+
+def test_failed_copy_leaves_the_published_file_intact(dirs, monkeypatch):
+    source, dest, _ = dirs
+    publish(dirs)
+    published = (dest / 'aged_load_inv.xlsx').read_bytes()
+    (source / 'aged_load_inv.xlsx').write_bytes(b'new version')
+
+    def partial_copy(src, dst):
+        with open(dst, 'wb') as file:
+            file.write(b'new')
+        raise OSError('network share went away')
+
+    monkeypatch.setattr(publishing.shutil, 'copyfile', partial_copy)
+    result = publish(dirs, files=('aged_load_inv.xlsx',), retries=1, backoff=0)['aged_load_inv.xlsx']
+    assert (result.status, result.attempts) == ('failed', 2)
+    assert (dest / 'aged_load_inv.xlsx').read_bytes() == published
+    assert sorted(os.listdir(dest)) == ['aged_load_inv.xlsx', 'aged_unload_inv.xlsx']
+
+
+def test_transient_errors_are_retried(dirs, monkeypatch):
+    source, dest, _ = dirs
+    copyfile = publishing.shutil.copyfile
+    failures = []
+
+    def flaky_copy(src, dst):
+        if not failures:
+            failures.append(dst)
+            raise OSError('file is locked')
+        return copyfile(src, dst)
+
+    monkeypatch.setattr(publishing.shutil, 'copyfile', flaky_copy)
+    result = publish(dirs, files=('aged_load_inv.xlsx',), backoff=0)['aged_load_inv.xlsx']
+    assert (result.status, result.attempts) == ('published', 2)
+    assert (dest / 'aged_load_inv.xlsx').read_bytes() == (source / 'aged_load_inv.xlsx').read_bytes()
+
+
+def test_move_to_sharepoint_publishes_the_other_files_before_raising(dirs, monkeypatch, tmp_path):
+    source, dest, _ = dirs
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        move_to_sharepoint(str(source), str(dest), ['missing.xlsx', 'aged_load_inv.xlsx'])
+    assert os.listdir(dest) == ['aged_load_inv.xlsx']
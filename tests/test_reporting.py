@@ -0,0 +1,42 @@
+import os
+import pandas as pd
+from openpyxl import load_workbook
+from modules.reporting import UPCOMING_SHEET, render_workbooks, report_workbooks
+
+
+def report(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({'Material': [f'M{index}' for index in range(rows)], 'hours_elapsed': 4.5})
+
+
+def test_a_failed_workbook_does_not_affect_the_others(tmp_path):
+    (tmp_path / 'aged_8qi_inv.xlsx').mkdir()
+    workbooks = {
+        str(tmp_path / 'aged_load_inv.xlsx'): {'Sheet1': report(3)},
+        # Excel does not allow '[' in sheet names, and the next workbook cannot replace a directory
+        str(tmp_path / 'aged_unload_inv.xlsx'): {'Sheet[1]': report(2)},
+        str(tmp_path / 'aged_8qi_inv.xlsx'): {'Sheet1': report(1)},
+        str(tmp_path / 'aged_delta.xlsx'): {'aged_load_inv newly aged': report(4)},
+    }
+    results = render_workbooks(workbooks, max_workers=2)
+    assert [result.filename for result in results] == list(workbooks)
+    assert [result.ok for result in results] == [True, False, False, True]
+    assert 'Sheet[1]' in results[1].error
+    assert all(result.seconds >= 0 for result in results)
+
+    # Failed workbooks leave neither a partial file nor a temporary one behind
+    assert sorted(os.listdir(tmp_path)) == ['aged_8qi_inv.xlsx', 'aged_delta.xlsx', 'aged_load_inv.xlsx']
+    assert os.listdir(tmp_path / 'aged_8qi_inv.xlsx') == []
+    assert load_workbook(tmp_path / 'aged_load_inv.xlsx')['Sheet1'].max_row == 4
+    assert load_workbook(tmp_path / 'aged_delta.xlsx').sheetnames == ['aged_load_inv newly aged']
+
+
+def test_reports_are_laid_out_per_file_or_as_sheets_of_one_workbook():
+    load, qi = os.path.join('data', 'aged_load_inv.xlsx'), os.path.join('data', 'aged_8qi_inv.xlsx')
+    reports = {load: report(3), qi: report(1)}
+    upcoming = {load: report(2)}
+
+    per_file = report_workbooks(reports, upcoming=upcoming)
+    assert {filename: list(sheets) for filename, sheets in per_file.items()} == {load: ['Sheet1', UPCOMING_SHEET],
+                                                                                 qi: ['Sheet1']}
+    single = report_workbooks(reports, workbook='aged_inventory.xlsx', upcoming=upcoming)
+    assert list(single['aged_inventory.xlsx']) == ['aged_load_inv', 'aged_load_inv upcoming', 'aged_8qi_inv']
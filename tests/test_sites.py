@@ -0,0 +1,76 @@
+import json
+import os
+import pytest
+from modules.sites import SiteConfig, load_sites, run_sites, site_context
+
+
+def write_config(tmp_path, entries):
+    path = tmp_path / 'config' / 'sites.json'
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+
+def test_load_sites_resolves_directories_against_the_config_file(tmp_path):
+    path = write_config(tmp_path, [
+        {'name': 'P8', 'directory': 'sites/P8', 'environment': {'STOCK_VARIANT': 'P8AGEDINV', 'FILE_WAIT_TIMEOUT': 60}},
+        {'name': 'P9', 'directory': str(tmp_path / 'P9')},
+    ])
+    sites = load_sites(path)
+    assert sites == [
+        SiteConfig('P8', os.path.join(str(tmp_path / 'config'), 'sites/P8'),
+                   {'STOCK_VARIANT': 'P8AGEDINV', 'FILE_WAIT_TIMEOUT': '60'}),
+        SiteConfig('P9', str(tmp_path / 'P9')),
+    ]
+
+
+@pytest.mark.parametrize('entries, message', [
+    ([{'name': 'P8'}], "needs a 'name' and a 'directory'"),
+    ([{'name': '', 'directory': 'P8'}], "needs a 'name' and a 'directory'"),
+    ([{'name': 'P8', 'directory': 'a'}, {'name': 'P8', 'directory': 'b'}], "configured more than once"),
+])
+def test_load_sites_rejects_invalid_entries(tmp_path, entries, message):
+    with pytest.raises(ValueError, match=message):
+        load_sites(write_config(tmp_path, entries))
+
+
+def test_site_context_restores_the_directory_and_environment(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('STOCK_VARIANT', 'DEFAULT')
+    monkeypatch.delenv('BASE_DIRECTORY', raising=False)
+    monkeypatch.delenv('REPORT_WORKBOOK', raising=False)
+    site = SiteConfig('P8', str(tmp_path / 'sites' / 'P8'),
+                      {'STOCK_VARIANT': 'P8AGEDINV', 'REPORT_WORKBOOK': 'p8.xlsx'})
+
+    with pytest.raises(RuntimeError):
+        with site_context(site):
+            # The plant's directory is created and BASE_DIRECTORY defaults to it
+            assert os.getcwd() == str(tmp_path / 'sites' / 'P8')
+            assert os.environ['BASE_DIRECTORY'] == os.getcwd()
+            assert os.environ['STOCK_VARIANT'] == 'P8AGEDINV' and os.environ['REPORT_WORKBOOK'] == 'p8.xlsx'
+            raise RuntimeError('the run failed')
+    assert os.getcwd() == str(tmp_path)
+    assert os.environ['STOCK_VARIANT'] == 'DEFAULT'
+    assert 'BASE_DIRECTORY' not in os.environ and 'REPORT_WORKBOOK' not in os.environ
+
+    with site_context(SiteConfig('P9', str(tmp_path / 'P9'), {'BASE_DIRECTORY': str(tmp_path)})):
+        assert os.environ['BASE_DIRECTORY'] == str(tmp_path)
+
+
+def write_variant():
+    # Stands in for the pipeline: writes to the plant's directory and fails for one plant
+    if os.environ['STOCK_VARIANT'] == 'BROKEN':
+        raise RuntimeError('SAP is unreachable')
+    with open('variant.txt', 'w') as file:
+        file.write(os.environ['STOCK_VARIANT'])
+
+
+def test_run_sites_isolates_a_failed_site(tmp_path):
+    sites = [SiteConfig(name, str(tmp_path / name), {'STOCK_VARIANT': variant})
+             for name, variant in (('P8', 'P8AGEDINV'), ('P7', 'BROKEN'), ('P9', 'P9AGEDINV'))]
+    results = run_sites(sites, write_variant, max_workers=2)
+    assert [(result.name, result.error) for result in results] == [('P8', None), ('P7', 'SAP is unreachable'),
+                                                                   ('P9', None)]
+    assert (tmp_path / 'P8' / 'variant.txt').read_text() == 'P8AGEDINV'
+    assert (tmp_path / 'P9' / 'variant.txt').read_text() == 'P9AGEDINV'
+    assert not (tmp_path / 'P7' / 'variant.txt').exists()
@@ -0,0 +1,85 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from modules.validation import (REASON_COLUMN, SOURCE_ROW_COLUMN, SchemaError, normalize_columns,
+                                validate_paint_processed, validate_sap_inventory, write_quarantine)
+from modules.ingest import PLACEMENT_DATE_FORMATS
+
+
+def sap_rows(**columns):
+    rows = {'Material': ['M1', 'M2', 'M3', 'M4'], 'Storage Bin': ['B1', 'B2', 'B3', 'B4'],
+            'Last stock placement': ['2024-03-05', '03/07/2024', '13.03.2024', '2024-03-08 00:00:00'],
+            'Time': ['06:30:00', '14:00:00', '22:15:30', '00:00:00'], 'Total Stock': ['1', '2.5', '3', '4']}
+    rows.update(columns)
+    return pd.DataFrame(rows)
+
+
+def test_normalize_columns_renames_and_fills_optional_columns():
+    df = pd.DataFrame({'storage  BIN ': ['B1'], 'Material': ['M1']})
+    df = normalize_columns(df, ['Material', 'Storage Bin', 'Storage Unit'], ['Material', 'Storage Bin'], 'export')
+    assert list(df.columns) == ['Storage Bin', 'Material', 'Storage Unit']
+    assert df['Storage Unit'].isna().all()
+
+
+def test_normalize_columns_raises_on_missing_required_columns():
+    df = pd.DataFrame({'Material': ['M1']})
+    with pytest.raises(SchemaError, match="missing required columns \\['Storage Bin'\\]"):
+        normalize_columns(df, ['Material', 'Storage Bin', 'Storage Unit'], ['Material', 'Storage Bin'], 'export')
+
+
+def test_placement_dates_in_any_known_format_are_accepted():
+    valid, quarantined = validate_sap_inventory(sap_rows(), 'export.xlsx', PLACEMENT_DATE_FORMATS)
+    assert quarantined.empty
+    expected = ['2024-03-05 06:30:00', '2024-03-07 14:00:00', '2024-03-13 22:15:30', '2024-03-08 00:00:00']
+    assert valid['last_stock_placement'].tolist() == pd.to_datetime(expected).tolist()
+    assert valid['Total Stock'].tolist() == [1, 2.5, 3, 4]
+
+
+def test_sap_rows_are_quarantined_with_every_reason():
+    df = sap_rows(**{'Last stock placement': [None, 'not a date', '2024-03-05', '2024-03-06'],
+                     'Time': ['06:00:00', None, '25:00:00', '06:00:00'],
+                     'Total Stock': ['1', '2', 'three', '4']})
+    valid, quarantined = validate_sap_inventory(df, 'export.xlsx', PLACEMENT_DATE_FORMATS)
+    assert valid['Material'].tolist() == ['M4']
+    assert quarantined[SOURCE_ROW_COLUMN].tolist() == [2, 3, 4]
+    assert quarantined[REASON_COLUMN].tolist() == ['missing Last stock placement',
+                                                   'unparseable Last stock placement; missing Time',
+                                                   'unparseable Time; non-numeric Total Stock']
+    # Quarantined rows keep the values as read
+    assert quarantined['Total Stock'].tolist() == ['1', '2', 'three']
+
+
+def test_paint_processed_rows_are_quarantined_with_every_reason():
+    chunk = pd.DataFrame({'PART_NO': ['P1', None, 'P3', 'P4'], 'GOOD': ['1', '2', 'x', '4'],
+                          'SCRAP': ['0', '0', 'y', None]}, index=range(1000, 1004))
+    valid, quarantined = validate_paint_processed(chunk, ['GOOD', 'SCRAP'], first_row=1002, source='processed.csv')
+    assert valid['PART_NO'].tolist() == ['P1', 'P4']
+    assert valid['GOOD'].tolist() == [1, 4]
+    assert np.isnan(valid['SCRAP'].iloc[1])
+    assert quarantined[SOURCE_ROW_COLUMN].tolist() == [1003, 1004]
+    assert quarantined[REASON_COLUMN].tolist() == ['missing PART_NO', 'non-numeric GOOD; non-numeric SCRAP']
+
+
+def test_clean_rows_quarantine_nothing(tmp_path):
+    _, quarantined = validate_paint_processed(pd.DataFrame({'PART_NO': ['P1'], 'GOOD': ['1']}), ['GOOD'], 2, 'x')
+    assert quarantined.empty and list(quarantined.columns) == ['PART_NO', 'GOOD', REASON_COLUMN, SOURCE_ROW_COLUMN]
+    assert write_quarantine(quarantined, 'data/paint_processed.csv', 'ab' * 32, str(tmp_path)) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_quarantine_files_are_named_by_digest_and_pruned(tmp_path):
+    # Six older quarantine files of the export, and one of another export
+    for index in range(6):
+        stale = tmp_path / f'paint_processed-{index:016x}.csv'
+        stale.write_text('old')
+        os.utime(stale, (1_000_000 + index, 1_000_000 + index))
+    (tmp_path / 'paint_inventory-0000000000000000.csv').write_text('other export')
+
+    quarantined = pd.DataFrame({SOURCE_ROW_COLUMN: [2], REASON_COLUMN: ['missing PART_NO'], 'PART_NO': [None]})
+    digest = 'f' * 64
+    path = write_quarantine(quarantined, os.path.join('data', 'paint_processed.csv'), digest, str(tmp_path), keep=5)
+    assert path == str(tmp_path / f'paint_processed-{digest[:16]}.csv')
+    assert pd.read_csv(path)[REASON_COLUMN].tolist() == ['missing PART_NO']
+    assert sorted(os.listdir(tmp_path)) == sorted(['paint_inventory-0000000000000000.csv', os.path.basename(path)]
+                                                  + [f'paint_processed-{index:016x}.csv' for index in range(2, 6)])